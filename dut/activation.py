@@ -0,0 +1,179 @@
+"""
+Testbench for activation module.
+"""
+
+import random
+from collections import deque
+from enum import IntEnum
+from typing import Deque, Dict, Generator
+
+import build_cache
+import numpy as np
+import pytest
+import vpw
+from batch import drive
+from fixed_point import Activation, activation, activation_array, twos
+from functional_coverage import corners
+from parameter import override
+from pipeline import ACTIVATION_LATENCY
+from scoreboard import SLACK, Scoreboard
+
+
+class Param(IntEnum):
+    """Module parameter configuration.
+
+    Attributes
+    IMG_WIDTH: Bus width of up_data and dn_data number
+    """
+    IMG_WIDTH = override("IMG_WIDTH", 16)
+
+
+IMG_MAX = (1 << (Param.IMG_WIDTH - 1)) - 1
+
+
+class Checker:
+    """Model of Hardware Module"""
+    def __init__(self) -> None:
+        self._queue: Deque[Dict[str, int]] = deque()
+        self.scoreboard = Scoreboard("dn_data", max_latency=ACTIVATION_LATENCY + SLACK)
+
+    def empty(self) -> bool:
+        """Check if data queue is empty and every result has been received."""
+        return not (self._queue or self.scoreboard)
+
+    def send(self, data: int, mode: int, bound: int = 0, leak: int = 0) -> None:
+        """Add 'data' and the activation 'mode', 'bound' and 'leak' to queue for sending into activation module."""
+        self._queue.append({"up_data": data, "mode": mode, "bound": bound, "leak": leak, "valid": 1,
+                            "dn_data": activation(Param.IMG_WIDTH, data, mode, bound, leak)})
+
+    def init(self, _) -> Generator:
+        """Background initilization function."""
+        number = {"up_data": 0, "mode": 0, "bound": 0, "leak": 0, "valid": 0, "dn_data": 0}
+
+        while True:
+            vpw.prep("up_data", vpw.pack(Param.IMG_WIDTH, number["up_data"]))
+            vpw.prep("up_valid", [number["valid"]])
+            vpw.prep("mode", [number["mode"]])
+            vpw.prep("bound", vpw.pack(Param.IMG_WIDTH - 1, number["bound"]))
+            vpw.prep("leak", [number["leak"]])
+
+            io = yield
+            self.scoreboard.tick()
+
+            if io["dn_valid"]:
+                self.scoreboard.observe(io["dn_data"])
+
+            if number["valid"]:
+                self.scoreboard.expect(number["dn_data"])
+
+            number = {"up_data": 0, "mode": 0, "bound": 0, "leak": 0, "valid": 0, "dn_data": 0}
+            if self._queue:
+                number = self._queue.popleft()
+
+
+@pytest.fixture(name="_design", scope="module")
+def design():
+    """Compile the design only once for all tests."""
+    dut = build_cache.create(module='activation',
+                             clock='clk',
+                             include=['../hdl'],
+                             parameter={'IMG_WIDTH': Param.IMG_WIDTH})
+    yield dut
+
+
+@pytest.fixture(name="_context")
+def context(_design):
+    """Setup and tear-down the design for each test."""
+    vpw.init(_design, trace=False)
+
+    vpw.prep("rst", [1])
+    vpw.prep("mode", [0])
+    vpw.prep("bound", vpw.pack(Param.IMG_WIDTH - 1, 0))
+    vpw.prep("leak", [0])
+    vpw.prep("up_data", vpw.pack(Param.IMG_WIDTH, 0))
+    vpw.prep("up_valid", [0])
+    vpw.idle(2)
+    vpw.prep("rst", [0])
+    vpw.idle(2)
+
+    yield
+
+    vpw.idle(10)
+    vpw.finish()
+
+
+@pytest.mark.parametrize("mode", list(Activation))
+def test_model_array(mode):
+    """Test that the array model matches the scalar model for every leak and for bounds at the image corners."""
+    data = [random.getrandbits(Param.IMG_WIDTH) for _ in range(1000)] + corners(Param.IMG_WIDTH)
+
+    for leak in range(16):
+        bound = random.choice([0, 1, IMG_MAX, random.randint(0, IMG_MAX)])
+        expected = [activation(Param.IMG_WIDTH, d, mode, bound, leak) for d in data]
+
+        assert activation_array(Param.IMG_WIDTH, np.array(data), mode, bound, leak).tolist() == expected, \
+               f"bound: {bound}, leak: {leak}"
+
+
+def test_pipeline_depth(_context):
+    """Test that a number is activated after ACTIVATION_LATENCY clock cycles."""
+    vpw.prep("mode", [Activation.RELU])
+    vpw.prep("up_data", vpw.pack(Param.IMG_WIDTH, 5))
+    vpw.prep("up_valid", [1])
+    io = vpw.tick()
+    assert io["dn_valid"] == 0, "Module offers a number before it is written."
+
+    vpw.prep("up_data", vpw.pack(Param.IMG_WIDTH, 0))
+    vpw.prep("up_valid", [0])
+    for _ in range(ACTIVATION_LATENCY - 1):
+        vpw.tick()
+
+    io = vpw.tick()
+    assert io["dn_data"] == 5, f"Module should be {ACTIVATION_LATENCY} clock cycles deep."
+    assert io["dn_valid"] == 1, "Valid is not delayed with the number."
+
+    io = vpw.tick()
+    assert io["dn_valid"] == 0, "Valid is held for more then one clock."
+
+
+@pytest.mark.parametrize("mode", list(Activation))
+def test_stream_random(_context, mode):
+    """Test random numbers, and the numbers either side of zero and the bound, with random bounds and leaks."""
+    checker = Checker()
+    vpw.register(checker)
+
+    for _ in range(200):
+        bound = random.randint(0, IMG_MAX)
+        leak = random.randint(0, 15)
+
+        for data in [random.getrandbits(Param.IMG_WIDTH) for _ in range(8)] + [bound - 1, bound, bound + 1, -1, 0, 1]:
+            checker.send(twos(Param.IMG_WIDTH, data), mode, bound, leak)
+
+    # wait until all data has been sent into DUT and every result received
+    while not checker.empty():
+        vpw.tick()
+
+
+def test_stream_random_batch(_context):
+    """Test random numbers with a random mode, bound and leak on every clock driven as a single batch."""
+    latency = ACTIVATION_LATENCY
+    number = 20000
+
+    up_data = np.random.randint(0, 1 << Param.IMG_WIDTH, number + latency, dtype=np.int64)
+    mode = np.random.randint(0, len(Activation), number + latency, dtype=np.int64)
+    bound = np.random.randint(0, IMG_MAX + 1, number + latency, dtype=np.int64)
+    leak = np.random.randint(0, 16, number + latency, dtype=np.int64)
+    up_valid = np.concatenate([np.ones(number, dtype=np.int64), np.zeros(latency, dtype=np.int64)])
+
+    io = drive({"up_data": (Param.IMG_WIDTH, up_data),
+                "up_valid": (1, up_valid),
+                "mode": (2, mode),
+                "bound": (Param.IMG_WIDTH - 1, bound),
+                "leak": (4, leak)},
+               {"dn_data": Param.IMG_WIDTH, "dn_valid": 1})
+
+    dn_data = activation_array(Param.IMG_WIDTH, up_data, mode, bound, leak)
+
+    mismatch = np.flatnonzero(io["dn_data"][latency:] != dn_data[:-latency])
+    assert mismatch.size == 0, f"First mismatch at cycle {mismatch[:1]} of {mismatch.size}"
+    assert np.array_equal(io["dn_valid"][latency:], up_valid[:-latency]), "Valid is not delayed with the number."
@@ -0,0 +1,116 @@
+"""
+Batch stimulus for driving many clock cycles of a design in one call.
+
+Instead of prepping every port and resuming a Checker generator on each
+clock, the port values for a whole block of cycles are given up front as
+arrays. The values are packed before the block is run, ports are only prepped
+on cycles where their value changes and the sampled outputs are returned as
+arrays that can be checked after the fact against a vectorized model.
+"""
+
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import vpw
+
+
+def _pack(width: int, values: Sequence[int]) -> List[Optional[List[int]]]:
+    """Pack the port values of each cycle, 'None' marks a cycle where the value is unchanged."""
+    packed: List[Optional[List[int]]] = []
+    previous = None
+
+    for value in values:
+        if value == previous:
+            packed.append(None)
+        else:
+            packed.append(vpw.pack(width, value))
+            previous = value
+
+    return packed
+
+
+def _unpack(width: int, samples: List) -> np.ndarray:
+    """Unpack the sampled values of an output port into an array."""
+    data = [vpw.unpack(width, s) for s in samples]
+
+    if width < 64:
+        return np.array(data, dtype=np.int64)
+
+    return np.array(data, dtype=object)
+
+
+def drive(inputs: Mapping[str, Tuple[int, Sequence[int]]], outputs: Mapping[str, int]) -> Dict[str, np.ndarray]:
+    """Drive a block of clock cycles and sample the output ports.
+
+    The value at index 'k' of every input array is prepped before the k-th
+    clock tick and index 'k' of every returned array holds the output sampled
+    by that same tick. Ports keep their last value after the block is run.
+
+    Arguments
+    inputs: Port name mapped to the port width and an array of per cycle values
+    outputs: Port name mapped to the port width of the outputs to sample
+
+    Returns a dictionary of output port name to an array of sampled values.
+    """
+    cycles = {len(values) for _, values in inputs.values()}
+    assert len(cycles) == 1, f"Input arrays must all be the same length, given lengths: {cycles}"
+    cycle_nb = cycles.pop()
+
+    packed = [(name, _pack(width, np.asarray(values).tolist())) for name, (width, values) in inputs.items()]
+    sampled: Dict[str, List] = {name: [] for name in outputs}
+
+    for x in range(cycle_nb):
+        for name, values in packed:
+            if values[x] is not None:
+                vpw.prep(name, values[x])
+
+        io = vpw.tick()
+
+        for name, samples in sampled.items():
+            samples.append(io[name])
+
+    return {name: _unpack(outputs[name], samples) for name, samples in sampled.items()}
+
+
+def impulse_train(inputs: Mapping[str, Tuple[int, int]],
+                  output: Tuple[str, int],
+                  number: int = 1,
+                  gap: int = 1,
+                  limit: int = 200) -> List[int]:
+    """Drive a train of impulses and find the cycles on which the output is non-zero.
+
+    Every impulse sets the input ports to their impulse value for a single
+    cycle, with the ports set to zero in between impulses. Cycles are counted
+    from the first impulse being prepped, so for a single impulse the first
+    non-zero cycle is the latency of the design.
+
+    Arguments
+    inputs: Port name mapped to the port width and impulse value
+    output: Port name and width of the output to watch
+    number: Number of impulses in the train
+    gap: Cycles from the start of one impulse to the next
+    limit: Cycles to keep watching the output after the last impulse
+    """
+    assert gap > 0, f"Impulses must be at least one cycle apart, given: {gap}"
+
+    cycle_nb = (number - 1)*gap + 1 + limit
+    stimulus = {name: (width, [value if x % gap == 0 and x < number*gap else 0 for x in range(cycle_nb)])
+                for name, (width, value) in inputs.items()}
+
+    name, width = output
+    return np.flatnonzero(drive(stimulus, {name: width})[name]).tolist()
+
+
+def impulse(inputs: Mapping[str, Tuple[int, int]], output: Tuple[str, int], limit: int = 200) -> Optional[int]:
+    """Measure the latency of a design as the cycles until the response to an impulse is sampled.
+
+    Arguments
+    inputs: Port name mapped to the port width and impulse value
+    output: Port name and width of the output to watch
+    limit: Cycles to wait for a response
+
+    Returns the latency, or 'None' when there is no response within the limit.
+    """
+    found = impulse_train(inputs, output, limit=limit)
+
+    return found[0] if found else None
@@ -0,0 +1,519 @@
+"""
+Throughput and latency benchmarks of every HDL module.
+
+Each module of the benchmark matrix is compiled (using the build cache) and
+measured for its pipeline latency, its initiation interval and the number of
+simulated clock cycles per wall-clock second when driven with a contiguous or
+an intermittent stream. Only the engine built with a skid buffer (SKID_NB)
+applies backpressure, and only while its results are stalled, so every other
+stream is accepted on the clock it is sent. For modules with an output valid
+the throughput is measured by counting the valid outputs within the stream,
+otherwise by counting the beats sent.
+
+Latency is the number of clock ticks from an impulse being prepped until its
+result is sampled. The initiation interval is the smallest gap between a train
+of impulses for which every impulse produces its own result.
+
+To benchmark every module and keep the results for later comparison.
+
+    python benchmark.py --json benchmark.json --csv benchmark.csv
+
+To benchmark the engine module with a larger image bus.
+
+    python benchmark.py engine --param IMAGE_NB=8
+
+An engine with a skid buffer is also measured for the beats it sustains per
+clock while the down stream drives 'result_ready' low on random clocks, for
+each stall probability. A skid buffer smaller than the pipeline latency plus 2
+limits the throughput even without stalls.
+
+    python benchmark.py engine --param SKID_NB=8,16,32
+
+The layer benchmark streams a multi-filter layer over the engine with the
+kernels loaded serially and with the shadow weight bank (DOUBLE_BUFFER), and
+reports the clocks on which no beat was sent. A layer of a single input channel
+is also streamed with its bias, shift and ReLU activation applied by the host
+post-processing and fused into the engine passes (built with ACTIVATION), and
+the pixels the host reads and writes to post-process the results are reported.
+
+    python benchmark.py --layer --param IMAGE_NB=8
+"""
+
+import argparse
+import csv
+import json
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import build_cache
+import numpy as np
+import vpw
+from batch import drive, impulse, impulse_train
+from engine_model import Config, Layer, model_layer
+from fixed_point import Activation
+from layer import convolve
+from raster import Geometry
+from regress import expand
+
+DUT_DIR = Path(__file__).resolve().parent
+
+# module name mapped to the values of each parameter to be benchmarked
+MATRIX: Dict[str, Dict[str, List[int]]] = {
+    "multiply_add": {"M1_WIDTH": [16], "M2_WIDTH": [8, 16]},
+    "group_add": {"GROUP_NB": [4], "NUM_WIDTH": [25]},
+    "rescale": {"NUM_WIDTH": [25], "IMG_WIDTH": [16]},
+    "activation": {"IMG_WIDTH": [16]},
+    "slice": {"MAC_NB": [3], "OFFSET": [0, 2], "WEIGHT_WIDTH": [8], "IMAGE_WIDTH": [16]},
+    "engine": {"WEIGHT_WIDTH": [8], "IMAGE_WIDTH": [16], "IMAGE_NB": [3, 8], "KERNEL_WIDTH": [3], "KERNEL_HEIGHT": [3],
+               "SKID_NB": [0, 32]},
+}
+
+MODES = ("contiguous", "intermittent")
+
+# probabilities of the down stream stalling on a clock, for modules with a result handshake
+STALLS = (0.0, 0.1, 0.25, 0.5, 0.75)
+
+# size of the layer streamed by the layer benchmark, and of the single channel layer it also streams fused
+LAYER = {"filters": 4, "channels": 3, "height": 12, "width": 64}
+LAYER_FUSED = dict(LAYER, channels=1)
+
+LATENCY_LIMIT = 200
+
+
+def _ones(width: int, number: int) -> int:
+    """Bus value with each of its 'number' fields of 'width' bits set to 1."""
+    return sum(1 << (x*width) for x in range(number))
+
+
+def _multiply_add(p: Dict[str, int]) -> Dict[str, Any]:
+    """Ports of the multiply_add module."""
+    result = p["M1_WIDTH"] + p["M2_WIDTH"] + 1
+
+    return {"reset": True,
+            "data": {"m1": p["M1_WIDTH"], "m2": p["M2_WIDTH"], "add": result},
+            "valid": None,
+            "handshake": None,
+            "impulse": {"m1": 1, "m2": 1},
+            "output": ("result", result),
+            "done": None,
+            "setup": {}}
+
+
+def _group_add(p: Dict[str, int]) -> Dict[str, Any]:
+    """Ports of the group_add module."""
+    return {"reset": True,
+            "data": {"up_data": p["NUM_WIDTH"]*p["GROUP_NB"]},
+            "valid": "up_valid",
+            "handshake": None,
+            "impulse": {"up_data": 1},
+            "output": ("dn_data", p["NUM_WIDTH"]),
+            "done": "dn_valid",
+            "setup": {}}
+
+
+def _rescale(p: Dict[str, int]) -> Dict[str, Any]:
+    """Ports of the rescale module."""
+    return {"reset": True,
+            "data": {"up_data": p["NUM_WIDTH"]},
+            "valid": "up_valid",
+            "handshake": None,
+            "impulse": {"up_data": 1},
+            "output": ("dn_data", p["IMG_WIDTH"]),
+            "done": "dn_valid",
+            "setup": {"shift": (8, [0])}}
+
+
+def _activation(p: Dict[str, int]) -> Dict[str, Any]:
+    """Ports of the activation module, with the ReLU function."""
+    return {"reset": True,
+            "data": {"up_data": p["IMG_WIDTH"]},
+            "valid": "up_valid",
+            "handshake": None,
+            "impulse": {"up_data": 1},
+            "output": ("dn_data", p["IMG_WIDTH"]),
+            "done": "dn_valid",
+            "setup": {"mode": (2, [Activation.RELU])}}
+
+
+def _slice(p: Dict[str, int]) -> Dict[str, Any]:
+    """Ports of the slice module, with every weight set to 1."""
+    return {"reset": True,
+            "data": {"image": p["IMAGE_WIDTH"]*p["MAC_NB"]},
+            "valid": "image_valid",
+            "handshake": None,
+            "impulse": {"image": _ones(p["IMAGE_WIDTH"], p["MAC_NB"])},
+            "output": ("result", p["IMAGE_WIDTH"]+p["WEIGHT_WIDTH"]+1),
+            "done": "result_valid",
+            "setup": {"weight": (p["WEIGHT_WIDTH"], [1, 0]),
+                      "weight_valid": (p["MAC_NB"], [(1 << p["MAC_NB"]) - 1, 0])}}
+
+
+def _engine(p: Dict[str, int]) -> Dict[str, Any]:
+    """Ports of the engine module, with every weight set to 1 and no rescale shift."""
+    kernel_nb = p["KERNEL_WIDTH"]*p["KERNEL_HEIGHT"]
+    pixel_nb = p["IMAGE_NB"]*p["KERNEL_HEIGHT"]
+
+    return {"reset": True,
+            "data": {"image": p["IMAGE_WIDTH"]*pixel_nb},
+            "valid": "image_valid",
+            "handshake": ("image_ready", "result_valid", "result_ready") if p.get("SKID_NB") else None,
+            "impulse": {"image": _ones(p["IMAGE_WIDTH"], pixel_nb)},
+            "output": ("result", p["IMAGE_WIDTH"]*(p["IMAGE_NB"]//p.get("STRIDE", 1))),
+            "done": "result_valid",
+            "setup": {"weight": (p["WEIGHT_WIDTH"], [1]*kernel_nb + [0]),
+                      "weight_valid": (1, [1]*kernel_nb + [0]),
+                      "weight_swap": (1, [0]*(kernel_nb + 1)),
+                      "cfg_shift": (8, [0]*(kernel_nb + 1)),
+                      "cfg_valid": (1, [1] + [0]*kernel_nb),
+                      "result_ready": (1, [1]*(kernel_nb + 1))}}
+
+
+PORTS: Dict[str, Callable[[Dict[str, int]], Dict[str, Any]]] = {
+    "multiply_add": _multiply_add,
+    "group_add": _group_add,
+    "rescale": _rescale,
+    "activation": _activation,
+    "slice": _slice,
+    "engine": _engine,
+}
+
+
+def _stream(ports: Dict[str, Any], pattern: List[Dict[str, int]]) -> Dict[str, np.ndarray]:
+    """Drive one cycle per entry of the pattern, unlisted data ports are zero, and return the sampled outputs."""
+    inputs = {name: (width, [cycle.get(name, 0) for cycle in pattern]) for name, width in ports["data"].items()}
+
+    if ports["valid"]:
+        inputs[ports["valid"]] = (1, [int(bool(cycle)) for cycle in pattern])
+
+    name, width = ports["output"]
+    outputs = {name: width}
+
+    if ports["done"]:
+        outputs[ports["done"]] = 1
+
+    return drive(inputs, outputs)
+
+
+def _impulse(ports: Dict[str, Any]) -> Dict[str, Tuple[int, int]]:
+    """Width and impulse value of every input port, data ports not in the impulse are zero."""
+    inputs = {name: (width, ports["impulse"].get(name, 0)) for name, width in ports["data"].items()}
+
+    if ports["valid"]:
+        inputs[ports["valid"]] = (1, 1)
+
+    return inputs
+
+
+def latency(ports: Dict[str, Any]) -> int:
+    """Measure the clock ticks from an impulse being prepped until its result is sampled."""
+    depth = impulse(_impulse(ports), ports["output"], limit=LATENCY_LIMIT)
+    assert depth is not None, f"No result within {LATENCY_LIMIT} clock ticks of an impulse"
+
+    return depth
+
+
+def initiation_interval(ports: Dict[str, Any], depth: int, number: int = 8) -> Optional[int]:
+    """Measure the smallest gap between impulses for which every impulse produces its own result."""
+    for gap in range(1, depth + 2):
+        found = impulse_train(_impulse(ports), ports["output"], number, gap, limit=LATENCY_LIMIT)
+        if found == [depth + x*gap for x in range(number)]:
+            return gap
+
+    return None
+
+
+def throughput(ports: Dict[str, Any], mode: str, cycles: int) -> Dict[str, Any]:
+    """Measure the simulation speed of driving a random stream of data."""
+    probability = 1.0 if mode == "contiguous" else 0.5
+    pattern: List[Dict[str, int]] = []
+
+    for _ in range(cycles):
+        if random.random() < probability:
+            pattern.append({name: random.getrandbits(width) for name, width in ports["data"].items()})
+        else:
+            pattern.append({})
+
+    start = time.perf_counter()
+    sampled = _stream(ports, pattern)
+    seconds = time.perf_counter() - start
+
+    if ports["done"]:
+        beats = int(np.count_nonzero(sampled[ports["done"]]))
+    else:
+        beats = sum(1 for cycle in pattern if cycle)
+
+    return {"cycles": cycles,
+            "beats": beats,
+            "seconds": round(seconds, 6),
+            "cycles_per_second": round(cycles / seconds, 1),
+            "beats_per_cycle": round(beats / cycles, 4)}
+
+
+def backpressure(ports: Dict[str, Any], stall: float, cycles: int) -> Dict[str, Any]:
+    """Measure the sustained throughput of a contiguous stream while the down stream stalls on random clocks.
+
+    A beat is held on the up stream bus until the module accepts it, the
+    throughput is the number of beats accepted per clock.
+    """
+    up_ready, dn_valid, dn_ready = ports["handshake"]
+
+    def offer() -> None:
+        for name, width in ports["data"].items():
+            vpw.prep(name, vpw.pack(width, random.getrandbits(width)))
+
+    offer()
+    vpw.prep(ports["valid"], [1])
+
+    beats = 0
+    results = 0
+
+    start = time.perf_counter()
+    for _ in range(cycles):
+        ready = random.random() >= stall
+        vpw.prep(dn_ready, [int(ready)])
+
+        io = vpw.tick()
+        if io[up_ready]:
+            beats += 1
+            offer()
+        if io[dn_valid] and ready:
+            results += 1
+    seconds = time.perf_counter() - start
+
+    # drain the module for the next measurement
+    vpw.prep(ports["valid"], [0])
+    vpw.prep(dn_ready, [1])
+    vpw.idle(beats - results + LATENCY_LIMIT)
+
+    return {"cycles": cycles,
+            "beats": beats,
+            "seconds": round(seconds, 6),
+            "cycles_per_second": round(cycles / seconds, 1),
+            "beats_per_cycle": round(beats / cycles, 4)}
+
+
+def _commit() -> str:
+    """Short hash of the checked out commit, empty when not within a git repository."""
+    process = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                             cwd=DUT_DIR, capture_output=True, text=True, check=False)
+
+    return process.stdout.strip() if process.returncode == 0 else ""
+
+
+def run(job: Dict[str, Any], cycles: int) -> List[Dict[str, Any]]:
+    """Benchmark the module of a job for every stream mode."""
+    module, parameter = job["testbench"], job["parameter"]
+    ports = PORTS[module](parameter)
+
+    start = time.perf_counter()
+    design = build_cache.create(module=module, clock='clk', include=[str(DUT_DIR.parent / 'hdl')], parameter=parameter)
+    build = time.perf_counter() - start
+
+    vpw.init(design, trace=False)
+
+    for name, width in ports["data"].items():
+        vpw.prep(name, vpw.pack(width, 0))
+    if ports["valid"]:
+        vpw.prep(ports["valid"], [0])
+    if ports["reset"]:
+        vpw.prep("rst", [1])
+        vpw.idle(2)
+        vpw.prep("rst", [0])
+    vpw.idle(2)
+
+    if ports["setup"]:
+        drive(ports["setup"], {})
+    vpw.idle(4)
+
+    depth = latency(ports)
+    interval = initiation_interval(ports, depth)
+
+    results = []
+    for mode in MODES:
+        results.append(dict({"module": module,
+                             "parameter": parameter,
+                             "mode": mode,
+                             "latency": depth,
+                             "initiation_interval": interval,
+                             "build_seconds": round(build, 3)},
+                            **throughput(ports, mode, cycles)))
+
+    if ports["handshake"]:
+        for stall in STALLS:
+            results.append(dict({"module": module,
+                                 "parameter": parameter,
+                                 "mode": f"stall={stall}",
+                                 "latency": depth,
+                                 "initiation_interval": interval,
+                                 "build_seconds": round(build, 3)},
+                                **backpressure(ports, stall, cycles)))
+
+    vpw.finish()
+
+    return results
+
+
+def run_layer(parameter: Dict[str, int], layer: Dict[str, int], fused: bool = False) -> Dict[str, Any]:
+    """Stream a random biased and activated layer over the engine and count the clocks spent on each part of it.
+
+    Arguments
+    parameter: Parameters of the engine module, built with the activation stage to fuse the activation
+    layer: Number of filters and channels, and the height and width of each channel
+    fused: Bias, rescale and activate a single channel layer on the engine instead of by the host post-processing
+    """
+    p = parameter
+    rng = np.random.default_rng(random.getrandbits(32))
+
+    image = rng.integers(0, 1 << p["IMAGE_WIDTH"], (layer["channels"], layer["height"], layer["width"]))
+    kernels = Layer(rng.integers(0, 1 << p["WEIGHT_WIDTH"],
+                                 (layer["filters"], layer["channels"], p["KERNEL_HEIGHT"], p["KERNEL_WIDTH"])),
+                    Config(p["WEIGHT_WIDTH"], activation=Activation.RELU),
+                    rng.integers(0, 1 << (p["IMAGE_WIDTH"] + p["WEIGHT_WIDTH"] + 1), layer["filters"]),
+                    fused)
+    geometry = Geometry(p["WEIGHT_WIDTH"], p["IMAGE_WIDTH"], p["IMAGE_NB"], p["KERNEL_WIDTH"], p["KERNEL_HEIGHT"],
+                        p.get("STRIDE", 1), p.get("DILATION", 1))
+
+    design = build_cache.create(module="engine", clock='clk', include=[str(DUT_DIR.parent / 'hdl')], parameter=p)
+    vpw.init(design, trace=False)
+
+    vpw.prep("rst", [1])
+    vpw.prep("result_ready", [1])
+    vpw.idle(2)
+    vpw.prep("rst", [0])
+    vpw.idle(2)
+
+    start = time.perf_counter()
+    result, cycles = convolve(image, kernels, geometry, double_buffer=bool(p["DOUBLE_BUFFER"]))
+    seconds = time.perf_counter() - start
+
+    vpw.finish()
+
+    expected = model_layer(image, kernels, geometry)
+    assert np.array_equal(result, expected), "Layer result does not match the layer model"
+
+    return dict({"module": "layer",
+                 "parameter": parameter,
+                 "mode": "double_buffer" if p["DOUBLE_BUFFER"] else "serial",
+                 "post_process": "engine" if fused else "host"},
+                **layer,
+                **cycles,
+                seconds=round(seconds, 6),
+                beats_per_cycle=round(cycles["beats"] / cycles["total"], 4))
+
+
+def layer_table(results: List[Dict[str, Any]]) -> str:
+    """Format the layer results as a table, with the stall clocks removed compared to the serial weight load.
+
+    The 'post pixels' column counts the pixels read and written by the host post-processing of the layer.
+    """
+    rows = [("mode", "post", "parameters", "channels", "passes", "cycles", "weight", "stall", "removed", "post pixels",
+             "beats/cycle")]
+
+    def key(r: Dict[str, Any]) -> Tuple:
+        return tuple(sorted(dict(r["parameter"], DOUBLE_BUFFER=0).items())) + (r["channels"], r["post_process"])
+
+    serial = {key(r): r["stall"] for r in results if not r["parameter"]["DOUBLE_BUFFER"]}
+
+    for r in results:
+        rows.append((r["mode"],
+                     r["post_process"],
+                     " ".join(f"{k}={v}" for k, v in r["parameter"].items()),
+                     str(r["channels"]),
+                     str(r["passes"]),
+                     str(r["total"]),
+                     str(r["weight"]),
+                     str(r["stall"]),
+                     str(serial[key(r)] - r["stall"]),
+                     str(r["post"]),
+                     f"{r['beats_per_cycle']:.2f}"))
+
+    widths = [max(len(row[x]) for row in rows) for x in range(len(rows[0]))]
+
+    return "\n".join("  ".join(col.ljust(w) for col, w in zip(row, widths)).rstrip() for row in rows)
+
+
+def table(results: List[Dict[str, Any]]) -> str:
+    """Format the results as a table."""
+    rows = [("module", "parameters", "mode", "latency", "interval", "cycles/s", "beats/cycle")]
+
+    for r in results:
+        rows.append((r["module"],
+                     " ".join(f"{k}={v}" for k, v in r["parameter"].items()),
+                     r["mode"],
+                     str(r["latency"]),
+                     str(r["initiation_interval"]),
+                     f"{r['cycles_per_second']:.0f}",
+                     f"{r['beats_per_cycle']:.2f}"))
+
+    widths = [max(len(row[x]) for row in rows) for x in range(len(rows[0]))]
+
+    return "\n".join("  ".join(col.ljust(w) for col, w in zip(row, widths)).rstrip() for row in rows)
+
+
+def write_csv(path: Path, results: List[Dict[str, Any]]) -> None:
+    """Write the results to a CSV file, with the module parameters flattened into a single column."""
+    fields = list(results[0])
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for r in results:
+            writer.writerow(dict(r, parameter=" ".join(f"{k}={v}" for k, v in r["parameter"].items())))
+
+
+def main() -> int:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("module", nargs="*", help="modules to benchmark, all of the default matrix if not given")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=V1,V2",
+                        help="replace the values of a parameter within the matrix of the given modules")
+    parser.add_argument("--layer", action="store_true",
+                        help="benchmark a multi-filter layer over the engine with each weight load mode")
+    parser.add_argument("--cycles", type=int, default=20000, help="clock cycles simulated for each stream")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random streams")
+    parser.add_argument("--json", type=Path, help="write the results to a JSON file")
+    parser.add_argument("--csv", type=Path, help="write the results to a CSV file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    matrix = {m: dict(MATRIX[m]) for m in (args.module or MATRIX)}
+
+    for param in args.param:
+        name, values = param.split("=", 1)
+        for parameter in matrix.values():
+            if name in parameter:
+                parameter[name] = [int(v, 0) for v in values.split(",")]
+
+    commit = _commit()
+    results = []
+
+    if args.layer:
+        engine = dict(matrix.get("engine", MATRIX["engine"]), DOUBLE_BUFFER=[0, 1], ACTIVATION=[1])
+        for job in expand({"engine": engine}):
+            results.append(dict(run_layer(job["parameter"], LAYER), commit=commit))
+
+            for fused in (False, True):
+                results.append(dict(run_layer(job["parameter"], LAYER_FUSED, fused), commit=commit))
+
+        print(layer_table(results))
+    else:
+        for job in expand(matrix):
+            results.extend(dict(r, commit=commit) for r in run(job, args.cycles))
+
+        print(table(results))
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+    if args.csv:
+        write_csv(args.csv, results)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
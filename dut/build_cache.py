@@ -0,0 +1,177 @@
+"""
+Persistent cache of compiled designs shared across pytest sessions.
+
+Each design is built into a workspace named by a hash of the module name,
+clock, parameters and the contents of every HDL file it includes. When nothing
+in the hash has changed the workspace of the previous build is reused, and as
+Verilator skips sources that are identical to its last run and make skips
+targets that are up to date, the design is not re-verilated or recompiled.
+
+The cache directory and its size limit in bytes can be set with the
+BUILD_CACHE_DIR and BUILD_CACHE_SIZE environment variables. The least recently
+used workspaces are deleted when the cache grows past its size limit, except
+for the workspaces of designs still in use by any process, which hold a shared
+lock on the workspace for as long as the design exists.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import weakref
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional, Set
+
+import vpw
+
+CACHE_DIR = Path(os.environ.get("BUILD_CACHE_DIR", Path.home() / ".cache" / "streaming-convolution"))
+CACHE_SIZE = int(os.environ.get("BUILD_CACHE_SIZE", 4 * 1024**3))
+
+_INCLUDE = re.compile(r'^\s*`include\s+"([^"]+)"', re.MULTILINE)
+
+# arguments each design of this process was created with, indexed by the design
+_BUILDS: "weakref.WeakKeyDictionary[Any, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+
+def _find(name: str, include: List[Path]) -> Path:
+    """Find a HDL file within the include directories."""
+    for directory in include:
+        path = directory / name
+        if path.is_file():
+            return path
+
+    raise FileNotFoundError(f"Unable to find '{name}' in {[str(i) for i in include]}")
+
+
+def _sources(module: str, include: List[Path]) -> List[Path]:
+    """List the HDL file of the module and every file it transitively includes."""
+    found: Set[Path] = set()
+    pending = [_find(f"{module}.sv", include)]
+
+    while pending:
+        path = pending.pop()
+        if path in found:
+            continue
+
+        found.add(path)
+        pending.extend(_find(name, include) for name in _INCLUDE.findall(path.read_text()))
+
+    return sorted(found)
+
+
+def key(module: str, clock: str, include: List[str], parameter: Dict[str, Any]) -> str:
+    """Hash of everything that changes the compiled design."""
+    directories = [Path(i).resolve() for i in include]
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"module": module,
+                              "clock": clock,
+                              "include": [str(d) for d in directories],
+                              "parameter": {k: int(v) for k, v in parameter.items()}},
+                             sort_keys=True).encode())
+
+    for path in _sources(module, directories):
+        digest.update(str(path).encode())
+        digest.update(path.read_bytes())
+
+    return f"{module}-{digest.hexdigest()[:16]}"
+
+
+def _size(path: Path) -> int:
+    """Number of bytes used by the files within a directory."""
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def _lock(workspace: Path, operation: int) -> IO[str]:
+    """Open and lock the lock file of a workspace.
+
+    A lock file deleted by '_evict' while it was being locked is opened again,
+    so the lock is always held on the lock file found at its path.
+
+    Raises BlockingIOError if 'operation' includes LOCK_NB and the lock is held
+    by another process.
+    """
+    path = workspace.with_suffix(".lock")
+
+    while True:
+        lock = open(path, "a", encoding="utf-8")  # pylint: disable=consider-using-with
+        try:
+            fcntl.flock(lock, operation)
+            if path.exists() and os.path.samestat(os.fstat(lock.fileno()), path.stat()):
+                return lock
+        except BaseException:
+            lock.close()
+            raise
+
+        lock.close()
+
+
+def _evict(keep: Path) -> None:
+    """Delete the least recently used workspaces until the cache fits within its size limit.
+
+    Workspaces of designs in use, whose lock is held by any process, are skipped.
+    """
+    workspaces = [w for w in CACHE_DIR.iterdir() if w.is_dir() and w != keep]
+    workspaces.sort(key=lambda w: w.stat().st_mtime)
+
+    total = _size(keep) + sum(_size(w) for w in workspaces)
+
+    for workspace in workspaces:
+        if total <= CACHE_SIZE:
+            break
+
+        try:
+            lock = _lock(workspace, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            continue
+
+        with lock:
+            total -= _size(workspace)
+            shutil.rmtree(workspace, ignore_errors=True)
+            workspace.with_suffix(".lock").unlink()
+
+
+def create(module: str, clock: str, include: List[str], parameter: Dict[str, Any]) -> Any:
+    """Compile the design, reusing the workspace of an identical earlier build.
+
+    Takes the same arguments as 'vpw.create' except for the workspace, which is
+    chosen by the cache.
+    """
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    workspace = CACHE_DIR / key(module, clock, include, parameter)
+
+    # builds of the same design in parallel processes must not share a workspace at the same time
+    lock = _lock(workspace, fcntl.LOCK_EX)
+    try:
+        workspace.mkdir(exist_ok=True)
+        dut = vpw.create(module=module,
+                         clock=clock,
+                         include=include,
+                         parameter=parameter,
+                         workspace=str(workspace))
+
+        # mark the workspace as most recently used
+        os.utime(workspace)
+    except BaseException:
+        lock.close()
+        raise
+
+    # the design runs from its workspace, which must not be evicted until the design is released
+    fcntl.flock(lock, fcntl.LOCK_SH)
+    weakref.finalize(dut, lock.close)
+
+    _evict(workspace)
+
+    _BUILDS[dut] = {"module": module,
+                    "clock": clock,
+                    "include": [str(Path(i).resolve()) for i in include],
+                    "parameter": {k: int(v) for k, v in parameter.items()}}
+
+    return dut
+
+
+def arguments(dut: Any) -> Optional[Dict[str, Any]]:
+    """Arguments of 'create' a design was compiled with, None if it was not created by the cache."""
+    return _BUILDS.get(dut)
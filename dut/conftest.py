@@ -0,0 +1,147 @@
+"""
+Random seed, stimulus recording and waveforms shared by every testbench.
+
+Each test seeds the 'random' and NumPy random generators, with the SEED
+environment variable when it is set or otherwise a fresh seed, and the seed
+is reported when the test fails. Tests that simulate a design record their
+stimulus, which is saved to a binary trace in the STIMULUS_DIR directory
+(default 'stimulus') when the test fails, to be replayed with 'stimulus.py'.
+Only the last STIMULUS_DEPTH clocks (default 1M) of a test are kept. The
+files of a test run with PARAM_* overrides are named after the overrides too,
+so the parameter points of a regression run in parallel keep their own.
+
+The ports of a design are recorded into a VCD waveform in the WAVE_DIR
+directory (default 'waves') when either WAVE_DEPTH or WAVE_WINDOW is set.
+WAVE_DEPTH keeps a ring buffer of the last clocks, written when the test
+fails. WAVE_WINDOW, as 'first:last', records only that window of clocks and
+is written when the test ends. Setting WAVE_FST writes a compressed FST file
+instead, when the 'vcd2fst' tool is installed.
+
+To rerun a failing test with the seed it failed with.
+
+    SEED=1234 pytest -v engine.py -k test_stream_random
+
+To keep a waveform of the last 500 clocks before a failure.
+
+    WAVE_DEPTH=500 pytest -v rescale.py -k test_shift_random_number
+"""
+
+import os
+import random
+from pathlib import Path
+from typing import Optional, Tuple
+
+import build_cache
+import numpy as np
+import pytest
+from parameter import overrides
+from stimulus import Recorder, filename
+from waveform import Waveform
+
+STIMULUS_DIR = Path(os.environ.get("STIMULUS_DIR", "stimulus"))
+STIMULUS_DEPTH = int(os.environ.get("STIMULUS_DEPTH", 1 << 20))
+WAVE_DIR = Path(os.environ.get("WAVE_DIR", "waves"))
+WAVE_FST = bool(os.environ.get("WAVE_FST"))
+
+
+def _wave_depth() -> Optional[int]:
+    """Number of clocks held by the waveform ring buffer, None when not set."""
+    depth = os.environ.get("WAVE_DEPTH")
+    return None if depth is None else int(depth, 0)
+
+
+def _wave_window() -> Optional[Tuple[int, int]]:
+    """First and last clock of the waveform window, None when not set."""
+    window = os.environ.get("WAVE_WINDOW")
+    if window is None:
+        return None
+
+    first, last = window.split(":")
+    return int(first, 0), int(last, 0)
+
+
+@pytest.fixture(name="_seed", autouse=True)
+def seed(request):
+    """Seed the random generators of the test."""
+    value = os.environ.get("SEED")
+    value = random.SystemRandom().getrandbits(32) if value is None else int(value, 0)
+    random.seed(value)
+    np.random.seed(value)
+
+    request.node.user_properties.append(("seed", value))
+    yield value
+
+
+@pytest.fixture(name="_stimulus", autouse=True)
+def stimulus(request, _seed):
+    """Record the stimulus of tests that simulate a design."""
+    build = None
+    if "_design" in request.fixturenames:
+        build = build_cache.arguments(request.getfixturevalue("_design"))
+
+    if build is None:
+        yield None
+        return
+
+    recorder = Recorder(STIMULUS_DEPTH)
+    request.node.stimulus = {"recorder": recorder, "build": build}
+
+    recorder.start()
+    yield recorder
+    recorder.stop()
+
+
+@pytest.fixture(name="_waveform", autouse=True)
+def waveform(request, _stimulus):
+    """Record the ports of tests that simulate a design when a waveform depth or window is set."""
+    depth = _wave_depth()
+    window = _wave_window()
+
+    if _stimulus is None or (depth is None and window is None):
+        yield None
+        return
+
+    wave = Waveform(depth, window)
+    request.node.waveform = wave
+
+    wave.start()
+    yield wave
+    wave.stop()
+
+    # a window is written whether or not the test failed
+    if window is not None and len(wave):
+        module = request.node.stimulus["build"]["module"]
+        wave.write(WAVE_DIR / filename(request.node.nodeid, overrides()), module, WAVE_FST)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item):
+    """Report the seed of a failing test and save its stimulus, once for the first phase that fails."""
+    outcome = yield
+    report = outcome.get_result()
+
+    if not report.failed or getattr(item, "reported", False):
+        return
+
+    item.reported = True
+    seed_value = dict(item.user_properties).get("seed")
+    lines = [f"seed: {seed_value}, rerun with SEED={seed_value}"]
+
+    saved = getattr(item, "stimulus", None)
+    if saved is not None:
+        recorder = saved["recorder"]
+        failed = max(recorder.cycle - 1, 0)
+
+        meta = {"test": item.nodeid, "seed": seed_value, "build": saved["build"], "failed": failed}
+        path = recorder.save(STIMULUS_DIR / filename(item.nodeid, overrides()), meta)
+
+        lines.append(f"stimulus of {recorder.cycle} cycles saved to {path}, failed on cycle {failed}")
+        lines.append(f"replay with: python stimulus.py {path}")
+
+    wave = getattr(item, "waveform", None)
+    if wave is not None and _wave_window() is None and len(wave):
+        path = wave.write(WAVE_DIR / filename(item.nodeid, overrides()), saved["build"]["module"], WAVE_FST)
+        first, last = wave.span()
+        lines.append(f"waveform of cycles {first} to {last} saved to {path}")
+
+    report.sections.append(("seed and stimulus", "\n".join(lines)))
@@ -2,13 +2,26 @@
 Testbench for engine module.
 """
 
-import shutil
-import tempfile
+import random
+from collections import deque
 from enum import IntEnum
-from typing import Final, Generator, List
+from typing import Deque, Dict, Generator, List, NamedTuple, Tuple
 
+import build_cache
+import numpy as np
 import pytest
 import vpw
+from batch import drive, impulse
+from engine_model import Config, model_frame
+from engine_sim import EngineSim
+from fixed_point import (Activation, Rescale, Rounding, activation, activation_array, addition, multiply, signed,
+                         signed_array, twos, twos_array)
+from frame import FrameDriver, Stream
+from layer import WeightLoader
+from parameter import override
+from pipeline import config_hold, engine_latency, shadow_hold
+from raster import Geometry, pack, unpack
+from scoreboard import SLACK, Scoreboard
 
 
 class Param(IntEnum):
@@ -20,177 +33,149 @@ class Param(IntEnum):
     IMAGE_NB: Number of pixels in image bus.
     KERNEL_WIDTH: The width of the convolutional kernel
     KERNEL_HEIGHT: The height of the convolutional kernel
+    DOUBLE_BUFFER: Load weights into a shadow bank swapped in by 'weight_swap'
+    SKID_NB: Results held while 'result_ready' is low, 0 for no backpressure
+    ACTIVATION: Apply the configured activation function to the rescaled results
+    STRIDE: Kernel positions between the results of a row, must divide IMAGE_NB
+    DILATION: Pixels between the kernel columns
     """
-    WEIGHT_WIDTH = 8
-    IMAGE_WIDTH = 16
-    IMAGE_NB = 3
-    KERNEL_WIDTH = 3
-    KERNEL_HEIGHT = 3
+    WEIGHT_WIDTH = override("WEIGHT_WIDTH", 8)
+    IMAGE_WIDTH = override("IMAGE_WIDTH", 16)
+    IMAGE_NB = override("IMAGE_NB", 3)
+    KERNEL_WIDTH = override("KERNEL_WIDTH", 3)
+    KERNEL_HEIGHT = override("KERNEL_HEIGHT", 3)
+    DOUBLE_BUFFER = override("DOUBLE_BUFFER", 0)
+    SKID_NB = override("SKID_NB", 0)
+    ACTIVATION = override("ACTIVATION", 0)
+    STRIDE = override("STRIDE", 1)
+    DILATION = override("DILATION", 1)
 
 
 WORD_WIDTH = Param.IMAGE_WIDTH*Param.IMAGE_NB
+RESULT_NB = Param.IMAGE_NB//Param.STRIDE
+OUTPUT_WIDTH = Param.IMAGE_WIDTH*RESULT_NB
+SPAN_WIDTH = (Param.KERNEL_WIDTH-1)*Param.DILATION+1
+SPAN_HEIGHT = (Param.KERNEL_HEIGHT-1)*Param.DILATION+1
 RESULT_WIDTH = Param.IMAGE_WIDTH+Param.WEIGHT_WIDTH+1
+PRODUCT_WIDTH = Param.IMAGE_WIDTH+Param.WEIGHT_WIDTH
 KERNEL_NB = Param.KERNEL_WIDTH*Param.KERNEL_HEIGHT
-
-
-def _twos(width: int, data: int) -> int:
-    """Convert signed numbers into two's complement.
-
-    If a number sent in as a negatively signed int it will be converted to a
-    two's complement negative number with a defined bit width. Otherwise the
-    number is masked to not extra bits are expressed in the returned number.
-
-    Arguments
-    width: Number of bits used to express the data value
-    data: The number to be converted to two's complement
-    """
-    mask = (1 << width) - 1
-
-    if data < 0:
-        data = data + 2**width
-
-    return data & mask
-
-
-def _twos_extend(extend_width: int, data_width: int, data: int) -> int:
-    """Extend signed bit of a two's complement number.
-
-    Before performing an operation on a twos complement number its width must
-    be extended to be the same as the finial operator.
-
-    Arguments
-    extend_width: Number of bits used to express the extended data value
-    data_width: Number of bits used to express the data value
-    data: The number to be converted to two's complement
-    """
-    mask_data = (1 << data_width) - 1
-    mask_extend = (1 << extend_width) - 1
-    negative = 1 << (data_width - 1)
-
-    data = _twos(data_width, data)
-
-    if bool(data & negative):
-        data = (mask_extend ^ mask_data) | data
-
-    return data
-
-
-def _mac_multiply(m1: int, m2: int) -> int:
-    """Two's complement multiply."""
-    width = Param.IMAGE_WIDTH + Param.WEIGHT_WIDTH
-    mask = (1 << width) - 1
-
-    m1 = _twos_extend(width, Param.IMAGE_WIDTH, m1)
-    m2 = _twos_extend(width, Param.WEIGHT_WIDTH, m2)
-
-    return (m1 * m2) & mask
-
-
-def _mac_addition(addition: int, product: int) -> int:
-    """Two's complement addition."""
-    width_addition = Param.IMAGE_WIDTH + Param.WEIGHT_WIDTH + 1
-    width_product = Param.IMAGE_WIDTH + Param.WEIGHT_WIDTH
-    mask_addition = (1 << width_addition) - 1
-
-    addition = _twos(width_addition, addition)
-    product = _twos_extend(width_addition, width_product, product)
-
-    return (addition + product) & mask_addition
+LATENCY = engine_latency(Param.KERNEL_WIDTH, Param.KERNEL_HEIGHT, Param.SKID_NB, bool(Param.ACTIVATION))
+BOUND_MAX = (1 << (Param.IMAGE_WIDTH - 1)) - 1
+GEOMETRY = Geometry(Param.WEIGHT_WIDTH, Param.IMAGE_WIDTH, Param.IMAGE_NB, Param.KERNEL_WIDTH, Param.KERNEL_HEIGHT,
+                    Param.STRIDE, Param.DILATION)
 
 
 def _group_add(args: List[int]) -> int:
     """Two's complement group addition."""
-    width_sum = RESULT_WIDTH + 2
-    mask = (1 << RESULT_WIDTH) - 1
+    return twos(RESULT_WIDTH, sum(args))
 
-    args = [_twos_extend(width_sum, RESULT_WIDTH, a) for a in args]
 
-    return sum(args) & mask
+_rescale = Rescale(RESULT_WIDTH, Param.IMAGE_WIDTH)
 
+# the slice of result 's' is the kernel position ending at pixel '_PIXEL[s]' of the image bus, every STRIDE-th
+# position is kept, and its MAC 'x' takes the pixel at '_WRAP[s, x]' of the previous and current beats placed
+# side by side
+_PIXEL = (SPAN_WIDTH - 1) % Param.STRIDE + Param.STRIDE*np.arange(RESULT_NB)
+_WRAP = _PIXEL[:, None] + Param.IMAGE_NB - (Param.KERNEL_WIDTH - 1 - np.arange(Param.KERNEL_WIDTH))*Param.DILATION
 
-def _rescale(number: int, shift: int) -> int:
-    """Bounded rescale a fixed point number."""
-    num_mask = (1 << RESULT_WIDTH) - 1
-    negative = 1 << (RESULT_WIDTH - 1)
-    img_max = int((1 << (Param.IMAGE_WIDTH - 1)) - 1)
-    img_min = int((img_max + 1) * -1)
+# MACs with a pixel of the current beat add to its result, the others are partial results for the next beat
+_CURRENT = _WRAP >= Param.IMAGE_NB
 
-    # converts to twos complement of defined width
-    number = _twos(RESULT_WIDTH, number)
 
-    # convert number back into negative when down stream should be negative
-    if (number & negative) != 0 and RESULT_WIDTH >= (Param.IMAGE_WIDTH + shift):
-        number = int((num_mask - number + 1) * -1)
+class _Bank(NamedTuple):
+    """Kernel of signed weights and configuration used together by the module, or held in its shadow bank."""
+    weight: np.ndarray
+    config: Config
 
-    # raw value of shifted number
-    scaled = _twos(Param.IMAGE_WIDTH, (number >> shift))
 
-    if int(number >> shift) > img_max:
-        # shifted number greater than image max
-        scaled = _twos(Param.IMAGE_WIDTH, img_max)
-
-    if int(number >> shift) < img_min:
-        # shifted number less than image min
-        scaled = _twos(Param.IMAGE_WIDTH, img_min)
+class Checker:
+    """Model of Hardware Module
 
-    return scaled
+    Beats are held on the image bus until the module accepts them, and the
+    result of each accepted beat is expected by the scoreboard. The results of
+    a batch of beats accepted back to back are modeled at once by 'model'. Only results
+    flagged by 'result_valid' are matched, in order, as they are received.
+    With a module built with a skid buffer 'result_ready' is driven low on
+    random clocks, and results are then held back for as long as it stalls.
 
+    Arguments
+    ready_probability: Probability of 'result_ready' being high on any clock
+    """
+    def __init__(self, ready_probability: float = 1.0) -> None:
+        assert Param.IMAGE_NB >= SPAN_WIDTH, "Kernel positions must not span more than 2 beats."
+        assert Param.SKID_NB or ready_probability == 1.0, "Stalls need a module built with a skid buffer."
 
-class Checker:
-    """Model of Hardware Module"""
-    def __init__(self) -> None:
         self._reset: bool = False
-        self._shift: int = 0
-        self._weight: List[int] = [0]*KERNEL_NB
-        self._result: int = 0
-
-        self._slice_result: List[List[int]] = [[0]*Param.KERNEL_HEIGHT for _ in range(Param.IMAGE_NB)]
-        self._slice_partial: List[List[int]] = [[0]*Param.KERNEL_HEIGHT for _ in range(Param.IMAGE_NB)]
+        self._bank = _Bank(np.zeros((Param.KERNEL_HEIGHT, Param.KERNEL_WIDTH), dtype=np.int64), Config())
+        self._shadow = self._bank
 
-    def _slice(self, image: List[int], height: int, position: int) -> None:
-        """Modeling the slice modules logic."""
-        offset = position if position < Param.KERNEL_WIDTH-1 else Param.KERNEL_WIDTH-1
+        self._ready_probability = ready_probability
+        self._beats: Deque[np.ndarray] = deque()
 
-        image = image*2
-        image = image[offset+1:offset+Param.KERNEL_WIDTH+1:]
+        max_latency = None if ready_probability < 1.0 else LATENCY + SLACK
+        self.scoreboard = Scoreboard("result", max_latency=max_latency)
 
-        weight = self._weight[height*Param.KERNEL_WIDTH:height*Param.KERNEL_WIDTH+3:]
+        self._slice_partial: np.ndarray = np.zeros((Param.KERNEL_HEIGHT, RESULT_NB), dtype=np.int64)
 
-        result = self._slice_partial[position][height]
-        partial = 0
+    def _slice(self, image: np.ndarray) -> np.ndarray:
+        """Modeling the slice modules logic for every row and pixel of a batch of beats at once."""
+        product = signed_array(Param.IMAGE_WIDTH, image[:, :, _WRAP % Param.IMAGE_NB]) * self._bank.weight[:, None, :]
 
-        for x in range(Param.KERNEL_WIDTH):
-            if (offset == (Param.KERNEL_WIDTH-1)) or ((Param.KERNEL_WIDTH-1-offset) <= x):
-                result = _mac_addition(result, _mac_multiply(image[x], weight[x]))
-            else:
-                partial = _mac_addition(partial, _mac_multiply(image[x], weight[x]))
+        # the partial result of each beat is added to the beat after it
+        partial = twos_array(RESULT_WIDTH, np.where(_CURRENT, 0, product).sum(axis=3))
+        before = np.concatenate([self._slice_partial[None], partial[:-1]])
+        self._slice_partial = partial[-1]
 
-        self._slice_result[position][height] = result
-        self._slice_partial[position][height] = partial
+        return twos_array(RESULT_WIDTH, before + np.where(_CURRENT, product, 0).sum(axis=3))
 
     def reset(self, state: bool) -> None:
         """Prep 'reset' module and model."""
         vpw.prep("rst", [int(state)])
         self._reset = state
 
-    def send_shift(self, shift: int) -> None:
-        """Blocking function that sends the configuration value for the rescale module."""
-        mask = (1 << 7) - 1
-        self._shift = shift & mask
-        assert self._shift == shift, "shift value too large for the configuration bus."
+    def send_config(self, config: Config) -> None:
+        """Blocking function that sends the shift, rounding mode, bias and activation configuration of the module.
 
-        vpw.prep("cfg_shift", [shift])
+        With a double buffered module the configuration is written into the
+        shadow configuration, which is swapped into use with the weights.
+        """
+        mask = (1 << 7) - 1
+        assert config.shift & mask == config.shift, "shift value too large for the configuration bus."
+        self.shadow_config(config)
+        if not Param.DOUBLE_BUFFER:
+            self._bank = self._bank._replace(config=self._shadow.config)
+
+        vpw.prep("cfg_shift", [config.shift])
+        vpw.prep("cfg_rounding", [config.rounding])
+        vpw.prep("cfg_bias", vpw.pack(RESULT_WIDTH, config.bias))
+        vpw.prep("cfg_activation", [config.activation])
+        vpw.prep("cfg_bound", vpw.pack(Param.IMAGE_WIDTH - 1, config.bound))
+        vpw.prep("cfg_leak", [config.leak])
         vpw.prep("cfg_valid", [1])
         vpw.tick()
 
         vpw.prep("cfg_shift", [0])
+        vpw.prep("cfg_rounding", [0])
+        vpw.prep("cfg_bias", vpw.pack(RESULT_WIDTH, 0))
+        vpw.prep("cfg_activation", [0])
+        vpw.prep("cfg_bound", vpw.pack(Param.IMAGE_WIDTH - 1, 0))
+        vpw.prep("cfg_leak", [0])
         vpw.prep("cfg_valid", [0])
         vpw.tick()
 
+    def shadow_config(self, config: Config) -> None:
+        """Model the shadow configuration being written in the background, see 'layer.WeightLoader'."""
+        self._shadow = self._shadow._replace(config=config._replace(bias=signed(RESULT_WIDTH, config.bias)))
+
     def send_weight(self, weight: List[int]) -> None:
-        """Blocking function that sends a list of weights to module."""
+        """Blocking function that sends a list of weights to module.
+
+        With a double buffered module the weights are written into the shadow
+        bank, which is swapped into use on the clock ending the load.
+        """
         assert len(weight) == KERNEL_NB, f"Incorrect number of weights, given: {len(weight)}, expected: {KERNEL_NB}"
-        self._weight = weight
+        kernel = signed_array(Param.WEIGHT_WIDTH, weight).reshape(Param.KERNEL_HEIGHT, Param.KERNEL_WIDTH)
+        self._shadow = self._shadow._replace(weight=kernel)
 
         for w in weight:
             vpw.prep("weight", vpw.pack(Param.WEIGHT_WIDTH, w))
@@ -199,77 +184,137 @@ class Checker:
 
         vpw.prep("weight", vpw.pack(Param.WEIGHT_WIDTH, 0))
         vpw.prep("weight_valid", [0])
-        vpw.tick()
+        self._bank = self._shadow
 
-    def prep_image(self, image: List[int]) -> None:
-        """Prep stream values for the image bus."""
-        assert len(image) == Param.KERNEL_HEIGHT*Param.IMAGE_NB, \
-               f"Incorrect number of pixels, given: {len(image)}, expected: {Param.KERNEL_HEIGHT*Param.IMAGE_NB}"
+        if Param.DOUBLE_BUFFER:
+            vpw.prep("weight_swap", [1])
+            vpw.tick()
+            vpw.prep("weight_swap", [0])
+        else:
+            vpw.tick()
+
+    def shadow_weight(self, weight: List[int]) -> None:
+        """Model the shadow bank being written with a list of weights in the background, see 'layer.WeightLoader'."""
+        assert len(weight) == KERNEL_NB, f"Incorrect number of weights, given: {len(weight)}, expected: {KERNEL_NB}"
+        kernel = signed_array(Param.WEIGHT_WIDTH, weight).reshape(Param.KERNEL_HEIGHT, Param.KERNEL_WIDTH)
+        self._shadow = self._shadow._replace(weight=kernel)
+
+    def prep_swap(self) -> None:
+        """Prep a swap of the shadow weight bank into use, for the image beat prepped after it on the same clock."""
+        assert not self._beats, "Swap prepped while a beat is waiting to be accepted."
+        vpw.prep("weight_swap", [1])
+        self._bank = self._shadow
+
+    def busy(self) -> bool:
+        """Check if beats are waiting to be accepted or results to be received."""
+        return bool(self._beats or self.scoreboard)
+
+    def model(self, image: np.ndarray) -> np.ndarray:
+        """Model the result pixels of a batch of beats accepted back to back by the module.
+
+        Arguments
+        image: Array of (beats, kernel_height, image_nb) pixels of the image bus
+
+        Returns an array of (beats, image_nb/stride) pixels in two's complement form.
+        """
+        slice_result = self._slice(np.asarray(image))
+        column = signed_array(RESULT_WIDTH, slice_result).sum(axis=1)
 
+        shift, rounding, bias, function, bound, leak = self._bank.config
+        result = _rescale.array(column + bias, shift, rounding)
+
+        # the activation function is only applied by a module built with the activation stage
+        if Param.ACTIVATION:
+            result = activation_array(Param.IMAGE_WIDTH, result, function, bound, leak)
+
+        return result
+
+    def _expect(self, image: np.ndarray) -> int:
+        """Model the result bus of a beat accepted by the module."""
+        return pack(self.model(image[None])[0], Param.IMAGE_WIDTH)
+
+    def _prep_beat(self, image: np.ndarray) -> None:
+        """Prep a beat of pixels onto the image bus."""
         image_bus = 0
-        for x, i in enumerate(image):
+        for x, i in enumerate(image.flatten().tolist()):
             image_bus = image_bus | (i << (x*Param.IMAGE_WIDTH))
 
         vpw.prep("image", vpw.pack(Param.KERNEL_HEIGHT*WORD_WIDTH, image_bus))
         vpw.prep("image_valid", [1])
 
-        for h in range(Param.KERNEL_HEIGHT):
-            for s in range(Param.IMAGE_NB):
-                self._slice(image, h, s)
+    def prep_image(self, image: List[int]) -> None:
+        """Prep stream values for the image bus.
 
-        self._result = 0
-        for x, column in enumerate(self._slice_result):
-            self._result = self._result | (_rescale(_group_add(column), self._shift) << (x*Param.IMAGE_WIDTH))
+        The beat is queued behind the beats not yet accepted, and is prepped
+        once they have been.
+        """
+        assert len(image) == Param.KERNEL_HEIGHT*Param.IMAGE_NB, \
+               f"Incorrect number of pixels, given: {len(image)}, expected: {Param.KERNEL_HEIGHT*Param.IMAGE_NB}"
+        beat = np.reshape(image, (Param.KERNEL_HEIGHT, Param.IMAGE_NB))
 
-    def init(self, _) -> Generator:
-        """Background initilization function."""
-        PIPELINE: Final = 28
+        self._beats.append(beat)
+        if len(self._beats) == 1:
+            self._prep_beat(beat)
 
-        result_1m = 0
-        result = 0
-        result_p = [0]*PIPELINE
-        self._result = 0
+    def _handshake(self, io: Dict[str, int], ready: bool) -> bool:
+        """Check the result received and offer the next beat.
 
-        while True:
-            io = yield
-            hw_result = vpw.unpack(WORD_WIDTH, io["result"])
-            assert hw_result == result, f"{result_1m:x}, {hw_result:x} != {result:x}, {result_p}"
+        Returns the value of 'result_ready' prepped for the next clock.
+        """
+        self.scoreboard.tick()
 
-            result_1m = result
-            result = result_p[0]
-            result_p = result_p[1::]+[self._result]
-            self._result = 0
+        if io["result_valid"] and ready:
+            self.scoreboard.observe(vpw.unpack(OUTPUT_WIDTH, io["result"]))
 
-            vpw.prep("image", vpw.pack(Param.IMAGE_WIDTH*Param.IMAGE_NB, 0))
+        if self._beats and io["image_ready"]:
+            self.scoreboard.expect(self._expect(self._beats.popleft()))
+
+        if self._beats:
+            self._prep_beat(self._beats[0])
+        else:
+            vpw.prep("image", vpw.pack(Param.KERNEL_HEIGHT*WORD_WIDTH, 0))
             vpw.prep("image_valid", [0])
 
+        ready = random.random() < self._ready_probability
+        vpw.prep("result_ready", [int(ready)])
+
+        return ready
+
+    def init(self, _) -> Generator:
+        """Background initilization function."""
+        ready = True
+
+        while True:
+            io = yield
+            ready = self._handshake(io, ready)
+            vpw.prep("weight_swap", [0])
+
             if self._reset:
-                result_1m = 0
-                result = 0
-                result_p = [0]*PIPELINE
-                self._weight = [0]*KERNEL_NB
-                self._slice_result = [[0]*Param.KERNEL_HEIGHT for _ in range(Param.IMAGE_NB)]
-                self._slice_partial = [[0]*Param.KERNEL_HEIGHT for _ in range(Param.IMAGE_NB)]
+                self._beats.clear()
+                self.scoreboard.clear()
+                self._bank = _Bank(np.zeros((Param.KERNEL_HEIGHT, Param.KERNEL_WIDTH), dtype=np.int64), Config())
+                self._shadow = self._shadow._replace(config=Config())
+                self._slice_partial = np.zeros((Param.KERNEL_HEIGHT, RESULT_NB), dtype=np.int64)
 
 
 @pytest.fixture(name="_design", scope="module")
 def design():
     """Compile the design only once for all tests."""
-    workspace = tempfile.mkdtemp()
-
-    dut = vpw.create(module='engine',
-                     clock='clk',
-                     include=['../hdl'],
-                     parameter={'WEIGHT_WIDTH': Param.WEIGHT_WIDTH,
-                                'IMAGE_WIDTH': Param.IMAGE_WIDTH,
-                                'IMAGE_NB': Param.IMAGE_NB,
-                                'KERNEL_WIDTH': Param.KERNEL_WIDTH,
-                                'KERNEL_HEIGHT': Param.KERNEL_HEIGHT},
-                     workspace=workspace)
+    dut = build_cache.create(module='engine',
+                             clock='clk',
+                             include=['../hdl'],
+                             parameter={'WEIGHT_WIDTH': Param.WEIGHT_WIDTH,
+                                        'IMAGE_WIDTH': Param.IMAGE_WIDTH,
+                                        'IMAGE_NB': Param.IMAGE_NB,
+                                        'KERNEL_WIDTH': Param.KERNEL_WIDTH,
+                                        'KERNEL_HEIGHT': Param.KERNEL_HEIGHT,
+                                        'DOUBLE_BUFFER': Param.DOUBLE_BUFFER,
+                                        'SKID_NB': Param.SKID_NB,
+                                        'ACTIVATION': Param.ACTIVATION,
+                                        'STRIDE': Param.STRIDE,
+                                        'DILATION': Param.DILATION})
     yield dut
 
-    shutil.rmtree(workspace)
-
 
 @pytest.fixture(name="_context")
 def context(_design):
@@ -279,8 +324,10 @@ def context(_design):
     vpw.prep("rst", [1])
     vpw.prep("weight", vpw.pack(Param.WEIGHT_WIDTH, 0))
     vpw.prep("weight_valid", [0])
+    vpw.prep("weight_swap", [0])
     vpw.prep("image", vpw.pack(Param.KERNEL_HEIGHT*WORD_WIDTH, 0))
     vpw.prep("image_valid", [0])
+    vpw.prep("result_ready", [1])
     vpw.idle(2)
     vpw.prep("rst", [0])
     vpw.idle(2)
@@ -291,6 +338,95 @@ def context(_design):
     vpw.finish()
 
 
+def _model_sum(image: List[List[int]], weight: List[int], r: int, c: int, dilation: int = 1) -> int:
+    """Per-pixel model of the module arithmetic, the sum of the kernel position at row 'r' and column 'c'.
+
+    The kernel rows and columns are taken 'dilation' pixels apart.
+    """
+    column = []
+    for h in range(Param.KERNEL_HEIGHT):
+        result = 0
+        for x in range(Param.KERNEL_WIDTH):
+            pixel = image[r+h*dilation][c+x*dilation]
+            product = multiply(Param.IMAGE_WIDTH, Param.WEIGHT_WIDTH, pixel, weight[h*Param.KERNEL_WIDTH+x])
+            result = addition(RESULT_WIDTH, PRODUCT_WIDTH, result, product)
+        column.append(result)
+
+    return _group_add(column)
+
+
+def _check_frame(image: List[List[int]], weight: List[int], config: Config, geometry: Geometry = GEOMETRY) -> None:
+    """Check the vectorized frame model against the per-pixel model of the module arithmetic.
+
+    Arguments
+    image: Raster of random pixels
+    weight: Random kernel weights
+    config: Shift, rounding mode, bias, activation, bound and leak configuration
+    geometry: Module parameters, with the stride and dilation of the frame model
+    """
+    frame = model_frame(image, np.reshape(weight, (Param.KERNEL_HEIGHT, Param.KERNEL_WIDTH)), config, geometry)
+
+    rows = range(0, len(image) - geometry.span_height + 1, geometry.stride)
+    columns = range(0, len(image[0]) - geometry.span_width + 1, geometry.stride)
+    assert frame.shape == (len(rows), len(columns)), f"shape: {frame.shape}"
+
+    for r, top in enumerate(rows):
+        for c, left in enumerate(columns):
+            total = twos(RESULT_WIDTH, _model_sum(image, weight, top, left, geometry.dilation) + config.bias)
+            expected = activation(Param.IMAGE_WIDTH,
+                                  _rescale(total, config.shift, config.rounding),
+                                  config.activation,
+                                  config.bound,
+                                  config.leak)
+            assert frame[r][c] == expected, f"row: {r}, column: {c}, config: {config}, geometry: {geometry}"
+
+
+def _random_frame(height: int, width: int) -> Tuple[List[List[int]], List[int]]:
+    """Raster of random pixels and random kernel weights."""
+    image = [[random.getrandbits(Param.IMAGE_WIDTH) for _ in range(width)] for _ in range(height)]
+    weight = [random.getrandbits(Param.WEIGHT_WIDTH) for _ in range(KERNEL_NB)]
+
+    return image, weight
+
+
+@pytest.mark.parametrize("rounding", list(Rounding))
+def test_model_frame(rounding):
+    """Test the vectorized frame model for every shift with a rounding mode."""
+    image, weight = _random_frame(Param.KERNEL_HEIGHT + 3, Param.IMAGE_NB * 4)
+
+    for shift in range(RESULT_WIDTH + 1):
+        _check_frame(image, weight, Config(shift, rounding))
+
+
+@pytest.mark.parametrize("function", list(Activation))
+@pytest.mark.parametrize("stride, dilation", [(1, 1), (2, 1), (1, 2), (3, 2)])
+def test_model_frame_config(function, stride, dilation):
+    """Test the vectorized frame model with random biases, bounds and leaks, strided and dilated."""
+    height = (Param.KERNEL_HEIGHT - 1)*dilation + 2*stride + 2
+    width = (Param.KERNEL_WIDTH - 1)*dilation + Param.IMAGE_NB*stride + 1
+    image, weight = _random_frame(height, width)
+
+    # the largest biases wrap the sums around as the module does
+    for bias in [0, 1, twos(RESULT_WIDTH, -1)] + [random.getrandbits(RESULT_WIDTH) for _ in range(5)]:
+        config = Config(random.randint(0, RESULT_WIDTH), random.choice(list(Rounding)), bias, function,
+                        random.randint(0, BOUND_MAX), random.randint(0, 15))
+        _check_frame(image, weight, config, GEOMETRY._replace(stride=stride, dilation=dilation))
+
+
+def test_pipeline_depth(_context):
+    """Test that the module pipeline depth matches the depth derived from the module parameters."""
+    checker = Checker()
+    checker.send_config(Config())
+    checker.send_weight([1]*KERNEL_NB)
+    vpw.idle(4)
+
+    pixels = sum(1 << (x*Param.IMAGE_WIDTH) for x in range(Param.KERNEL_HEIGHT*Param.IMAGE_NB))
+    depth = impulse({"image": (Param.KERNEL_HEIGHT*WORD_WIDTH, pixels), "image_valid": (1, 1)},
+                    ("result", OUTPUT_WIDTH))
+
+    assert depth == LATENCY, f"Module is {depth} clock cycles deep."
+
+
 def test_stream_contiguous_2_beats(_context):
     """Test sending 2 contiguous beats of the image stream."""
     checker = Checker()
@@ -311,7 +447,10 @@ def test_stream_contiguous_2_beats(_context):
     checker.prep_image(image)
     vpw.tick()
 
-    vpw.idle(50)  # wait for longer then the pipelined depth of module
+    while checker.busy():
+        vpw.tick()
+
+    assert checker.scoreboard.matched == 2, f"{checker.scoreboard.matched} results of 2 beats."
 
 
 def test_stream_intermittent_2_beats(_context):
@@ -334,4 +473,332 @@ def test_stream_intermittent_2_beats(_context):
     checker.prep_image(image)
     vpw.tick()
 
-    vpw.idle(50)  # wait for longer then the pipelined depth of module
+    while checker.busy():
+        vpw.tick()
+
+    assert checker.scoreboard.matched == 2, f"{checker.scoreboard.matched} results of 2 beats."
+
+
+@pytest.mark.parametrize("rounding", list(Rounding))
+def test_stream_random(_context, rounding):
+    """Test a contiguous stream of random beats with random weights, shift and bias, rounded by a rounding mode."""
+    checker = Checker()
+    vpw.register(checker)
+
+    checker.send_config(Config(random.randint(1, RESULT_WIDTH - Param.IMAGE_WIDTH), rounding,
+                               random.getrandbits(RESULT_WIDTH)))
+    checker.send_weight([random.getrandbits(Param.WEIGHT_WIDTH) for _ in range(KERNEL_NB)])
+    vpw.idle(4)
+
+    for _ in range(1000):
+        checker.prep_image(_random_beat())
+        vpw.tick()
+
+    while checker.busy():
+        vpw.tick()
+
+    assert checker.scoreboard.matched == 1000, f"{checker.scoreboard.matched} results of 1000 beats."
+
+
+@pytest.mark.skipif(not Param.ACTIVATION, reason="module is built without the activation stage")
+@pytest.mark.parametrize("function", list(Activation))
+def test_stream_random_activation(_context, function):
+    """Test a contiguous stream of random beats with an activation function applied to the rescaled results."""
+    checker = Checker()
+    vpw.register(checker)
+
+    for _ in range(4):
+        checker.send_config(Config(random.randint(0, RESULT_WIDTH - Param.IMAGE_WIDTH),
+                                   random.choice(list(Rounding)),
+                                   random.getrandbits(RESULT_WIDTH),
+                                   function,
+                                   random.randint(0, BOUND_MAX),
+                                   random.randint(0, 15)))
+        checker.send_weight([random.getrandbits(Param.WEIGHT_WIDTH) for _ in range(KERNEL_NB)])
+
+        for _ in range(250):
+            checker.prep_image(_random_beat())
+            vpw.tick()
+
+        while checker.busy():
+            vpw.tick()
+
+    assert checker.scoreboard.matched == 1000, f"{checker.scoreboard.matched} results of 1000 beats."
+
+
+@pytest.mark.skipif(bool(Param.SKID_NB), reason="batches are driven without the result handshake")
+def test_stream_batch(_context):
+    """Test batches of contiguous beats, each with its own bias and shift, against the batched model."""
+    checker = Checker()
+    weight = [random.getrandbits(Param.WEIGHT_WIDTH) for _ in range(KERNEL_NB)]
+
+    for _ in range(4):
+        bias = random.getrandbits(RESULT_WIDTH)
+        checker.send_config(Config(random.randint(0, RESULT_WIDTH - Param.IMAGE_WIDTH), random.choice(list(Rounding)),
+                                   bias))
+
+        # a double buffered module swaps the configuration into use with the weights
+        checker.send_weight(weight)
+
+        image = np.random.randint(0, 1 << Param.IMAGE_WIDTH, (500, Param.KERNEL_HEIGHT, Param.IMAGE_NB))
+        valid = np.concatenate([np.ones(len(image), dtype=np.int64), np.zeros(LATENCY, dtype=np.int64)])
+        bus = [pack(beat, Param.IMAGE_WIDTH) for beat in image] + [0]*LATENCY
+
+        result = drive({"image": (Param.KERNEL_HEIGHT*WORD_WIDTH, bus), "image_valid": (1, valid)},
+                       {"result": OUTPUT_WIDTH, "result_valid": 1})
+
+        received = [unpack(r, Param.IMAGE_WIDTH, RESULT_NB)
+                    for r, v in zip(result["result"].tolist(), result["result_valid"].tolist()) if v]
+        expected = checker.model(image)
+
+        assert len(received) == len(image), f"{len(received)} results of {len(image)} beats."
+        mismatch = np.argwhere(np.array(received) != expected)
+        assert mismatch.size == 0, f"First mismatch at (beat, pixel) {mismatch[:1].tolist()} of {len(mismatch)}"
+
+
+def test_stream_random_intermittent(_context):
+    """Test an intermittent stream of random beats with random weights and shift."""
+    checker = Checker()
+    vpw.register(checker)
+
+    checker.send_config(Config(random.randint(0, RESULT_WIDTH)))
+    checker.send_weight([random.getrandbits(Param.WEIGHT_WIDTH) for _ in range(KERNEL_NB)])
+    vpw.idle(4)
+
+    beat_nb = 0
+    for _ in range(1000):
+        if bool(random.getrandbits(1)):
+            image = [random.getrandbits(Param.IMAGE_WIDTH) for _ in range(Param.KERNEL_HEIGHT*Param.IMAGE_NB)]
+            checker.prep_image(image)
+            beat_nb += 1
+
+        vpw.tick()
+
+    while checker.busy():
+        vpw.tick()
+
+    assert checker.scoreboard.matched == beat_nb, f"{checker.scoreboard.matched} results of {beat_nb} beats."
+
+
+def _random_beat() -> List[int]:
+    """Random pixels of every row of an image beat."""
+    return [random.getrandbits(Param.IMAGE_WIDTH) for _ in range(Param.KERNEL_HEIGHT*Param.IMAGE_NB)]
+
+
+@pytest.mark.skipif(not Param.DOUBLE_BUFFER, reason="module is built without a shadow weight bank")
+def test_weight_swap(_context):
+    """Test kernels and their configuration loaded into the shadow banks and swapped in during a stream of beats."""
+    checker = Checker()
+    vpw.register(checker)
+
+    checker.send_config(Config(random.randint(0, RESULT_WIDTH)))
+    checker.send_weight([random.getrandbits(Param.WEIGHT_WIDTH) for _ in range(KERNEL_NB)])
+
+    for _ in range(4):
+        weight = [random.getrandbits(Param.WEIGHT_WIDTH) for _ in range(KERNEL_NB)]
+        config = Config(random.randint(0, RESULT_WIDTH),
+                        random.choice(list(Rounding)),
+                        random.getrandbits(RESULT_WIDTH),
+                        random.choice(list(Activation)),
+                        random.randint(0, BOUND_MAX),
+                        random.randint(0, 15))
+        loader = WeightLoader(weight,
+                              GEOMETRY,
+                              hold=shadow_hold(Param.KERNEL_WIDTH),
+                              config=config,
+                              config_delay=config_hold(Param.KERNEL_WIDTH, Param.KERNEL_HEIGHT))
+        vpw.register(loader)
+        checker.shadow_weight(weight)
+        checker.shadow_config(config)
+
+        while not loader.done():
+            checker.prep_image(_random_beat())
+            vpw.tick()
+
+        # with a skid buffer the beats held back must be accepted before the swap
+        while checker.busy():
+            vpw.tick()
+
+        checker.prep_swap()
+
+        for _ in range(random.randint(1, 2*LATENCY)):
+            checker.prep_image(_random_beat())
+            vpw.tick()
+
+    while checker.busy():
+        vpw.tick()
+
+
+@pytest.mark.skipif(not Param.SKID_NB, reason="module is built without a skid buffer")
+def test_backpressure(_context):
+    """Test that beats are only accepted while the skid buffer has room for their results."""
+    checker = Checker()
+    checker.send_weight([random.getrandbits(Param.WEIGHT_WIDTH) for _ in range(KERNEL_NB)])
+    vpw.idle(4)
+
+    vpw.prep("image_valid", [1])
+    vpw.prep("result_ready", [0])
+
+    accepted = 0
+    for _ in range(2*(LATENCY + Param.SKID_NB)):
+        io = vpw.tick()
+        accepted += io["image_ready"]
+
+    assert accepted == Param.SKID_NB, f"{accepted} beats accepted with room for {Param.SKID_NB} results."
+
+    vpw.prep("image_valid", [0])
+    vpw.prep("result_ready", [1])
+
+    received = 0
+    for _ in range(2*Param.SKID_NB):
+        io = vpw.tick()
+        received += io["result_valid"]
+
+    assert received == Param.SKID_NB, f"{received} results received of {Param.SKID_NB} beats accepted."
+
+
+@pytest.mark.skipif(not Param.SKID_NB, reason="module is built without a skid buffer")
+@pytest.mark.parametrize("valid_probability, ready_probability", [(1.0, 0.9), (1.0, 0.5), (0.5, 0.5), (1.0, 0.1)])
+def test_stream_random_stall(_context, valid_probability, ready_probability):
+    """Test a stream of random beats with random gaps and down stream stalls."""
+    checker = Checker(ready_probability)
+    vpw.register(checker)
+
+    checker.send_config(Config(random.randint(0, RESULT_WIDTH)))
+    checker.send_weight([random.getrandbits(Param.WEIGHT_WIDTH) for _ in range(KERNEL_NB)])
+    vpw.idle(4)
+
+    beat_nb = 0
+    for _ in range(1000):
+        if random.random() < valid_probability:
+            checker.prep_image(_random_beat())
+            beat_nb += 1
+
+        vpw.tick()
+
+    while checker.busy():
+        vpw.tick()
+
+    assert checker.scoreboard.matched == beat_nb, f"{checker.scoreboard.matched} results of {beat_nb} beats."
+
+
+def _stream_frame(valid_probability: float, ready_probability: float = 1.0) -> None:
+    """Stream a random frame through the module and check the output raster against the frame model."""
+    height = SPAN_HEIGHT + 5*Param.STRIDE
+    width = Param.IMAGE_NB * 5
+    shift = 4
+
+    image = np.random.randint(0, 1 << Param.IMAGE_WIDTH, (height, width), dtype=np.int64)
+    weight = [random.getrandbits(Param.WEIGHT_WIDTH) for _ in range(KERNEL_NB)]
+
+    checker = Checker()
+    checker.send_config(Config(shift))
+    checker.send_weight(weight)
+    vpw.idle(4)
+
+    driver = FrameDriver(iter(image), (height, width), GEOMETRY, Stream(valid_probability, ready_probability))
+    vpw.register(driver)
+
+    while not driver.done():
+        vpw.tick()
+
+    expected = model_frame(image, np.reshape(weight, (Param.KERNEL_HEIGHT, Param.KERNEL_WIDTH)), Config(shift),
+                           GEOMETRY)
+
+    mismatch = np.argwhere(driver.result != expected)
+    assert mismatch.size == 0, f"First mismatch at (row, column) {mismatch[:1].tolist()} of {len(mismatch)}"
+
+    # only the row windows of the kept kernel positions are sent
+    beat_nb = len(expected)*(width // Param.IMAGE_NB)
+    assert driver.beat_nb == beat_nb, f"{driver.beat_nb} beats sent, expected: {beat_nb}"
+
+
+def test_stream_frame(_context):
+    """Test streaming a whole frame as a contiguous stream of beats."""
+    _stream_frame(1.0)
+
+
+def test_stream_frame_intermittent(_context):
+    """Test streaming a whole frame as an intermittent stream of beats."""
+    _stream_frame(0.5)
+
+
+@pytest.mark.skipif(not Param.SKID_NB, reason="module is built without a skid buffer")
+def test_stream_frame_stall(_context):
+    """Test streaming a whole frame with random down stream stalls."""
+    _stream_frame(1.0, 0.5)
+
+
+def _engine_sim() -> EngineSim:
+    """Cycle accurate model of the module with the module parameters."""
+    return EngineSim(GEOMETRY, double_buffer=bool(Param.DOUBLE_BUFFER), activation=bool(Param.ACTIVATION))
+
+
+def _random_stimulus(cycles: int, valid_probability: float, reset: bool) -> Dict[str, np.ndarray]:
+    """Random values for every input port of the module, with a kernel loaded first."""
+    rst = (np.random.random(cycles) < 0.01) if reset else np.zeros(cycles, dtype=bool)
+    weight_valid = np.random.random(cycles) < 0.05
+    weight_valid[:KERNEL_NB] = True
+    weight_swap = np.random.random(cycles) < 0.02
+    weight_swap[KERNEL_NB] = True
+    rst[:KERNEL_NB+1] = False
+
+    return {"rst": rst.astype(np.int64),
+            "cfg_shift": np.random.randint(0, RESULT_WIDTH + 1, cycles),
+            "cfg_rounding": np.random.randint(0, 4, cycles),
+            "cfg_bias": np.random.randint(0, 1 << RESULT_WIDTH, cycles),
+            "cfg_activation": np.random.randint(0, len(Activation), cycles),
+            "cfg_bound": np.random.randint(0, BOUND_MAX + 1, cycles),
+            "cfg_leak": np.random.randint(0, 16, cycles),
+            "cfg_valid": (np.random.random(cycles) < 0.02).astype(np.int64),
+            "weight": np.random.randint(0, 1 << Param.WEIGHT_WIDTH, cycles),
+            "weight_valid": weight_valid.astype(np.int64),
+            "weight_swap": weight_swap.astype(np.int64),
+            "image": np.random.randint(0, 1 << Param.IMAGE_WIDTH, (cycles, Param.KERNEL_HEIGHT, Param.IMAGE_NB)),
+            "image_valid": (np.random.random(cycles) < valid_probability).astype(np.int64)}
+
+
+def test_engine_sim_block():
+    """Test the engine model computing whole blocks of beats against stepping it one clock edge at a time."""
+    block = _engine_sim()
+    step = _engine_sim()
+
+    for x in range(20):
+        stimulus = _random_stimulus(random.randint(LATENCY, 400), random.random(), reset=x % 4 == 3)
+        if x % 2 == 0:
+            stimulus["image_valid"][-LATENCY:] = 0  # let the pipeline empty for the next block
+
+        result = block.run(stimulus)
+
+        for k in range(len(stimulus["rst"])):
+            expected = step.step({name: values[k] for name, values in stimulus.items()})
+            assert np.array_equal(result[k], expected), f"block: {x}, cycle: {k}"
+
+
+@pytest.mark.skipif(bool(Param.SKID_NB), reason="engine model does not model the skid buffer")
+@pytest.mark.parametrize("valid_probability", [1.0, 0.5])
+def test_engine_sim(_context, valid_probability):
+    """Test the cycle accurate engine model against the module with random resets, weights, configuration and gaps."""
+    sim = _engine_sim()
+    stimulus = _random_stimulus(2000, valid_probability, reset=True)
+
+    inputs = {"rst": (1, stimulus["rst"]),
+              "cfg_shift": (8, stimulus["cfg_shift"]),
+              "cfg_rounding": (2, stimulus["cfg_rounding"]),
+              "cfg_bias": (RESULT_WIDTH, stimulus["cfg_bias"]),
+              "cfg_activation": (2, stimulus["cfg_activation"]),
+              "cfg_bound": (Param.IMAGE_WIDTH - 1, stimulus["cfg_bound"]),
+              "cfg_leak": (4, stimulus["cfg_leak"]),
+              "cfg_valid": (1, stimulus["cfg_valid"]),
+              "weight": (Param.WEIGHT_WIDTH, stimulus["weight"]),
+              "weight_valid": (1, stimulus["weight_valid"]),
+              "weight_swap": (1, stimulus["weight_swap"]),
+              "image": (Param.KERNEL_HEIGHT*WORD_WIDTH, [pack(beat, Param.IMAGE_WIDTH) for beat in stimulus["image"]]),
+              "image_valid": (1, stimulus["image_valid"])}
+
+    result = drive(inputs, {"result": OUTPUT_WIDTH})["result"]
+    expected = sim.run(stimulus)
+
+    for k, bus in enumerate(result.tolist()):
+        pixels = unpack(bus, Param.IMAGE_WIDTH, RESULT_NB)
+        assert np.array_equal(pixels, expected[k]), f"cycle: {k}, module: {pixels}, model: {expected[k]}"
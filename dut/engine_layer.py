@@ -0,0 +1,75 @@
+"""
+Testbench for layers computed as passes over the engine module.
+
+A layer of many input channels and filters is streamed through the engine by
+'layer.convolve', one pass per channel and filter, and checked against
+'engine_model.model_layer'. The engine is built with the parameters of the
+engine testbench, see 'engine.Param'.
+"""
+
+import random
+from typing import Dict
+
+import numpy as np
+import pytest
+from engine import BOUND_MAX, GEOMETRY, KERNEL_NB, RESULT_WIDTH, Param
+from engine import context, design  # noqa: F401 pylint: disable=W0611
+from engine_model import Config, Layer, model_layer
+from fixed_point import Activation, Rounding
+from layer import convolve
+
+# a module built without the activation stage can only fuse a layer without an activation function
+FUSED_ACTIVATION = list(Activation) if Param.ACTIVATION else [Activation.NONE]
+
+
+def _stream_layer(channel_nb: int, filter_nb: int, rounding: int, function: int, fused: bool) -> Dict[str, int]:
+    """Stream a random layer through the module and check its result against the layer model.
+
+    Arguments
+    channel_nb: Number of input channels
+    filter_nb: Number of filters
+    rounding: Rescale rounding mode of the layer
+    function: Activation function of the layer
+    fused: Bias, rescale and activate the passes of a single channel layer on the module
+
+    Returns the number of clocks spent on each part of the layer.
+    """
+    shift = 6
+
+    image = np.random.randint(0, 1 << Param.IMAGE_WIDTH,
+                              (channel_nb, GEOMETRY.span_height + 2*Param.STRIDE, Param.IMAGE_NB * 3), dtype=np.int64)
+    weight = np.random.randint(0, 1 << Param.WEIGHT_WIDTH,
+                               (filter_nb, channel_nb, Param.KERNEL_HEIGHT, Param.KERNEL_WIDTH), dtype=np.int64)
+    bias = np.random.randint(0, 1 << RESULT_WIDTH, filter_nb, dtype=np.int64)
+    config = Config(shift, rounding, activation=function, bound=random.randint(0, BOUND_MAX),
+                    leak=random.randint(0, 15))
+    layer = Layer(weight, config, bias, fused)
+
+    result, cycles = convolve(image, layer, GEOMETRY, double_buffer=bool(Param.DOUBLE_BUFFER))
+    expected = model_layer(image, layer, GEOMETRY)
+
+    mismatch = np.argwhere(result != expected)
+    assert mismatch.size == 0, f"First mismatch at (filter, row, column) {mismatch[:1].tolist()} of {len(mismatch)}"
+
+    return cycles
+
+
+@pytest.mark.parametrize("function", list(Activation))
+def test_stream_layer(_context, function):
+    """Test a layer of many input channels and filters with the host post-processing of the passes."""
+    channel_nb = 3
+    filter_nb = 2
+
+    cycles = _stream_layer(channel_nb, filter_nb, random.choice(list(Rounding)), function, fused=False)
+
+    loads = 1 if Param.DOUBLE_BUFFER else channel_nb*filter_nb
+    assert cycles["weight"] == loads*(KERNEL_NB + 1), f"{cycles}"
+
+
+@pytest.mark.parametrize("rounding", list(Rounding))
+@pytest.mark.parametrize("function", FUSED_ACTIVATION)
+def test_stream_layer_fused(_context, rounding, function):
+    """Test a single channel layer with the bias, shift and activation of each filter applied by the module."""
+    cycles = _stream_layer(1, 3, rounding, function, fused=True)
+
+    assert cycles["post"] == 0, f"{cycles}"
@@ -0,0 +1,177 @@
+"""
+Vectorized reference model for the engine module.
+"""
+
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from fixed_point import Activation, Rescale, Rounding, activation_array, signed, signed_array
+from raster import Geometry
+
+
+class Config(NamedTuple):
+    """Configuration of the engine module, as written into its registers on 'cfg_valid'.
+
+    Attributes
+    shift: Rescale shift configuration
+    rounding: Rescale rounding mode configuration
+    bias: Bias configuration added to the sums, in the two's complement form of the 'cfg_bias' bus
+    activation: Activation function configuration, of an engine built with the activation stage
+    bound: Upper bound configuration of the clamp activation
+    leak: Shift configuration of the leaky activation
+    """
+    shift: int = 0
+    rounding: int = Rounding.TRUNCATE
+    bias: int = 0
+    activation: int = Activation.NONE
+    bound: int = 0
+    leak: int = 0
+
+
+class Layer(NamedTuple):
+    """Kernels and post-processing of a multi-channel, multi-filter layer.
+
+    Attributes
+    weight: Kernels of (filters, channels, kernel height, kernel width) weights
+    config: Shift, rounding mode, activation, bound and leak of the layer, the bias of each filter replaces its bias
+    bias: Bias of each filter in the two's complement form of the 'cfg_bias' bus, None for no bias
+    fused: Bias, rescale and activate the passes of a single channel layer on the engine
+    """
+    weight: np.ndarray
+    config: Config = Config()
+    bias: Optional[np.ndarray] = None
+    fused: bool = False
+
+
+def _window(image: np.ndarray, kernel: Tuple[int, int], stride: int = 1, dilation: int = 1) -> np.ndarray:
+    """Pixels under the kernel at every kept position of the rasters held in the last two axes of 'image'.
+
+    Arguments
+    image: Rasters of (..., height, width) pixels
+    kernel: Kernel height and width
+    stride: Pixels between the kernel positions kept, in both directions
+    dilation: Pixels between the rows and columns of the kernel
+
+    Returns a view of (..., rows, columns, kernel height, kernel width) pixels.
+    """
+    span = tuple((k - 1)*dilation + 1 for k in kernel)
+    window = sliding_window_view(image, span, axis=(-2, -1))
+
+    return window[..., ::stride, ::stride, ::dilation, ::dilation]
+
+
+def model_frame(image: np.ndarray,
+                weight: np.ndarray,
+                config: Config = Config(),
+                geometry: Geometry = Geometry()) -> np.ndarray:
+    """Expected engine output for a whole raster image.
+
+    The image is convolved (as a cross-correlation) with the kernel over every
+    position where the kernel fits within the raster, keeping every 'stride'
+    position in both directions, with the kernel rows and columns 'dilation'
+    pixels apart. The multiply and accumulate steps and the bias add wrap as
+    the two's complement hardware does before the result is rescaled, rounded
+    and saturated to the image width, and the activation function is then
+    applied to the result.
+
+    Arguments
+    image: Raster of (height, width) pixels
+    weight: Kernel of (kernel height, kernel width) weights
+    config: Shift, rounding mode, bias, activation function, bound and leak configuration
+    geometry: Number widths, kernel size, stride and dilation of the engine
+
+    Returns an array of ((height-span height)//stride+1, (width-span width)//stride+1)
+    pixels in the two's complement form found on the 'result' bus, where the
+    span of the kernel is (kernel size-1)*dilation+1 pixels.
+    """
+    image = signed_array(geometry.image_width, image)
+    weight = signed_array(geometry.weight_width, weight)
+
+    assert image.ndim == 2, f"Image must be a 2D raster, given {image.ndim} dimensions"
+    assert weight.shape == (geometry.kernel_height, geometry.kernel_width), f"Kernel of {weight.shape} weights"
+
+    window = _window(image, weight.shape, geometry.stride, geometry.dilation)
+    total = np.einsum("rcij,ij->rc", window, weight) + signed(geometry.result_width, config.bias)
+
+    result = Rescale(geometry.result_width, geometry.image_width).array(total, config.shift, config.rounding)
+
+    return activation_array(geometry.image_width, result, config.activation, config.bound, config.leak)
+
+
+def layer_width(channel_nb: int, weight_width: int = 8, image_width: int = 16) -> int:
+    """Number width of the sums accumulated across the input channels of a layer."""
+    return image_width + weight_width + 1 + (channel_nb - 1).bit_length()
+
+
+def post_process(partial: np.ndarray, layer: Layer, geometry: Geometry = Geometry()) -> np.ndarray:
+    """Host post-processing of the passes of a layer.
+
+    The results of the passes of a filter are accumulated across the input
+    channels, the bias of the filter is added, the sum is rescaled with the
+    layer shift and the activation function of the layer is applied. A bias
+    is as wide as the 'cfg_bias' bus of the engine, and its sum with the
+    channels is one bit wider than either.
+
+    Arguments
+    partial: Results of the passes as (filters, channels, height, width) signed pixels
+    layer: Bias of each filter and the shift, rounding mode and activation of the layer
+    geometry: Number widths of the engine
+
+    Returns an array of (filters, height, width) pixels in the two's complement form found on the 'result' bus.
+    """
+    config = layer.config
+    width = layer_width(partial.shape[1], geometry.weight_width, geometry.image_width)
+    total = partial.sum(axis=1)
+
+    if layer.bias is not None:
+        width = max(width, geometry.result_width) + 1
+        total = total + signed_array(geometry.result_width, np.asarray(layer.bias))[:, None, None]
+
+    result = Rescale(width, geometry.image_width).array(total, config.shift, config.rounding)
+
+    return activation_array(geometry.image_width, result, config.activation, config.bound, config.leak)
+
+
+def model_layer(image: np.ndarray, layer: Layer, geometry: Geometry = Geometry()) -> np.ndarray:
+    """Expected output of a multi-channel layer computed by passes over the engine.
+
+    Every input channel is convolved with the kernel of every filter in its
+    own pass with no rescale shift, so the result of a pass is saturated to the
+    image width. The passes of a filter are accumulated across the input
+    channels and the sum is biased, rescaled and activated once by
+    'post_process'.
+
+    A layer of a single input channel can instead be fused, with the bias,
+    shift, rounding mode and activation of each filter configured for its pass
+    and applied by the engine, and its results are then the layer output.
+
+    Arguments
+    image: Rasters of (channels, height, width) pixels
+    layer: Kernels, bias and post-processing of the layer
+    geometry: Number widths, kernel size, stride and dilation of the engine
+
+    Returns an array of (filters, rows, columns) pixels, as the output rasters
+    of 'model_frame', in the two's complement form found on the 'result' bus.
+    """
+    if layer.fused:
+        assert np.shape(image)[0] == 1, f"Only a layer of one channel can be fused, given {np.shape(image)[0]}"
+        bias = np.zeros(np.shape(layer.weight)[0], dtype=np.int64) if layer.bias is None else np.asarray(layer.bias)
+
+        return np.stack([model_frame(image[0], layer.weight[f, 0], layer.config._replace(bias=int(b)), geometry)
+                         for f, b in enumerate(bias.tolist())])
+
+    image = signed_array(geometry.image_width, image)
+    weight = signed_array(geometry.weight_width, layer.weight)
+
+    assert image.ndim == 3, f"Image must be 3D (channels, height, width), given {image.ndim} dimensions"
+    assert weight.ndim == 4, f"Weight must be 4D (filters, channels, height, width), given {weight.ndim} dimensions"
+    assert image.shape[0] == weight.shape[1], f"Channels of image {image.shape[0]} and weight {weight.shape[1]} differ"
+
+    window = _window(image, weight.shape[2:], geometry.stride, geometry.dilation)
+    total = np.einsum("crxij,fcij->fcrx", window, weight)
+
+    partial = signed_array(geometry.image_width, Rescale(geometry.result_width, geometry.image_width).array(total, 0))
+
+    return post_process(partial, layer, geometry)
@@ -0,0 +1,769 @@
+"""
+Cycle accurate model of the engine module for long throughput studies.
+
+The model follows the registers of the engine HDL on every clock edge: the
+rotating token of the weight load, the image delay lines and MAC pipelines of
+every slice, the partial results carried into the next valid beat, the
+group_add, bias add, rescale and activation pipelines, the shadow weight
+bank and configuration and their swap, and the effect of 'rst' on each of
+them. No HDL build is needed and long streams run orders of magnitude faster
+than the RTL simulation.
+
+A block of clock cycles without a reset, that starts and ends with the
+pipeline empty, is computed for all of its beats at once: each MAC takes the
+weight held by its register on the clock edge the delayed pixel reaches it,
+and each beat adds the partial results of the beat before it. Other blocks
+are stepped one clock edge at a time. The model is cross-checked against the
+RTL by the engine testbench.
+
+To study the frame rate of a stream of frames.
+
+    python engine_sim.py --height 64 --width 64 --frames 4 --valid 0.8
+"""
+
+import argparse
+import sys
+import time
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+import numpy as np
+from engine_model import Config, model_frame
+from fixed_point import Rescale, activation_array, signed_array
+from pipeline import (ACTIVATION_LATENCY, BIAS_LATENCY, MAC_LATENCY, MULTIPLY_ADD_LATENCY, RESCALE_LATENCY, DelayLine,
+                      config_hold, engine_latency, group_add_latency)
+from raster import Geometry, Tag, beats, place
+
+# beats computed together within a block, to bound the memory used by long streams
+CHUNK_NB = 4096
+
+# configuration ports loaded on 'cfg_valid', in the order of the 'engine_model.Config' fields
+CONFIG = ("cfg_shift", "cfg_rounding", "cfg_bias", "cfg_activation", "cfg_bound", "cfg_leak")
+
+# input ports of the module with a single number, the 'image' port holds a beat of pixels
+PORTS = ("rst",) + CONFIG + ("cfg_valid", "weight", "weight_valid", "weight_swap", "image_valid")
+
+
+def _held(value: np.ndarray, load: np.ndarray, initial: Any) -> np.ndarray:
+    """Value held by a register before each clock edge of a block, with the value after the block last.
+
+    Arguments
+    value: Value on the register input on each clock edge
+    load: Whether the register is loaded on each clock edge
+    initial: Value held by the register before the block
+    """
+    edge = np.where(load, np.arange(load.size), -1)
+    edge = np.concatenate([[-1], np.maximum.accumulate(edge)]) if load.size else np.array([-1])
+
+    return np.where(edge >= 0, value[edge], initial)
+
+
+class _History:
+    """Ring buffer of the values shifted into a chain of registers, one value per clock edge.
+
+    Arguments
+    size: Number of values held
+    shape: Shape of each value
+    dtype: Type of the values
+    """
+    def __init__(self, size: int, shape: Tuple[int, ...] = (), dtype: Any = bool) -> None:
+        self._data = np.zeros((size,) + shape, dtype=dtype)
+        self._head = 0
+
+    @property
+    def size(self) -> int:
+        """Number of values held."""
+        return self._data.shape[0]
+
+    def past(self, age: Any, *index: Any) -> Any:
+        """Value pushed 'age' pushes before the last push, or the elements of it selected by 'index'."""
+        return self._data[((self._head - age) % self.size,) + index]
+
+    def push(self, value: Any) -> None:
+        """Shift a value in, dropping the oldest value."""
+        self._head = (self._head + 1) % self.size
+        self._data[self._head] = value
+
+    def extend(self, values: Any) -> None:
+        """Shift each of the values in turn."""
+        for value in values:
+            self.push(value)
+
+    def clear(self) -> None:
+        """Set every value back to zero."""
+        self._data[:] = 0
+
+    def any(self) -> bool:
+        """Check if any value held is not zero."""
+        return bool(self._data.any())
+
+
+class _Wiring(NamedTuple):
+    """Slice parameters of every (result pixel, MAC), as found in engine.sv and slice.sv.
+
+    Attributes
+    pixel: Image pixel taken by each MAC
+    delay: Clock edges the image is delayed by before each MAC
+    valid: Age of the image valid bit that loads the product register of each MAC
+    last: Slices whose kernel position ends within its own beat
+    current: MACs adding to the result of their own beat, the others sum a partial result for the next beat
+    carry: Product register holding the partial result carried by each slice, zero for the last slices
+    row: Kernel rows, to index (row, pixel, MAC) arrays
+    column: Kernel columns, to index (row, pixel, MAC) arrays
+    """
+    pixel: np.ndarray
+    delay: np.ndarray
+    valid: np.ndarray
+    last: np.ndarray
+    current: np.ndarray
+    carry: np.ndarray
+    row: np.ndarray
+    column: np.ndarray
+
+
+def _wiring(geometry: Geometry) -> _Wiring:
+    """Slice parameters of an engine, each slice computes the kernel position ending at image pixel 's'."""
+    width = geometry.kernel_width
+    s = (geometry.span_width - 1) % geometry.stride + geometry.stride*np.arange(geometry.result_nb)[:, None]
+    x = np.arange(width)[None, :]
+    offset = np.minimum(s // geometry.dilation, width - 1)
+    extend = np.where((offset == width - 1) | (width - 1 - offset > x), 1, 0)
+    last = offset[:, 0] == width - 1
+
+    return _Wiring(pixel=(s + geometry.image_nb - (width - 1 - x)*geometry.dilation) % geometry.image_nb,
+                   delay=MAC_LATENCY*x + extend,
+                   valid=MAC_LATENCY*(x + 1) - (3 - extend) + 1,
+                   last=last,
+                   current=(extend == 0) | last[:, None],
+                   carry=np.where(last, 0, width - 1 - offset[:, 0]),
+                   row=np.arange(geometry.kernel_height)[:, None, None],
+                   column=np.arange(width))
+
+
+class _Weights:
+    """Weight registers of the MACs, the shadow weight bank and the rotating token of the weight load.
+
+    Arguments
+    geometry: Parameters of the engine
+    wiring: Slice parameters of the engine
+    double_buffer: Load weights into a shadow bank swapped in by 'weight_swap'
+    """
+    def __init__(self, geometry: Geometry, wiring: _Wiring, double_buffer: bool) -> None:
+        self._geometry = geometry
+        self._wiring = wiring
+        self._double_buffer = double_buffer
+
+        # registers not cleared by 'rst'
+        self.active = np.zeros((geometry.kernel_height, geometry.result_nb, geometry.kernel_width), dtype=np.int64)
+        self.shadow = np.zeros((geometry.kernel_height, geometry.kernel_width), dtype=np.int64)
+
+        # registers cleared by 'rst'
+        self.token = 0
+        self._swap = _History(int(wiring.delay.max()))
+
+    def swapping(self) -> bool:
+        """Check if a weight swap is still on its way to a MAC."""
+        return self._swap.any()
+
+    def step(self, ports: Mapping[str, Any]) -> None:
+        """Apply a clock edge with the given port values."""
+        g = self._geometry
+
+        if self._double_buffer:
+            # each MAC copies the shadow bank as the swap reaches it along with the image, 'delay - 1' edges after
+            # the swap is sent
+            delay = self._wiring.delay
+            swap = np.where(delay == 1, bool(ports["weight_swap"]), self._swap.past(delay - 2))
+            self.active = np.where(swap, self.shadow[:, None, :], self.active)
+            self._swap.push(bool(ports["weight_swap"]))
+
+        if ports["weight_valid"]:
+            h, x = divmod(self.token, g.kernel_width)
+            if self._double_buffer:
+                self.shadow[h, x] = signed_array(g.weight_width, ports["weight"])
+            else:
+                self.active[h, :, x] = signed_array(g.weight_width, ports["weight"])
+
+        if ports["rst"]:
+            self._swap.clear()
+            self.token = 0
+        elif ports["weight_valid"]:
+            self.token = (self.token + 1) % (g.kernel_width*g.kernel_height)
+
+    def held(self, ports: Mapping[str, np.ndarray]) -> np.ndarray:
+        """Weights held by the registers written from the 'weight' port before each clock edge of a block.
+
+        The token selects the register written on each edge, with a shadow bank the registers are the shadow bank.
+
+        Returns an array of (kernel_height, kernel_width, cycles + 1) weights, with the weights after the block last.
+        """
+        g = self._geometry
+        weight_valid = ports["weight_valid"] != 0
+
+        token = (self.token + np.concatenate([[0], np.cumsum(weight_valid)])) % (g.kernel_width*g.kernel_height)
+        value = signed_array(g.weight_width, ports["weight"].astype(np.int64))
+        bank = self.shadow if self._double_buffer else self.active[:, 0, :]
+        weight = np.stack([_held(value, weight_valid & (token[:-1] == k), w)
+                           for k, w in enumerate(bank.flatten().tolist())])
+
+        return weight.reshape(g.kernel_height, g.kernel_width, weight_valid.size + 1)
+
+    def _copied(self, shadow: np.ndarray, swap: np.ndarray, last: np.ndarray, initial: np.ndarray) -> np.ndarray:
+        """Weights copied from the shadow bank by the last swap sent on or before the 'last' edge of each MAC."""
+        w = self._wiring
+        index = np.searchsorted(swap, last, side="right") - 1
+        if swap.size == 0:
+            return np.broadcast_to(initial, np.broadcast_shapes(initial.shape, index.shape)).copy()
+
+        copied = shadow[w.row, w.column, swap[np.maximum(index, 0)] + w.delay - 1]
+        return np.where(index >= 0, copied, initial)
+
+    def beat(self, weight: np.ndarray, swap: np.ndarray, edge: np.ndarray) -> np.ndarray:
+        """Weight of every (beat, row, pixel, MAC) held on the edge the delayed pixel of the beat reaches the MAC.
+
+        Arguments
+        weight: Weights held by the registers written from the 'weight' port before each clock edge
+        swap: Clock edges a weight swap is sent on
+        edge: Clock edges the beats are sent on
+        """
+        if self._double_buffer:
+            return self._copied(weight, swap, edge[:, None, None, None], self.active)
+
+        w = self._wiring
+        return weight[w.row, w.column, edge[:, None, None, None] + w.delay]
+
+    def settle(self, ports: Mapping[str, np.ndarray], weight: np.ndarray, swap: np.ndarray) -> None:
+        """Leave the registers as they are after a block computed from the 'held' weights."""
+        g = self._geometry
+        cycle_nb = ports["weight_valid"].size
+        self.token = (self.token + int(np.count_nonzero(ports["weight_valid"]))) % (g.kernel_width*g.kernel_height)
+
+        if self._double_buffer:
+            self.shadow = weight[:, :, -1].copy()
+            self.active = self._copied(weight, swap, cycle_nb - self._wiring.delay, self.active)
+            self._swap.extend(ports["weight_swap"][-self._swap.size:] != 0)
+        else:
+            self.active[:] = weight[:, None, :, -1]
+
+
+class _Config:
+    """Configuration registers of the bias add, rescale and activation and the shadow configuration.
+
+    A configuration is the tuple of the shift, rounding mode, bias, activation
+    function, clamp bound and leak.
+
+    Arguments
+    geometry: Parameters of the engine
+    double_buffer: Load the configuration into a shadow configuration swapped in by 'weight_swap'
+    """
+    def __init__(self, geometry: Geometry, double_buffer: bool) -> None:
+        self._bias_width = geometry.result_width
+        self._double_buffer = double_buffer
+        self._hold = config_hold(geometry.kernel_width, geometry.kernel_height)
+
+        # registers cleared by 'rst'
+        self.active: Tuple[int, ...] = (0,)*len(CONFIG)
+        self.shadow: Tuple[int, ...] = (0,)*len(CONFIG)
+        self._swap = _History(self._hold)
+
+    def swapping(self) -> bool:
+        """Check if a weight swap is still on its way to the bias add."""
+        return self._swap.any()
+
+    def swapped(self) -> bool:
+        """Check if a weight swap sent with a beat reaches the bias add with its sums on the next clock edge."""
+        return self._double_buffer and bool(self._swap.past(self._hold - 1))
+
+    def current(self) -> Tuple[int, ...]:
+        """Configuration of the bias add on the next clock edge.
+
+        The beat sent with a swap is biased with the shadow configuration as it is moved into use.
+        """
+        return self.shadow if self.swapped() else self.active
+
+    def _values(self, ports: Mapping[str, Any]) -> List[np.ndarray]:
+        """Values of the configuration ports, with the bias in two's complement form."""
+        values = [np.asarray(ports[name], dtype=np.int64) for name in CONFIG]
+        values[2] = signed_array(self._bias_width, values[2])
+
+        return values
+
+    def step(self, ports: Mapping[str, Any]) -> None:
+        """Apply a clock edge with the given port values."""
+        if ports["rst"]:
+            self._swap.clear()
+            self.active = self.shadow = (0,)*len(CONFIG)
+            return
+
+        if self.swapped():
+            self.active = self.shadow
+
+        if self._double_buffer:
+            self._swap.push(bool(ports["weight_swap"]))
+
+        if ports["cfg_valid"]:
+            config = tuple(int(v) for v in self._values(ports))
+            if self._double_buffer:
+                self.shadow = config
+            else:
+                self.active = config
+
+    def held(self, ports: Mapping[str, np.ndarray]) -> np.ndarray:
+        """Configuration held by the registers written on 'cfg_valid' before each clock edge of a block.
+
+        With a double buffer the registers are the shadow configuration.
+
+        Returns an array of (6, cycles + 1) values, with the configuration after the block last.
+        """
+        initial = self.shadow if self._double_buffer else self.active
+
+        return np.stack([_held(v, ports["cfg_valid"] != 0, i) for v, i in zip(self._values(ports), initial)])
+
+    def beat(self, config: np.ndarray, swap: np.ndarray, edge: np.ndarray) -> np.ndarray:
+        """Configuration of the bias add for the sums of the beats sent on each 'edge'.
+
+        Arguments
+        config: Configuration held by the registers written on 'cfg_valid' before each clock edge
+        swap: Clock edges a weight swap is sent on
+        edge: Clock edges the beats are sent on
+        """
+        if not self._double_buffer:
+            return config[:, edge + self._hold]
+
+        # the shadow configuration moved into use by the last swap sent on or before each beat
+        index = np.searchsorted(swap, edge, side="right") - 1
+        active = np.array(self.active, dtype=np.int64)[:, None]
+        if swap.size == 0:
+            return np.broadcast_to(active, (active.shape[0], edge.size)).copy()
+
+        copied = config[:, np.minimum(swap[np.maximum(index, 0)] + self._hold, config.shape[1] - 1)]
+        return np.where(index >= 0, copied, active)
+
+    def settle(self, ports: Mapping[str, np.ndarray], config: np.ndarray, swap: np.ndarray) -> None:
+        """Leave the registers as they are after a block computed from the 'held' configuration."""
+        if self._double_buffer:
+            last = np.array([ports["cfg_valid"].size - 1 - self._hold])
+            self.active = tuple(int(v) for v in self.beat(config, swap, last)[:, 0])
+            self.shadow = tuple(int(v) for v in config[:, -1])
+            self._swap.extend(ports["weight_swap"][-self._swap.size:] != 0)
+        else:
+            self.active = tuple(int(v) for v in config[:, -1])
+
+
+class _Slices:
+    """Image delay lines, MAC pipelines and result registers of the slices.
+
+    Arguments
+    geometry: Parameters of the engine
+    wiring: Slice parameters of the engine
+    """
+    def __init__(self, geometry: Geometry, wiring: _Wiring) -> None:
+        self._geometry = geometry
+        self._wiring = wiring
+        depth = MAC_LATENCY*geometry.kernel_width + 1
+
+        # registers not cleared by 'rst'
+        self._image = _History(depth, (geometry.kernel_height, geometry.image_nb), np.int64)
+        self._slice = np.zeros((geometry.kernel_height, geometry.result_nb), dtype=np.int64)
+
+        # registers cleared by 'rst'
+        self.valid = _History(depth + 1 + group_add_latency(geometry.kernel_height))
+        self._mac: DelayLine[np.ndarray] = DelayLine(MULTIPLY_ADD_LATENCY, self._zero_mac())
+        self._product = np.zeros((geometry.kernel_height, geometry.result_nb, geometry.kernel_width + 1),
+                                 dtype=np.int64)
+
+    def _zero_mac(self) -> np.ndarray:
+        """MAC pipeline inputs 'm1', 'm2' and 'add' of every slice as held after a reset."""
+        g = self._geometry
+        return np.zeros((3, g.kernel_height, g.result_nb, g.kernel_width), dtype=np.int64)
+
+    def output(self) -> np.ndarray:
+        """Result of every (row, slice) before the clock edge."""
+        if self.valid.past(MAC_LATENCY*self._geometry.kernel_width):
+            last = self._product[:, :, -1]
+        else:
+            last = np.zeros_like(self._slice)
+
+        return np.where(self._wiring.last, last, self._slice)
+
+    def step(self, ports: Mapping[str, Any], weight: np.ndarray) -> None:
+        """Apply a clock edge with the given port values and the 'weight' held before the edge."""
+        g = self._geometry
+        w = self._wiring
+
+        if self.valid.past(MAC_LATENCY*g.kernel_width - 1):
+            self._slice = self._product[:, :, -1].copy()
+        else:
+            self._slice = np.zeros_like(self._slice)
+
+        m1 = self._image.past(w.delay - 1, w.row, w.pixel)
+        mac_m1, mac_m2, mac_add = self._mac.push(np.stack([m1, weight, self._product[:, :, :-1]]))
+        mac = signed_array(g.result_width, mac_add + mac_m1*mac_m2)
+
+        if ports["rst"]:
+            self._mac.reset()
+            self._product[:] = 0
+            self.valid.clear()
+        else:
+            self._product[:, :, 1:] = np.where(self.valid.past(w.valid), mac, self._product[:, :, 1:])
+            self.valid.push(bool(ports["image_valid"]))
+
+        image = ports["image"]
+        self._image.push(0 if image is None else signed_array(g.image_width, image))
+
+    def sums(self, image: np.ndarray, weight: np.ndarray) -> np.ndarray:
+        """Column sums of the beats sent back to back, each adding the partial result of the beat before it.
+
+        Arguments
+        image: Array of (beat, kernel_height, image_nb) pixels
+        weight: Weight of every (beat, row, pixel, MAC) held on the edge the pixel reaches the MAC
+
+        Returns an array of (beat, result_nb) sums, the product registers are left with the sums of the last beat.
+        """
+        w = self._wiring
+        width = self._geometry.result_width
+
+        # (beat, row, pixel, MAC) products of the pixel and weight on the edge each MAC is reached
+        product = image[:, w.row, w.pixel]*weight
+        current = np.where(w.current, product, 0)
+        partial = np.where(w.current, 0, product)
+
+        # partial result of the beat before, held by the product register of the first current MAC
+        carried = self._product[w.row[:, :, 0], np.arange(self._geometry.result_nb), w.carry]
+        before = np.concatenate([carried[None], partial[:-1].sum(axis=3)])
+        slice_result = signed_array(width, np.where(w.last, 0, before) + current.sum(axis=3))
+
+        chain = np.where(w.current,
+                         np.where(w.last, 0, before[-1])[:, :, None] + np.cumsum(current[-1], axis=2),
+                         np.cumsum(partial[-1], axis=2))
+        self._product[:, :, 1:] = signed_array(width, chain)
+
+        return signed_array(width, slice_result.sum(axis=1))
+
+    def settle(self, ports: Mapping[str, np.ndarray]) -> None:
+        """Leave the registers as they are after a block that ends with the pipeline empty.
+
+        The MAC pipeline inputs are never used before being replaced.
+        """
+        image = ports["image"][-self._image.size:].astype(np.int64)
+        self._image.extend(signed_array(self._geometry.image_width, image))
+        self.valid.clear()
+        self._slice = np.zeros_like(self._slice)
+        self._mac.reset()
+
+
+class _Tail:
+    """Pipelines of the group_add, bias add, rescale and activation after the slices.
+
+    Arguments
+    geometry: Parameters of the engine
+    activation: Apply the configured activation function to the rescaled results
+    """
+    def __init__(self, geometry: Geometry, activation: bool) -> None:
+        self._geometry = geometry
+        self.activation = activation
+        self._rescale = Rescale(geometry.result_width, geometry.image_width)
+
+        # registers not cleared by 'rst'
+        self._group: Optional[DelayLine[np.ndarray]] = None
+        if group_add_latency(geometry.kernel_height):
+            self._group = DelayLine(group_add_latency(geometry.kernel_height),
+                                    np.zeros(geometry.result_nb, dtype=np.int64))
+        self._bias: DelayLine[Tuple[np.ndarray, Tuple[int, ...]]] = DelayLine(
+            BIAS_LATENCY, (np.zeros(geometry.result_nb, dtype=np.int64), (0,)*len(CONFIG)))
+
+        # the activation function leaves zero at zero, so it is applied along with rescale and delayed by both
+        depth = RESCALE_LATENCY + (ACTIVATION_LATENCY if activation else 0)
+        self._result: DelayLine[np.ndarray] = DelayLine(depth, np.zeros(geometry.result_nb, dtype=np.int64))
+
+    def step(self, slice_result: np.ndarray, config: Tuple[int, ...], valid: bool) -> np.ndarray:
+        """Sample the 'result' output and then apply a clock edge.
+
+        Arguments
+        slice_result: Result of every (row, slice) before the clock edge
+        config: Configuration of the bias add on the clock edge
+        valid: Whether the sums reaching the bias add are of a beat
+
+        Returns the 'result' pixels in two's complement form.
+        """
+        width = self._geometry.result_width
+
+        column = signed_array(width, slice_result.sum(axis=0))
+        if self._group is not None:
+            column = self._group.push(column)
+
+        if valid:
+            column = signed_array(width, column + config[2])
+
+        column, config = self._bias.push((column, config))
+        return self._result.push(self.rescale(column, config))
+
+    def rescale(self, column: np.ndarray, config: Any) -> np.ndarray:
+        """Rescale and activate biased sums with a configuration, or with arrays of the configuration values."""
+        shift, rounding, _, mode, bound, leak = config
+        data = self._rescale.array(column, shift, rounding)
+        if not self.activation:
+            return data
+
+        return activation_array(self._geometry.image_width, data, mode, bound, leak)
+
+    def reset(self) -> None:
+        """Leave the pipelines empty after a block."""
+        self._bias.reset()
+        self._result.reset()
+        if self._group is not None:
+            self._group.reset()
+
+
+class EngineSim:
+    """Model of the engine module registers.
+
+    Each call of 'step' returns the 'result' output sampled before a clock
+    edge and then applies the edge with the given inputs, in the same way as a
+    'vpw.tick' samples the design.
+
+    Arguments
+    geometry: Parameters of the engine
+    double_buffer: Load weights into a shadow bank swapped in by 'weight_swap'
+    activation: Apply the configured activation function to the rescaled results
+    """
+    def __init__(self, geometry: Geometry = Geometry(), double_buffer: bool = False, activation: bool = False) -> None:
+        assert geometry.image_nb >= geometry.span_width, "Kernel positions must not span more than 2 beats."
+        assert geometry.image_nb % geometry.stride == 0, \
+            f"Stride {geometry.stride} must divide the {geometry.image_nb} pixels of the image bus."
+
+        wiring = _wiring(geometry)
+
+        self.geometry = geometry
+        self._weights = _Weights(geometry, wiring, double_buffer)
+        self._config = _Config(geometry, double_buffer)
+        self._slices = _Slices(geometry, wiring)
+        self._tail = _Tail(geometry, activation)
+
+        # clock edges since the last beat or reset, the pipeline is empty once this reaches the latency
+        self._quiet = self.latency
+        self.cycle_nb = 0
+
+    @property
+    def latency(self) -> int:
+        """Clock edges from a beat being sent until its result is sampled."""
+        return engine_latency(self.geometry.kernel_width, self.geometry.kernel_height,
+                              activation=self._tail.activation)
+
+    def step(self, ports: Mapping[str, Any]) -> np.ndarray:
+        """Sample the 'result' output and then apply a clock edge with the given inputs.
+
+        Arguments
+        ports: Port name mapped to its value, with the 'image' port holding an array of (kernel_height, image_nb)
+               pixels. Ports that are not given are zero.
+
+        Returns the 'result' pixels in two's complement form.
+        """
+        ports = {**dict.fromkeys(PORTS, 0), "image": None, **ports}
+        g = self.geometry
+
+        self.cycle_nb += 1
+        self._quiet = 0 if ports["rst"] or ports["image_valid"] else self._quiet + 1
+
+        valid = self._slices.valid.past(MAC_LATENCY*g.kernel_width + group_add_latency(g.kernel_height))
+        result = self._tail.step(self._slices.output(), self._config.current(), bool(valid))
+
+        # the MACs take the weights held before the clock edge
+        self._slices.step(ports, self._weights.active)
+        self._weights.step(ports)
+        self._config.step(ports)
+
+        return result
+
+    def _block(self, ports: Dict[str, np.ndarray]) -> np.ndarray:
+        """Compute a block of clock cycles without a reset for all of its beats at once."""
+        cycle_nb = ports["image_valid"].size
+
+        config = self._config.held(ports)
+        weight = self._weights.held(ports)
+
+        # with a shadow bank, each MAC copies it on the edge a swap reaches the MAC
+        swap = np.flatnonzero(ports["weight_swap"])
+
+        result = np.zeros((cycle_nb, self.geometry.result_nb), dtype=np.int64)
+
+        beat = np.flatnonzero(ports["image_valid"])
+        for edge in np.array_split(beat, range(CHUNK_NB, beat.size, CHUNK_NB)) if beat.size else []:
+            image = signed_array(self.geometry.image_width, ports["image"][edge].astype(np.int64))
+            column = self._slices.sums(image, self._weights.beat(weight, swap, edge))
+
+            beat_config = self._config.beat(config, swap, edge)[:, :, None]
+            result[edge + self.latency] = self._tail.rescale(column + beat_config[2], beat_config)
+
+        self._quiet = cycle_nb - 1 - int(beat[-1]) if beat.size else self._quiet + cycle_nb
+
+        self._weights.settle(ports, weight, swap)
+        self._config.settle(ports, config, swap)
+        self._slices.settle(ports)
+        self._tail.reset()
+
+        self.cycle_nb += cycle_nb
+
+        return result
+
+    def run(self, inputs: Mapping[str, Any]) -> np.ndarray:
+        """Run a block of clock cycles.
+
+        The value at index 'k' of every input array is applied on the k-th
+        clock edge and index 'k' of the returned array is the 'result' sampled
+        before that edge, as returned by 'batch.drive'. Ports that are not
+        given are zero.
+
+        Arguments
+        inputs: Port name mapped to an array of per cycle values, with the 'image'
+                array holding (cycles, kernel_height, image_nb) pixels
+
+        Returns an array of (cycles, result_nb) pixels in two's complement form.
+        """
+        cycles = {len(values) for values in inputs.values()}
+        assert len(cycles) == 1, f"Input arrays must all be the same length, given lengths: {cycles}"
+        cycle_nb = cycles.pop()
+
+        ports = {name: np.zeros(cycle_nb, dtype=np.int64) for name in PORTS}
+        ports["image"] = np.zeros((cycle_nb, self.geometry.kernel_height, self.geometry.image_nb), dtype=np.int64)
+        ports.update({name: np.asarray(values) for name, values in inputs.items()})
+
+        edge = np.flatnonzero(ports["image_valid"])
+        flushed = edge.size == 0 or edge[-1] + self.latency < cycle_nb
+
+        swapping = self._weights.swapping() or self._config.swapping()
+        if self._quiet >= self.latency and flushed and not ports["rst"].any() and not swapping:
+            return self._block(ports)
+
+        result = np.zeros((cycle_nb, self.geometry.result_nb), dtype=np.int64)
+        for k in range(cycle_nb):
+            result[k] = self.step({name: values[k] for name, values in ports.items()})
+
+        return result
+
+
+def load_kernel(sim: EngineSim, weight: np.ndarray, config: Config) -> int:
+    """Load a configuration and then a kernel of (kernel height, kernel width) weights into the model.
+
+    Returns the clock cycles taken.
+    """
+    kernel = np.asarray(weight).flatten()
+    idle = np.zeros(kernel.size, dtype=np.int64)
+
+    inputs = {name: np.concatenate([[value], idle]) for name, value in zip(CONFIG, config)}
+    inputs.update({"cfg_valid": np.concatenate([[1], idle]),
+                   "weight": np.concatenate([[0], kernel]),
+                   "weight_valid": np.concatenate([[0], np.ones(kernel.size, dtype=np.int64)])})
+    sim.run(inputs)
+
+    return 1 + kernel.size
+
+
+def _schedule(frames: np.ndarray,
+              geometry: Geometry,
+              valid_probability: float,
+              seed: int) -> Tuple[List[Tuple[int, Tag]], np.ndarray, np.ndarray]:
+    """Cut the frames into beats, each sent after a geometric number of clocks without a beat.
+
+    Returns the frame and position of every beat, the clock edges they are
+    sent on and an array of their (beat, kernel_height, image_nb) pixels.
+    """
+    tags = []
+    bus = []
+    for f, frame in enumerate(frames):
+        for tag, beat in beats(iter(frame), geometry):
+            tags.append((f, tag))
+            bus.append(beat)
+
+    if valid_probability < 1.0:
+        gap = np.random.default_rng(seed).geometric(valid_probability, len(tags))
+    else:
+        gap = np.ones(len(tags), dtype=np.int64)
+
+    return tags, np.cumsum(gap) - 1, np.array(bus)
+
+
+def study(sim: EngineSim, frames: np.ndarray, valid_probability: float = 1.0, seed: int = 0) -> Dict[str, Any]:
+    """Stream frames back to back through a loaded model and measure the cycles taken.
+
+    The results are reassembled into output rasters.
+
+    Arguments
+    sim: Engine model, loaded with a kernel and configuration by 'load_kernel'
+    frames: Array of (frame, height, width) pixels
+    valid_probability: Probability of a beat being sent on any clock
+    seed: Seed of the random gaps in the image stream
+
+    Returns the measurements and the output rasters under the 'result' key.
+    """
+    tags, edge, bus = _schedule(frames, sim.geometry, valid_probability, seed)
+    cycle_nb = int(edge[-1]) + 1 + sim.latency
+
+    image = np.zeros((cycle_nb, sim.geometry.kernel_height, sim.geometry.image_nb), dtype=np.int64)
+    image[edge] = bus
+
+    seconds = time.perf_counter()
+    output = sim.run({"image": image, "image_valid": np.bincount(edge, minlength=cycle_nb)})
+    seconds = time.perf_counter() - seconds
+
+    result = np.zeros((len(frames),) + sim.geometry.shape(*frames.shape[1:]), dtype=np.int64)
+    for (f, tag), e in zip(tags, edge.tolist()):
+        place(result[f], tag, output[e + sim.latency], sim.geometry)
+
+    return {"frames": len(frames),
+            "beats": len(tags),
+            "result_pixels": len(tags)*sim.geometry.result_nb,
+            "cycles": cycle_nb,
+            "cycles_per_frame": cycle_nb / len(frames),
+            "utilization": len(tags) / cycle_nb,
+            "seconds": seconds,
+            "cycles_per_second": cycle_nb / seconds,
+            "result": result}
+
+
+def main() -> int:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weight-width", type=int, default=8)
+    parser.add_argument("--image-width", type=int, default=16)
+    parser.add_argument("--image-nb", type=int, default=8)
+    parser.add_argument("--kernel-width", type=int, default=3)
+    parser.add_argument("--kernel-height", type=int, default=3)
+    parser.add_argument("--stride", type=int, default=1, help="kernel positions between the results")
+    parser.add_argument("--dilation", type=int, default=1, help="pixels between the kernel rows and columns")
+    parser.add_argument("--height", type=int, default=32, help="rows of each frame")
+    parser.add_argument("--width", type=int, default=32, help="pixels in each row of a frame")
+    parser.add_argument("--frames", type=int, default=1, help="number of frames streamed")
+    parser.add_argument("--valid", type=float, default=1.0, help="probability of a beat being sent on any clock")
+    parser.add_argument("--clock", type=float, default=250.0, help="clock frequency in MHz of the frame rate")
+    parser.add_argument("--check", action="store_true", help="check the output rasters against the frame model")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    sim = EngineSim(Geometry(args.weight_width, args.image_width, args.image_nb, args.kernel_width,
+                             args.kernel_height, args.stride, args.dilation))
+
+    frames = rng.integers(0, 1 << args.image_width, (args.frames, args.height, args.width), dtype=np.int64)
+    weight = rng.integers(0, 1 << args.weight_width, (args.kernel_height, args.kernel_width), dtype=np.int64)
+    config = Config(args.weight_width)
+
+    setup = load_kernel(sim, weight, config)
+    result = study(sim, frames, args.valid, args.seed)
+    output = result.pop("result")
+
+    print(f"{'setup_cycles':18} {setup:.6g}")
+    for name, value in result.items():
+        print(f"{name:18} {value:.6g}")
+    print(f"{'frames_per_second':18} {args.clock*1e6 / result['cycles_per_frame']:.6g}")
+
+    if args.check:
+        for f in range(args.frames):
+            if not np.array_equal(output[f], model_frame(frames[f], weight, config, sim.geometry)):
+                print(f"frame {f} does not match the frame model")
+                return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+Two's complement fixed point arithmetic shared by the testbench models.
+
+Scalar functions operate on python ints of any supported width while the
+'_array' functions operate on NumPy int64 arrays and are limited to numbers
+that fit within the int64 type.
+"""
+
+from enum import IntEnum
+from typing import Final, Tuple
+
+import numpy as np
+
+MAX_WIDTH: Final = 128
+MAX_ARRAY_WIDTH: Final = 63
+
+# masks and sign bits indexed by number width
+MASK: Final[Tuple[int, ...]] = tuple((1 << w) - 1 for w in range(MAX_WIDTH + 1))
+NEGATIVE: Final[Tuple[int, ...]] = (0,) + tuple(1 << (w - 1) for w in range(1, MAX_WIDTH + 1))
+
+# bits set by sign extension indexed by [extend_width][data_width]
+EXTEND: Final[Tuple[Tuple[int, ...], ...]] = tuple(tuple(MASK[e] ^ MASK[d] if e >= d else 0
+                                                         for d in range(MAX_WIDTH + 1))
+                                                   for e in range(MAX_WIDTH + 1))
+
+
+def twos(width: int, data: int) -> int:
+    """Convert signed numbers into two's complement.
+
+    If a number sent in as a negatively signed int it will be converted to a
+    two's complement negative number with a defined bit width. Otherwise the
+    number is masked to not extra bits are expressed in the returned number.
+
+    Arguments
+    width: Number of bits used to express the data value
+    data: The number to be converted to two's complement
+    """
+    return data & MASK[width]
+
+
+def twos_extend(extend_width: int, data_width: int, data: int) -> int:
+    """Extend signed bit of a two's complement number.
+
+    Before performing an operation on a twos complement number its width must
+    be extended to be the same as the finial operator.
+
+    Arguments
+    extend_width: Number of bits used to express the extended data value
+    data_width: Number of bits used to express the data value
+    data: The number to be converted to two's complement
+    """
+    data = data & MASK[data_width]
+
+    if data & NEGATIVE[data_width]:
+        data = data | EXTEND[extend_width][data_width]
+
+    return data
+
+
+def signed(width: int, data: int) -> int:
+    """Convert a two's complement number into a signed python int.
+
+    Arguments
+    width: Number of bits used to express the data value
+    data: The two's complement number, extra upper bits are ignored
+    """
+    return ((data & MASK[width]) ^ NEGATIVE[width]) - NEGATIVE[width]
+
+
+def multiply(m1_width: int, m2_width: int, m1: int, m2: int) -> int:
+    """Two's complement multiply, the product is m1_width+m2_width bits wide."""
+    return (signed(m1_width, m1) * signed(m2_width, m2)) & MASK[m1_width + m2_width]
+
+
+def addition(add_width: int, data_width: int, add: int, data: int) -> int:
+    """Two's complement addition of a data_width number onto an add_width number."""
+    return (add + signed(data_width, data)) & MASK[add_width]
+
+
+def twos_array(width: int, data: np.ndarray) -> np.ndarray:
+    """Array version of 'twos'."""
+    assert width <= MAX_ARRAY_WIDTH, f"Width {width} too large for array arithmetic"
+    return np.asarray(data, dtype=np.int64) & MASK[width]
+
+
+def signed_array(width: int, data: np.ndarray) -> np.ndarray:
+    """Array version of 'signed'."""
+    assert width <= MAX_ARRAY_WIDTH, f"Width {width} too large for array arithmetic"
+    return ((np.asarray(data, dtype=np.int64) & MASK[width]) ^ NEGATIVE[width]) - NEGATIVE[width]
+
+
+def multiply_array(m1_width: int, m2_width: int, m1: np.ndarray, m2: np.ndarray) -> np.ndarray:
+    """Array version of 'multiply'."""
+    return twos_array(m1_width + m2_width, signed_array(m1_width, m1) * signed_array(m2_width, m2))
+
+
+def addition_array(add_width: int, data_width: int, add: np.ndarray, data: np.ndarray) -> np.ndarray:
+    """Array version of 'addition'."""
+    return twos_array(add_width, np.asarray(add, dtype=np.int64) + signed_array(data_width, data))
+
+
+class Rounding(IntEnum):
+    """Rounding modes of the bits shifted out by the rescale module, any other mode truncates."""
+    TRUNCATE = 0
+    HALF_UP = 1
+    HALF_EVEN = 2
+
+
+class Rescale:
+    """Model of the rescale module.
+
+    Rescales a num_width number to the img_width by shifting it right,
+    rounding the bits shifted out and saturating the result to the maximum and
+    minimum image values. The constants for every valid shift value (0 to
+    num_width) are calculated once when the model is created.
+
+    Arguments
+    num_width: Bus width of up stream number
+    img_width: Bus width of down stream image number
+    """
+    def __init__(self, num_width: int, img_width: int) -> None:
+        self._num_width = num_width
+        self._img_width = img_width
+        self._img_max = NEGATIVE[img_width] - 1
+        self._img_min = -NEGATIVE[img_width]
+
+        # the down stream number is signed only when its bits fit within the
+        # up stream number, otherwise zeros are shifted in from the top
+        self._signed: Tuple[bool, ...] = tuple(num_width >= (img_width + s) for s in range(num_width + 1))
+        self._signed_array = np.array(self._signed)
+
+    def shifted(self, number: int, shift: int, rounding: int = Rounding.TRUNCATE) -> int:
+        """Up stream number shifted right and rounded, as a python int before it is saturated to the image bounds."""
+        if self._signed[shift]:
+            value = signed(self._num_width, number) >> shift
+        else:
+            value = (number & MASK[self._num_width]) >> shift
+
+        if shift == 0 or rounding not in (Rounding.HALF_UP, Rounding.HALF_EVEN):
+            return value
+
+        # the bits shifted out and the value of the most significant of them
+        remainder = number & MASK[self._num_width] & MASK[shift]
+        half = NEGATIVE[shift]
+
+        if rounding == Rounding.HALF_UP:
+            return value + int(remainder >= half)
+
+        return value + int(remainder > half or (remainder == half and bool(value & 1)))
+
+    def __call__(self, number: int, shift: int, rounding: int = Rounding.TRUNCATE) -> int:
+        """Rescale a single up stream number."""
+        number = min(max(self.shifted(number, shift, rounding), self._img_min), self._img_max)
+
+        return number & MASK[self._img_width]
+
+    def array(self, number: np.ndarray, shift: np.ndarray, rounding: np.ndarray = Rounding.TRUNCATE) -> np.ndarray:
+        """Rescale an array of up stream numbers by a shift value and rounding mode or arrays of them."""
+        shift = np.asarray(shift, dtype=np.int64)
+        rounding = np.asarray(rounding, dtype=np.int64)
+        unsigned = twos_array(self._num_width, number)
+
+        value = np.where(self._signed_array[shift], signed_array(self._num_width, number), unsigned) >> shift
+
+        if np.any((rounding == Rounding.HALF_UP) | (rounding == Rounding.HALF_EVEN)):
+            remainder = unsigned & (np.left_shift(1, shift) - 1)
+            half = np.left_shift(1, shift) >> 1
+
+            half_up = remainder >= half
+            half_even = (remainder > half) | ((remainder == half) & ((value & 1) == 1))
+
+            up = np.where(rounding == Rounding.HALF_UP, half_up, (rounding == Rounding.HALF_EVEN) & half_even)
+            value = value + (up & (shift > 0))
+
+        return np.clip(value, self._img_min, self._img_max) & MASK[self._img_width]
+
+
+class Activation(IntEnum):
+    """Activation functions of the activation module."""
+    NONE = 0
+    RELU = 1
+    CLAMP = 2
+    LEAKY = 3
+
+
+def activation(width: int, data: int, mode: int, bound: int = 0, leak: int = 0) -> int:
+    """Model of the activation module for a single two's complement number.
+
+    Arguments
+    width: Number of bits used to express the data value
+    data: The two's complement number
+    mode: Activation function applied to the number
+    bound: Upper bound of the clamp, a non negative number
+    leak: Bits a negative number is shifted right by the leaky ReLU
+    """
+    number = signed(width, data)
+
+    if number < 0 and mode in (Activation.RELU, Activation.CLAMP):
+        number = 0
+    elif number < 0 and mode == Activation.LEAKY:
+        number = number >> leak
+    elif mode == Activation.CLAMP:
+        number = min(number, bound)
+
+    return number & MASK[width]
+
+
+def activation_array(width: int, data: np.ndarray, mode: np.ndarray, bound: np.ndarray = 0,
+                     leak: np.ndarray = 0) -> np.ndarray:
+    """Array version of 'activation', with a mode, bound and leak for every number or one for all of them."""
+    number = signed_array(width, data)
+    mode = np.asarray(mode, dtype=np.int64)
+    negative = number < 0
+
+    relu = np.where(negative, 0, number)
+    clamp = np.minimum(relu, np.asarray(bound, dtype=np.int64))
+    leaky = np.where(negative, number >> np.asarray(leak, dtype=np.int64), number)
+
+    number = np.select([mode == Activation.RELU, mode == Activation.CLAMP, mode == Activation.LEAKY],
+                       [relu, clamp, leaky], number)
+
+    return twos_array(width, number)
@@ -0,0 +1,170 @@
+"""
+Streaming of raster frames through the engine module.
+
+The beats of a frame are cut and their results placed back into the output
+raster by the functions of 'raster', which the driver feeds to the engine
+design through vpw.
+"""
+
+import random
+from collections import deque
+from typing import Deque, Generator, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import vpw
+from raster import Geometry, Tag, beats, pack, place, unpack
+
+
+class Stream(NamedTuple):
+    """Handshakes of a frame streamed through the engine.
+
+    Attributes
+    valid_probability: Probability of a beat being offered on any clock
+    ready_probability: Probability of 'result_ready' being high on any clock
+    swap: Swap the shadow weight bank of a double buffered engine into use on the first clock
+    """
+    valid_probability: float = 1.0
+    ready_probability: float = 1.0
+    swap: bool = False
+
+
+class FrameDriver:
+    """Streams a frame through the engine and reassembles the output raster.
+
+    The driver is registered with vpw in the same way as a Checker and offers
+    a beat on every clock, unless an intermittent stream is requested. A beat
+    is held on the image bus until the engine accepts it with 'image_ready'
+    and a result is received on every clock 'result_valid' and 'result_ready'
+    are both high. Results are only kept for kernel positions that lay
+    entirely within the frame, so the output raster is that of
+    'engine_model.model_frame' in the two's complement form found on the
+    'result' bus.
+
+    Down stream stalls are injected by driving 'result_ready' low, which only
+    an engine built with a skid buffer (SKID_NB) accepts. Drivers that follow
+    each other on the same engine must not inject stalls, as each would drive
+    'result_ready' while their results are still in flight.
+
+    Arguments
+    rows: Iterable of the frame rows
+    shape: Number of rows in the frame and of pixels in each row
+    geometry: Number widths, kernel size, image bus, stride and dilation of the engine
+    stream: Probabilities of the handshakes and the weight swap of the frame
+    previous: Driver of the frame streamed before this one, whose results are still to be received
+    """
+    def __init__(self,
+                 rows: Iterable[Sequence[int]],
+                 shape: Tuple[int, int],
+                 geometry: Geometry,
+                 stream: Stream = Stream(),
+                 previous: Optional["FrameDriver"] = None) -> None:
+        self._beats = beats(rows, geometry)
+        self._geometry = geometry
+        self._stream = stream
+        self._sent = False
+        # clocks each beat was accepted on
+        self._accepted: List[int] = []
+
+        self.result = np.zeros(geometry.shape(*shape), dtype=np.int64)
+
+        # results of the previous frame come out of the engine before the results of this frame
+        self._received = -previous.pending() if previous is not None else 0
+
+    @property
+    def beat_nb(self) -> int:
+        """Number of beats accepted by the engine."""
+        return len(self._accepted)
+
+    def pending(self) -> int:
+        """Number of results still to come out of the engine before the last result of this frame."""
+        return self.beat_nb - self._received
+
+    def sent(self) -> bool:
+        """Check if every beat has been accepted, the image bus is then left to the next driver."""
+        return self._sent
+
+    def done(self) -> bool:
+        """Check if every beat has been accepted and its result received."""
+        return self.sent() and self._received == self.beat_nb
+
+    def throughput(self) -> float:
+        """Sustained beats per clock, from the first beat accepted until the last beat accepted."""
+        return self.beat_nb / (self._accepted[-1] - self._accepted[0] + 1)
+
+    def _receive(self, bus: int, in_flight: Deque[Tag]) -> None:
+        """Place a result received from the engine into the output raster."""
+        if self._received < 0:
+            self._received += 1
+        elif in_flight:
+            g = self._geometry
+            result = unpack(vpw.unpack(g.image_width*g.result_nb, bus), g.image_width, g.result_nb)
+            place(self.result, in_flight.popleft(), result, g)
+            self._received += 1
+
+    def _accept(self, beat: Tuple[Tag, np.ndarray], in_flight: Deque[Tag], cycle_nb: int) -> None:
+        """Record a beat accepted by the engine, its result comes out after the results already in flight."""
+        self._accepted.append(cycle_nb)
+        in_flight.append(beat[0])
+
+    def _prep_ready(self, cycle_nb: int, ready: bool) -> bool:
+        """Prep 'result_ready' and the weight swap of the first clock, returns the value of 'result_ready'."""
+        if self._stream.ready_probability < 1.0:
+            ready = random.random() < self._stream.ready_probability
+            vpw.prep("result_ready", [int(ready)])
+
+        if self._stream.swap and cycle_nb <= 2:
+            vpw.prep("weight_swap", [int(cycle_nb == 1)])
+
+        return ready
+
+    def _prep_beat(self, beat: Optional[Tuple[Tag, np.ndarray]]) -> Optional[Tuple[Tag, np.ndarray]]:
+        """Offer the next beat when none is held, and prep the held beat onto the image bus.
+
+        Returns the beat held on the image bus, None once every beat has been sent.
+        """
+        if beat is None and random.random() < self._stream.valid_probability:
+            beat = next(self._beats, None)
+            self._sent = beat is None
+
+        g = self._geometry
+        bus_width = g.image_width*g.image_nb*g.kernel_height
+
+        if beat is not None:
+            vpw.prep("image", vpw.pack(bus_width, pack(beat[1], g.image_width)))
+            vpw.prep("image_valid", [1])
+        else:
+            vpw.prep("image", vpw.pack(bus_width, 0))
+            vpw.prep("image_valid", [0])
+
+        return beat
+
+    def init(self, _) -> Generator:
+        """Background initilization function."""
+        in_flight: Deque[Tag] = deque()
+        beat: Optional[Tuple[Tag, np.ndarray]] = None
+        ready = True
+        cycle_nb = 0
+
+        if self._stream.ready_probability < 1.0:
+            vpw.prep("result_ready", [1])
+
+        while True:
+            io = yield
+
+            # the image bus is left to the next driver once every beat is sent
+            if self.done():
+                continue
+
+            cycle_nb += 1
+
+            if io["result_valid"] and ready:
+                self._receive(io["result"], in_flight)
+
+            ready = self._prep_ready(cycle_nb, ready)
+
+            if beat is not None and io["image_ready"]:
+                self._accept(beat, in_flight, cycle_nb)
+                beat = None
+
+            if not self.sent():
+                beat = self._prep_beat(beat)
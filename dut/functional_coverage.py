@@ -0,0 +1,86 @@
+"""
+Constrained random stimulus and functional coverage shared by the testbenches.
+
+Uniform random numbers rarely land on the corners of two's complement
+arithmetic, the most negative number, the saturation bounds of a module or
+a sum that just carries out of its width. 'corner_random' draws numbers
+biased toward those corners, and a testbench adds the corners that are
+specific to its module as constraints of each draw. 'Coverage' counts the
+hits of the functional bins a testbench defines, so a random test can stop
+as soon as every bin is covered instead of running a fixed number of cycles.
+"""
+
+import random
+from typing import Dict, Hashable, Iterable, List, Sequence
+
+from fixed_point import signed, twos
+
+
+def corners(width: int) -> List[int]:
+    """Signed corner values of a two's complement number, zero, one and two of either sign and the extremes."""
+    low = -(1 << (width - 1))
+    high = (1 << (width - 1)) - 1
+
+    return sorted({v for v in (0, 1, -1, 2, -2, high, high - 1, low, low + 1) if low <= v <= high})
+
+
+def sign(width: int, data: int) -> str:
+    """Sign bin of a two's complement number, 'negative', 'zero' or 'positive'."""
+    value = signed(width, data)
+
+    if value < 0:
+        return "negative"
+
+    return "zero" if value == 0 else "positive"
+
+
+SIGNS = ("negative", "zero", "positive")
+
+
+def corner_random(width: int, extra: Sequence[int] = (), corner_probability: float = 0.5) -> int:
+    """Draw a random number in the two's complement form of a bus, biased toward corner values.
+
+    Arguments
+    width: Number width of the bus
+    extra: Signed corner values of this draw only, values outside of the number width are ignored
+    corner_probability: Probability of drawing a corner value instead of a uniform random number
+    """
+    if random.random() < corner_probability:
+        values = corners(width)
+        choices = values + [v for v in extra if values[0] <= v <= values[-1]]
+        return twos(width, random.choice(choices))
+
+    return random.getrandbits(width)
+
+
+class Coverage:
+    """Functional coverage of a testbench, counting the hits of each bin.
+
+    Arguments
+    bins: Name of every bin to be covered, a bin must be reachable for the coverage to close
+    goal: Hits needed for a bin to be covered
+    """
+    def __init__(self, bins: Iterable[Hashable], goal: int = 1) -> None:
+        self.hits: Dict[Hashable, int] = {b: 0 for b in bins}
+        self.sample_nb = 0
+        self._goal = goal
+
+    def __str__(self) -> str:
+        covered = len(self.hits) - len(self.holes())
+        return f"{covered} of {len(self.hits)} bins covered by {self.sample_nb} samples"
+
+    def sample(self, *bins: Hashable) -> None:
+        """Count one sample of the stimulus, hitting each of the given bins."""
+        self.sample_nb += 1
+
+        for b in bins:
+            assert b in self.hits, f"Unknown coverage bin: {b}"
+            self.hits[b] += 1
+
+    def holes(self) -> List[Hashable]:
+        """Bins that have not been hit enough times."""
+        return [b for b, hits in self.hits.items() if hits < self._goal]
+
+    def closed(self) -> bool:
+        """Check if every bin has been covered."""
+        return not self.holes()
@@ -3,13 +3,17 @@ Testbench for group_add module.
 """
 
 import random
-import shutil
-import tempfile
 from enum import IntEnum
-from typing import Generator
+from typing import Generator, List, Sequence, Tuple
 
+import build_cache
 import pytest
 import vpw
+from functional_coverage import Coverage, corner_random
+from fixed_point import signed, twos
+from parameter import override
+from pipeline import group_add_latency
+from scoreboard import SLACK, Scoreboard
 
 
 class Param(IntEnum):
@@ -19,78 +23,62 @@ class Param(IntEnum):
     GROUP_NB: Number of MAC units in parallel
     NUM_WIDTH: Bus width of (up|dn)_data number
     """
-    GROUP_NB = 4
-    NUM_WIDTH = 16
+    GROUP_NB = override("GROUP_NB", 4)
+    NUM_WIDTH = override("NUM_WIDTH", 16)
 
 
-def _twos(width: int, data: int) -> int:
-    """Convert signed numbers into two's complement.
+NUM_MAX = (1 << (Param.NUM_WIDTH - 1)) - 1
+NUM_MIN = -(1 << (Param.NUM_WIDTH - 1))
 
-    If a number sent in as a negatively signed int it will be converted to a
-    two's complement negative number with a defined bit width. Otherwise the
-    number is masked to not extra bits are expressed in the returned number.
+# functional coverage of the random stream, addend signs and a sum that lands on or carries past its bounds
+COVERAGE_BINS = ([("negative", mask) for mask in range(1 << Param.GROUP_NB)] +
+                 [("sum", "maximum"), ("sum", "minimum"), ("sum", "zero")] +
+                 [("overflow", "positive"), ("overflow", "negative")])
 
-    Arguments
-    width: Number of bits used to express the data value
-    data: The number to be converted to two's complement
-    """
-    mask = (1 << width) - 1
-
-    if data < 0:
-        data = data + 2**width
-
-    return data & mask
-
-
-def _twos_extend(extend_width: int, data_width: int, data: int) -> int:
-    """Extend signed bit of a two's complement number.
-
-    Before performing an operation on a twos complement number its width must
-    be extended to be the same as the finial operator.
-
-    Arguments
-    extend_width: Number of bits used to express the extended data value
-    data_width: Number of bits used to express the data value
-    data: The number to be converted to two's complement
-    """
-    mask_data = (1 << data_width) - 1
-    mask_extend = (1 << extend_width) - 1
-    negative = 1 << (data_width - 1)
 
-    data = _twos(data_width, data)
-
-    if bool(data & negative):
-        data = (mask_extend ^ mask_data) | data
+def _model_group_add(args: Sequence[int]) -> int:
+    """Two's complement addition."""
+    return twos(Param.NUM_WIDTH, sum(args))
 
-    return data
 
+def _coverage(args: Sequence[int]) -> List[Tuple[str, ...]]:
+    """Coverage bins hit by the GROUP_NB addends of one sum."""
+    numbers = [signed(Param.NUM_WIDTH, a) for a in args]
+    total = sum(numbers)
 
-def _model_group_add(arg3: int, arg2: int, arg1: int, arg0: int) -> int:
-    """Two's complement addition."""
-    width_sum = Param.NUM_WIDTH + 2
-    mask = (1 << Param.NUM_WIDTH) - 1
+    bins = [("negative", sum(1 << x for x, n in enumerate(numbers) if n < 0))]
 
-    arg0 = _twos_extend(width_sum, Param.NUM_WIDTH, arg0)
-    arg1 = _twos_extend(width_sum, Param.NUM_WIDTH, arg1)
-    arg2 = _twos_extend(width_sum, Param.NUM_WIDTH, arg2)
-    arg3 = _twos_extend(width_sum, Param.NUM_WIDTH, arg3)
+    if total > NUM_MAX:
+        bins.append(("overflow", "positive"))
+    elif total < NUM_MIN:
+        bins.append(("overflow", "negative"))
+    elif total in (NUM_MAX, NUM_MIN, 0):
+        bins.append(("sum", {NUM_MAX: "maximum", NUM_MIN: "minimum", 0: "zero"}[total]))
 
-    return (arg3 + arg2 + arg1 + arg0) & mask
+    return bins
 
 
 class Checker:
     """Model of Hardware Module"""
     def __init__(self) -> None:
         self._sum = 0
+        self._valid = 0
+        self.scoreboard = Scoreboard("dn_data", max_latency=group_add_latency(Param.GROUP_NB) + SLACK)
         self._up = vpw.Slice("up_data", Param.NUM_WIDTH, Param.GROUP_NB)
 
-    def set(self, arg3: int, arg2: int, arg1: int, arg0: int) -> None:
-        """Prep 4 addends for to send into module."""
-        self._sum = _model_group_add(arg3, arg2, arg1, arg0)
-        self._up[0] = arg0
-        self._up[1] = arg1
-        self._up[2] = arg2
-        self._up[3] = arg3
+    def set(self, args: Sequence[int]) -> None:
+        """Prep GROUP_NB addends, the first in the least significant slice of 'up_data', to send into module."""
+        assert len(args) == Param.GROUP_NB, f"Incorrect number of addends, given: {len(args)}"
+        self._sum = _model_group_add(args)
+        self._valid = 1
+        vpw.prep("up_valid", [1])
+        for x, arg in enumerate(args):
+            self._up[x] = arg
+
+    def _clear(self) -> None:
+        """Prep zero into every addend."""
+        for x in range(Param.GROUP_NB):
+            self._up[x] = 0
 
     def init(self, dut) -> Generator:
         """Background initilization function."""
@@ -98,60 +86,48 @@ class Checker:
         if next(up, True):
             return
 
-        sum_7p = 0
-        sum_6p = 0
-        sum_5p = 0
-        sum_4p = 0
-        sum_3p = 0
-        sum_2p = 0
-        sum_1p = 0
         self._sum = 0
-        self._up[0] = 0
-        self._up[1] = 0
-        self._up[2] = 0
-        self._up[3] = 0
+        self._valid = 0
+        self._clear()
 
         while True:
             io = yield
             up.send(io)
-            sum_7p = sum_6p
-            sum_6p = sum_5p
-            sum_5p = sum_4p
-            sum_4p = sum_3p
-            sum_3p = sum_2p
-            sum_2p = sum_1p
-            sum_1p = self._sum
-            self._sum = 0
-            self._up[0] = 0
-            self._up[1] = 0
-            self._up[2] = 0
-            self._up[3] = 0
+            self.scoreboard.tick()
+
+            if io["dn_valid"]:
+                self.scoreboard.observe(io["dn_data"])
 
-            assert io["dn_data"] == sum_7p
+            if self._valid:
+                self.scoreboard.expect(self._sum)
+
+            self._sum = 0
+            self._valid = 0
+            vpw.prep("up_valid", [0])
+            self._clear()
 
 
 @pytest.fixture(name="_design", scope="module")
 def design():
     """Compile the design only once for all tests."""
-    workspace = tempfile.mkdtemp()
-
-    dut = vpw.create(module='group_add',
-                     clock='clk',
-                     include=['../hdl'],
-                     parameter={'GROUP_NB': Param.GROUP_NB,
-                                'NUM_WIDTH': Param.NUM_WIDTH},
-                     workspace=workspace)
+    dut = build_cache.create(module='group_add',
+                             clock='clk',
+                             include=['../hdl'],
+                             parameter={'GROUP_NB': Param.GROUP_NB,
+                                        'NUM_WIDTH': Param.NUM_WIDTH})
     yield dut
 
-    shutil.rmtree(workspace)
-
 
 @pytest.fixture(name="_context")
 def context(_design):
     """Setup and tear-down the design for each test."""
     vpw.init(_design, trace=False)
 
+    vpw.prep("rst", [1])
     vpw.prep("up_data", vpw.pack(Param.GROUP_NB*Param.NUM_WIDTH, 0))
+    vpw.prep("up_valid", [0])
+    vpw.idle(2)
+    vpw.prep("rst", [0])
     vpw.idle(2)
 
     yield
@@ -161,20 +137,25 @@ def context(_design):
 
 
 def test_pipeline_depth(_context):
-    """Test that module pipeline depth is 4 clock cycles deep."""
+    """Test that module pipeline depth is the depth derived from the number of addends."""
+    latency = group_add_latency(Param.GROUP_NB)
 
     vpw.prep("up_data", vpw.pack(Param.NUM_WIDTH*Param.GROUP_NB, 5))
+    vpw.prep("up_valid", [1])
     vpw.tick()
-    vpw.prep("up_data", vpw.pack(Param.NUM_WIDTH, 0))
+    vpw.prep("up_data", vpw.pack(Param.NUM_WIDTH*Param.GROUP_NB, 0))
+    vpw.prep("up_valid", [0])
 
-    io = vpw.tick()
-    assert io["dn_data"] == 0, "Module is 3 clock cycles deep instead of 4."
+    io = vpw.idle(latency)
+    assert io["dn_data"] == 0, f"Module is {latency - 1} clock cycles deep instead of {latency}."
 
-    io = vpw.idle(5)
-    assert io["dn_data"] == _model_group_add(0, 0, 0, 5), "Module should be 5 clocks cycles deep."
+    io = vpw.tick()
+    assert io["dn_data"] == _model_group_add([5]), f"Module should be {latency} clocks cycles deep."
+    assert io["dn_valid"] == 1, "Valid is not delayed with the sum."
 
     io = vpw.tick()
-    assert io["dn_data"] == 0, "Module is 5 clock cycles deep instead of 4."
+    assert io["dn_data"] == 0, f"Module is {latency + 1} clock cycles deep instead of {latency}."
+    assert io["dn_valid"] == 0, "Valid is held for more then one clock."
 
 
 def test_numbers_positive(_context):
@@ -183,10 +164,11 @@ def test_numbers_positive(_context):
     vpw.register(checker)
 
     for x in range(10):
-        checker.set(x+4, x+3, x+2, x+1)
+        checker.set([x+1+k for k in range(Param.GROUP_NB)])
         vpw.tick()
 
-    vpw.idle(10)  # wait for longer then the pipelined depth of module
+    while checker.scoreboard:  # wait until every sum has been received
+        vpw.tick()
 
 
 def test_numbers_positive_intermittent(_context):
@@ -199,11 +181,12 @@ def test_numbers_positive_intermittent(_context):
     while data:
         if bool(random.getrandbits(1)):
             x = data.pop(0)
-            checker.set(x+4, x+3, x+2, x+1)
+            checker.set([x+1+k for k in range(Param.GROUP_NB)])
 
         vpw.tick()
 
-    vpw.idle(10)  # wait for longer then the pipelined depth of module
+    while checker.scoreboard:  # wait until every sum has been received
+        vpw.tick()
 
 
 def test_number_negative(_context):
@@ -212,10 +195,11 @@ def test_number_negative(_context):
     vpw.register(checker)
 
     for x in range(-1, -11, -1):
-        checker.set(x-4, x-3, x-2, x-1)
+        checker.set([x-1-k for k in range(Param.GROUP_NB)])
         vpw.tick()
 
-    vpw.idle(10)  # wait for longer then the pipelined depth of module
+    while checker.scoreboard:  # wait until every sum has been received
+        vpw.tick()
 
 
 def test_number_negative_intermittent(_context):
@@ -228,22 +212,33 @@ def test_number_negative_intermittent(_context):
     while data:
         if bool(random.getrandbits(1)):
             x = data.pop(0)
-            checker.set(x-4, x-3, x-2, x-1)
+            checker.set([x-1-k for k in range(Param.GROUP_NB)])
         vpw.tick()
 
-    vpw.idle(10)  # wait for longer then the pipelined depth of module
+    while checker.scoreboard:  # wait until every sum has been received
+        vpw.tick()
 
 
 def test_bypass_random_numbers(_context):
-    """Test many random number values."""
+    """Test random number values biased toward corner values until every coverage bin is hit."""
     checker = Checker()
     vpw.register(checker)
 
-    for _ in range(5000):
-        checker.set(random.getrandbits(Param.NUM_WIDTH),
-                    random.getrandbits(Param.NUM_WIDTH),
-                    random.getrandbits(Param.NUM_WIDTH),
-                    random.getrandbits(Param.NUM_WIDTH))
+    coverage = Coverage(COVERAGE_BINS, goal=4)
+
+    while not coverage.closed():
+        assert coverage.sample_nb < 20000, f"Coverage did not close, {coverage}, holes: {coverage.holes()}"
+
+        args = [corner_random(Param.NUM_WIDTH) for _ in range(Param.GROUP_NB - 1)]
+
+        # constrain the last addend toward a sum on, or just past, the bounds of the number
+        partial = sum(signed(Param.NUM_WIDTH, a) for a in args)
+        targets = (NUM_MAX, NUM_MIN, NUM_MAX + 1, NUM_MIN - 1, 0)
+        args.append(corner_random(Param.NUM_WIDTH, [t - partial for t in targets]))
+
+        coverage.sample(*_coverage(args))
+        checker.set(args)
         vpw.tick()
 
-    vpw.idle(10)  # wait for longer then the pipelined depth of module
+    while checker.scoreboard:  # wait until every sum has been received
+        vpw.tick()
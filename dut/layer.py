@@ -0,0 +1,286 @@
+"""
+Multi-channel, multi-filter convolution layers scheduled over the engine module.
+
+The engine convolves one channel with one kernel, so a layer of C_in input
+channels and C_out filters is computed as C_in x C_out passes. Before each
+pass the kernel is reloaded through the 'weight' token ring, the frame of the
+input channel is streamed and the result is accumulated into the sum of its
+filter. The rescale shift of the engine is set to zero for every pass and the
+bias, shift and activation of the layer are only applied to the accumulated
+sums by the host post-processing.
+
+A layer of a single input channel is fused instead, with the bias, shift,
+rounding mode and activation of each filter configured for its pass, so the
+results of the engine are the layer output and the host post-processing is
+removed. A fused activation needs an engine built with ACTIVATION.
+
+An engine built with DOUBLE_BUFFER loads the kernel of the next pass into its
+shadow weight bank while the current pass streams, and swaps it in with the
+first beat of the next pass. The passes then follow each other without the
+image bus waiting on a kernel load or on the pipeline to drain. The
+configuration of a fused pass is then written into the shadow configuration
+and swapped in with its kernel.
+"""
+
+from typing import Dict, Generator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import vpw
+from batch import drive
+from engine_model import Config, Layer, post_process
+from fixed_point import signed_array
+from frame import FrameDriver, Stream
+from pipeline import config_hold, shadow_hold
+from raster import Geometry
+
+# clocks taken by 'send_config'
+CONFIG_CYCLES = 2
+
+
+def weight_cycles(kernel_width: int, kernel_height: int) -> int:
+    """Clocks taken by 'send_weight' to load a kernel, one per weight and one to end the load."""
+    return kernel_width*kernel_height + 1
+
+
+def send_config(config: Config, geometry: Geometry) -> None:
+    """Blocking function that sends the shift, rounding mode, bias and activation configuration of the engine.
+
+    Arguments
+    config: Shift, rounding mode, bias, activation function, bound and leak configuration
+    geometry: Number widths of the engine, the 'cfg_bias' bus is as wide as its sums and 'cfg_bound' a bit narrower
+              than image
+    """
+    bias_width = geometry.result_width
+
+    drive({"cfg_shift": (8, [config.shift, 0]),
+           "cfg_rounding": (2, [config.rounding, 0]),
+           "cfg_bias": (bias_width, [config.bias & ((1 << bias_width) - 1), 0]),
+           "cfg_activation": (2, [config.activation, 0]),
+           "cfg_bound": (geometry.image_width - 1, [config.bound, 0]),
+           "cfg_leak": (4, [config.leak, 0]),
+           "cfg_valid": (1, [1, 0])}, {})
+
+
+def send_weight(weight: Sequence[int], weight_width: int, swap: bool = False) -> None:
+    """Blocking function that sends a kernel to the module.
+
+    Arguments
+    weight: Kernel weights in the order of the token ring
+    weight_width: Number width of kernel weight
+    swap: Swap the shadow weight bank into use on the clock ending the load
+    """
+    number = len(weight)
+
+    drive({"weight": (weight_width, list(weight) + [0]),
+           "weight_valid": (1, [1]*number + [0]),
+           "weight_swap": (1, [0]*number + [int(swap)])}, {})
+
+    vpw.prep("weight_swap", [0])
+
+
+class WeightLoader:
+    """Writes a kernel into the shadow weight bank of the engine, one weight per clock.
+
+    The loader is registered with vpw in the same way as a Checker and only
+    drives the 'weight' and configuration ports, so it runs alongside a
+    FrameDriver streaming with the kernel in the active bank. A configuration
+    given to the loader is written into the shadow configuration, once its own
+    hold has passed.
+
+    Arguments
+    weight: Kernel weights in the order of the token ring
+    geometry: Number widths of the engine
+    hold: Clocks to wait before the first weight is written
+    config: Configuration written into the shadow configuration, None to leave it
+    config_delay: Clocks to wait before the configuration is written
+    """
+    def __init__(self,
+                 weight: Sequence[int],
+                 geometry: Geometry,
+                 hold: int = 0,
+                 config: Optional[Config] = None,
+                 config_delay: int = 0) -> None:
+        self._weight = list(weight)
+        self._geometry = geometry
+        self._hold = hold
+        self._config = config
+        self._config_delay = config_delay
+        self._done = False
+
+    def done(self) -> bool:
+        """Check if every weight and the configuration have been written."""
+        return self._done and self._config is None
+
+    def _send_config(self, cycle_nb: int) -> None:
+        """Drive the configuration ports on the clock the configuration is written, and clear them after it."""
+        if self._config is None:
+            return
+
+        bias_width = self._geometry.result_width
+        bound_width = self._geometry.image_width - 1
+
+        if cycle_nb == self._config_delay + 1:
+            vpw.prep("cfg_shift", [self._config.shift])
+            vpw.prep("cfg_rounding", [self._config.rounding])
+            vpw.prep("cfg_bias", vpw.pack(bias_width, self._config.bias & ((1 << bias_width) - 1)))
+            vpw.prep("cfg_activation", [self._config.activation])
+            vpw.prep("cfg_bound", vpw.pack(bound_width, self._config.bound))
+            vpw.prep("cfg_leak", [self._config.leak])
+            vpw.prep("cfg_valid", [1])
+        elif cycle_nb == self._config_delay + 2:
+            vpw.prep("cfg_shift", [0])
+            vpw.prep("cfg_rounding", [0])
+            vpw.prep("cfg_bias", vpw.pack(bias_width, 0))
+            vpw.prep("cfg_activation", [0])
+            vpw.prep("cfg_bound", vpw.pack(bound_width, 0))
+            vpw.prep("cfg_leak", [0])
+            vpw.prep("cfg_valid", [0])
+            self._config = None
+
+    def init(self, _) -> Generator:
+        """Background initilization function."""
+        cycle_nb = 0
+        weight_width = self._geometry.weight_width
+
+        while True:
+            _ = yield
+
+            if self.done():
+                continue
+
+            cycle_nb += 1
+            self._send_config(cycle_nb)
+
+            if self._done:
+                continue
+
+            x = cycle_nb - self._hold - 1
+
+            if 0 <= x < len(self._weight):
+                vpw.prep("weight", vpw.pack(weight_width, self._weight[x]))
+                vpw.prep("weight_valid", [1])
+            elif x == len(self._weight):
+                vpw.prep("weight", vpw.pack(weight_width, 0))
+                vpw.prep("weight_valid", [0])
+                self._done = True
+
+
+def _fused_config(layer: Layer, f: int) -> Config:
+    """Configuration of the pass of filter 'f' of a fused layer, with the bias of the filter."""
+    return layer.config._replace(bias=0 if layer.bias is None else int(layer.bias[f]))
+
+
+def _wait(driver: FrameDriver, loader: Optional[WeightLoader] = None) -> int:
+    """Clock the engine until a pass is done, returns the number of clocks.
+
+    With the loader of the next pass, the pass is left once its frame has been
+    sent and the loader is done, as the next pass then streams behind it.
+    """
+    clocks = 0
+
+    while not (driver.sent() and loader.done() if loader is not None else driver.done()):
+        vpw.tick()
+        clocks += 1
+
+    return clocks
+
+
+def _stream(image: np.ndarray,
+            layer: Layer,
+            geometry: Geometry,
+            double_buffer: bool,
+            valid_probability: float) -> Tuple[List[FrameDriver], Dict[str, int]]:
+    """Stream every pass of a layer through the engine, see 'convolve'.
+
+    Returns the driver of every pass, in the order of the filters and then of
+    the channels, and the number of clocks spent on each part of the layer.
+    """
+    weight = np.asarray(layer.weight)
+    passes = [(f, c) for f in range(weight.shape[0]) for c in range(weight.shape[1])]
+    cycles = {"passes": len(passes), "config": 0, "weight": 0, "frame": 0, "beats": 0}
+
+    if not layer.fused:
+        send_config(Config(), geometry)
+        cycles["config"] += CONFIG_CYCLES
+
+    drivers: List[FrameDriver] = []
+
+    for x, (f, c) in enumerate(passes):
+        if x == 0 or not double_buffer:
+            if layer.fused:
+                send_config(_fused_config(layer, f), geometry)
+                cycles["config"] += CONFIG_CYCLES
+
+            send_weight(weight[f, c].flatten().tolist(), geometry.weight_width, swap=double_buffer)
+            cycles["weight"] += weight_cycles(geometry.kernel_width, geometry.kernel_height)
+
+        driver = FrameDriver(iter(image[c]),
+                             image.shape[1:],
+                             geometry,
+                             Stream(valid_probability, swap=double_buffer and x > 0),
+                             previous=drivers[-1] if drivers else None)
+        vpw.register(driver)
+        drivers.append(driver)
+
+        if double_buffer and x + 1 < len(passes):
+            loader = WeightLoader(weight[passes[x+1]].flatten().tolist(),
+                                  geometry,
+                                  shadow_hold(geometry.kernel_width),
+                                  config=_fused_config(layer, passes[x+1][0]) if layer.fused else None,
+                                  config_delay=config_hold(geometry.kernel_width, geometry.kernel_height))
+            vpw.register(loader)
+            cycles["frame"] += _wait(driver, loader)
+        else:
+            cycles["frame"] += _wait(driver)
+
+    cycles["frame"] += sum(_wait(driver) for driver in drivers)
+
+    return drivers, cycles
+
+
+def convolve(image: np.ndarray,
+             layer: Layer,
+             geometry: Geometry,
+             double_buffer: bool = False,
+             valid_probability: float = 1.0) -> Tuple[np.ndarray, Dict[str, int]]:
+    """Compute a layer by streaming every pass through the engine.
+
+    Without a double buffered engine a pass is only started once the results
+    of the previous pass have been received, as the weights of a kernel are
+    used by the slices for as long as its beats are in the pipeline.
+
+    Arguments
+    image: Rasters of (channels, height, width) pixels
+    layer: Kernels, bias and post-processing of the layer
+    geometry: Number widths, kernel size, image bus, stride and dilation of the engine
+    double_buffer: Load the kernel of the next pass while the current pass streams
+    valid_probability: Probability of a beat being sent on any clock
+
+    Returns an array of (filters, rows, columns) pixels, as the output rasters
+    of 'model_frame', in the two's complement form found on the 'result' bus, and the
+    number of clocks spent on each part of the layer. Stall clocks are the
+    clocks on which no beat was accepted. The pixels read and written by the
+    host post-processing are counted under 'post'.
+    """
+    image = np.asarray(image)
+    filter_nb, channel_nb = np.shape(layer.weight)[:2]
+    assert channel_nb == image.shape[0], f"Channels of image {image.shape[0]} and weight {channel_nb} differ"
+    assert channel_nb == 1 or not layer.fused, f"Only a layer of one channel can be fused, given {channel_nb}"
+
+    drivers, cycles = _stream(image, layer, geometry, double_buffer, valid_probability)
+
+    partial = np.stack([driver.result for driver in drivers])
+    partial = partial.reshape((filter_nb, channel_nb) + partial.shape[1:])
+
+    cycles["beats"] = sum(driver.beat_nb for driver in drivers)
+    cycles["total"] = cycles["config"] + cycles["weight"] + cycles["frame"]
+    cycles["stall"] = cycles["total"] - cycles["beats"]
+
+    if layer.fused:
+        cycles["post"] = 0
+        return partial[:, 0], cycles
+
+    result = post_process(signed_array(geometry.image_width, partial), layer, geometry)
+    cycles["post"] = partial.size + result.size
+
+    return result, cycles
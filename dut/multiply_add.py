@@ -3,13 +3,19 @@ Testbench for multiply_add module.
 """
 
 import random
-import shutil
-import tempfile
+import time
 from enum import IntEnum
-from typing import Generator
+from typing import Final, Generator, List, Tuple
 
+import build_cache
+import numpy as np
 import pytest
 import vpw
+from batch import drive
+from functional_coverage import SIGNS, Coverage, corner_random, sign
+from fixed_point import addition, addition_array, multiply, multiply_array, signed
+from parameter import override
+from pipeline import MULTIPLY_ADD_LATENCY, DelayLine
 
 
 class Param(IntEnum):
@@ -19,73 +25,41 @@ class Param(IntEnum):
     M1_WIDTH: Bus width of 'm1' data
     M2_WIDTH: Bus width of 'm2' data
     """
-    M1_WIDTH = 16
-    M2_WIDTH = 16
+    M1_WIDTH = override("M1_WIDTH", 16)
+    M2_WIDTH = override("M2_WIDTH", 16)
 
 
-def _twos(width: int, data: int) -> int:
-    """Convert signed numbers into two's complement.
+RESULT_WIDTH = Param.M1_WIDTH+Param.M2_WIDTH+1
+PRODUCT_WIDTH = Param.M1_WIDTH+Param.M2_WIDTH
 
-    If a number sent in as a negatively signed int it will be converted to a
-    two's complement negative number with a defined bit width. Otherwise the
-    number is masked to not extra bits are expressed in the returned number.
+# widest input space of 'm1' and 'm2' that is swept exhaustively, and the number of cycles driven per block
+SWEEP_WIDTH = 24
+SWEEP_BLOCK = 1 << 16
 
-    Arguments
-    width: Number of bits used to express the data value
-    data: The number to be converted to two's complement
-    """
-    mask = (1 << width) - 1
-
-    if data < 0:
-        data = data + 2**width
-
-    return data & mask
-
-
-def _twos_extend(extend_width: int, data_width: int, data: int) -> int:
-    """Extend signed bit of a two's complement number.
-
-    Before performing an operation on a twos complement number its width must
-    be extended to be the same as the finial operator.
-
-    Arguments
-    extend_width: Number of bits used to express the extended data value
-    data_width: Number of bits used to express the data value
-    data: The number to be converted to two's complement
-    """
-    mask_data = (1 << data_width) - 1
-    mask_extend = (1 << extend_width) - 1
-    negative = 1 << (data_width - 1)
-
-    data = _twos(data_width, data)
+# functional coverage of the random stream, operand signs and extremes and a result that wraps
+COVERAGE_BINS = ([("sign", s1, s2) for s1 in SIGNS for s2 in SIGNS] +
+                 [("add", s) for s in SIGNS] +
+                 [("minimum", "m1"), ("minimum", "m2"), ("minimum", "product")] +
+                 [("overflow", "positive"), ("overflow", "negative")])
 
-    if bool(data & negative):
-        data = (mask_extend ^ mask_data) | data
 
-    return data
+def _coverage(m1: int, m2: int, add: int) -> List[Tuple[str, ...]]:
+    """Coverage bins hit by the operands of one multiply add."""
+    m1_min = signed(Param.M1_WIDTH, m1) == -(1 << (Param.M1_WIDTH - 1))
+    m2_min = signed(Param.M2_WIDTH, m2) == -(1 << (Param.M2_WIDTH - 1))
+    result = signed(Param.M1_WIDTH, m1) * signed(Param.M2_WIDTH, m2) + signed(RESULT_WIDTH, add)
 
+    bins = [("sign", sign(Param.M1_WIDTH, m1), sign(Param.M2_WIDTH, m2)), ("add", sign(RESULT_WIDTH, add))]
+    bins += [("minimum", "m1")] if m1_min else []
+    bins += [("minimum", "m2")] if m2_min else []
+    bins += [("minimum", "product")] if m1_min and m2_min else []
 
-def _mac_multiply(m1: int, m2: int) -> int:
-    """Two's complement multiply."""
-    width = Param.M1_WIDTH + Param.M2_WIDTH
-    mask = (1 << width) - 1
+    if result >= (1 << (RESULT_WIDTH - 1)):
+        bins.append(("overflow", "positive"))
+    elif result < -(1 << (RESULT_WIDTH - 1)):
+        bins.append(("overflow", "negative"))
 
-    m1 = _twos_extend(width, Param.M1_WIDTH, m1)
-    m2 = _twos_extend(width, Param.M2_WIDTH, m2)
-
-    return (m1 * m2) & mask
-
-
-def _mac_addition(addition: int, product: int) -> int:
-    """Two's complement addition."""
-    width_addition = Param.M1_WIDTH + Param.M2_WIDTH + 1
-    width_product = Param.M1_WIDTH + Param.M2_WIDTH
-    mask_addition = (1 << width_addition) - 1
-
-    addition = _twos(width_addition, addition)
-    product = _twos_extend(width_addition, width_product, product)
-
-    return (addition + product) & mask_addition
+    return bins
 
 
 class Checker:
@@ -104,28 +78,24 @@ class Checker:
         vpw.prep("m2", vpw.pack(Param.M2_WIDTH, m2))
         vpw.prep("m1", vpw.pack(Param.M1_WIDTH, m1))
         vpw.prep("add", vpw.pack(Param.M1_WIDTH + Param.M2_WIDTH + 1, add))
-        self._result = _mac_addition(add, _mac_multiply(m1, m2))
+        self._result = addition(RESULT_WIDTH, PRODUCT_WIDTH, add, multiply(Param.M1_WIDTH, Param.M2_WIDTH, m1, m2))
 
     def init(self, _) -> Generator:
         """Background initilization function."""
+        # the result is checked before the value of this clock is pushed into the pipeline
+        PIPELINE: Final = MULTIPLY_ADD_LATENCY - 1
+
         result_1m = 0
         result = 0
-        result_1p = 0
-        result_2p = 0
-        result_3p = 0
-        result_4p = 0
+        result_p = DelayLine(PIPELINE, 0)
         self._result = 0
 
         while True:
             io = yield
-            assert io["result"] == result, f"{result_1m}, {result_4p}"
+            assert io["result"] == result, f"{result_1m}, {result_p}"
 
             result_1m = result
-            result = result_1p
-            result_1p = result_2p
-            result_2p = result_3p
-            result_3p = result_4p
-            result_4p = self._result
+            result = result_p.push(self._result)
 
             self._result = 0
             vpw.prep("m2", vpw.pack(Param.M2_WIDTH, 0))
@@ -134,27 +104,19 @@ class Checker:
 
             if self._reset:
                 result = 0
-                result_1p = 0
-                result_2p = 0
-                result_3p = 0
-                result_4p = 0
+                result_p.reset()
 
 
 @pytest.fixture(name="_design", scope="module")
 def design():
     """Compile the design only once for all tests."""
-    workspace = tempfile.mkdtemp()
-
-    dut = vpw.create(module='multiply_add',
-                     clock='clk',
-                     include=['../hdl'],
-                     parameter={'M1_WIDTH': Param.M1_WIDTH,
-                                'M2_WIDTH': Param.M2_WIDTH},
-                     workspace=workspace)
+    dut = build_cache.create(module='multiply_add',
+                             clock='clk',
+                             include=['../hdl'],
+                             parameter={'M1_WIDTH': Param.M1_WIDTH,
+                                        'M2_WIDTH': Param.M2_WIDTH})
     yield dut
 
-    shutil.rmtree(workspace)
-
 
 @pytest.fixture(name="_context")
 def context(_design):
@@ -267,12 +229,70 @@ def test_stream_reset(_context):
 
 
 def test_stream_random(_context):
-    """Test many random numbers for both 'm1' and 'm2'."""
+    """Test random numbers biased toward corner values until every coverage bin is hit."""
     checker = Checker()
     vpw.register(checker)
 
-    for _ in range(5000):
-        checker.set(random.getrandbits(Param.M2_WIDTH), random.getrandbits(Param.M1_WIDTH), 0)
+    coverage = Coverage(COVERAGE_BINS, goal=4)
+
+    while not coverage.closed():
+        assert coverage.sample_nb < 20000, f"Coverage did not close, {coverage}, holes: {coverage.holes()}"
+
+        operands = (corner_random(Param.M1_WIDTH), corner_random(Param.M2_WIDTH), corner_random(RESULT_WIDTH))
+        coverage.sample(*_coverage(*operands))
+        checker.set(*operands)
         vpw.tick()
 
     vpw.idle(10)  # wait for longer then the pipelined depth of module
+
+
+def test_stream_random_batch(_context):
+    """Test many random numbers for both 'm1' and 'm2' driven as a single batch."""
+    latency = MULTIPLY_ADD_LATENCY
+    number = 5000
+
+    m1 = np.random.randint(0, 1 << Param.M1_WIDTH, number + latency, dtype=np.int64)
+    m2 = np.random.randint(0, 1 << Param.M2_WIDTH, number + latency, dtype=np.int64)
+    add = np.random.randint(0, 1 << RESULT_WIDTH, number + latency, dtype=np.int64)
+
+    io = drive({"m1": (Param.M1_WIDTH, m1), "m2": (Param.M2_WIDTH, m2), "add": (RESULT_WIDTH, add)},
+               {"result": RESULT_WIDTH})
+
+    result = addition_array(RESULT_WIDTH, PRODUCT_WIDTH, add, multiply_array(Param.M1_WIDTH, Param.M2_WIDTH, m1, m2))
+
+    mismatch = np.flatnonzero(io["result"][latency:] != result[:number])
+    assert mismatch.size == 0, f"First mismatch at cycle {mismatch[:1]} of {mismatch.size}"
+
+
+@pytest.mark.skipif(Param.M1_WIDTH + Param.M2_WIDTH > SWEEP_WIDTH, reason="input space too large to sweep")
+def test_sweep_exhaustive(_context, record_property):
+    """Test every pair of 'm1' and 'm2' streamed back to back, checked in blocks against the array model."""
+    latency = MULTIPLY_ADD_LATENCY
+    total = 1 << (Param.M1_WIDTH + Param.M2_WIDTH)
+
+    # results of the previous block still within the pipeline, the module is idle before the sweep
+    pending = np.zeros(latency, dtype=np.int64)
+    start = time.perf_counter()
+
+    # the last block is padded with idle cycles to flush the pipeline
+    for first in range(0, total + latency, SWEEP_BLOCK):
+        index = np.arange(first, min(first + SWEEP_BLOCK, total + latency), dtype=np.int64)
+        valid = index < total
+
+        m1 = np.where(valid, index >> Param.M2_WIDTH, 0)
+        m2 = np.where(valid, index & ((1 << Param.M2_WIDTH) - 1), 0)
+        add = np.where(valid, np.random.randint(0, 1 << RESULT_WIDTH, index.size, dtype=np.int64), 0)
+
+        io = drive({"m1": (Param.M1_WIDTH, m1), "m2": (Param.M2_WIDTH, m2), "add": (RESULT_WIDTH, add)},
+                   {"result": RESULT_WIDTH})
+
+        result = addition_array(RESULT_WIDTH, PRODUCT_WIDTH, add,
+                                multiply_array(Param.M1_WIDTH, Param.M2_WIDTH, m1, m2))
+        stream = np.concatenate([pending, result])
+        pending = stream[-latency:]
+
+        # a mismatch is reported by the index of its (m1, m2) pair, that is m1 << M2_WIDTH | m2
+        mismatch = np.flatnonzero(io["result"] != stream[:index.size])
+        assert mismatch.size == 0, f"First mismatch at pair 0x{index[mismatch[0]] - latency:x} of {mismatch.size}"
+
+    record_property("macs_per_second", round(total / (time.perf_counter() - start)))
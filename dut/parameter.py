@@ -0,0 +1,24 @@
+"""
+Module parameter overrides for running a testbench at other parameter points.
+
+A testbench parameter named 'NAME' is overridden by setting the environment
+variable 'PARAM_NAME' to an integer value before the testbench is imported.
+"""
+
+import os
+from typing import Dict
+
+
+def override(name: str, default: int) -> int:
+    """Value of the parameter, from the environment when overridden or otherwise the default."""
+    value = os.environ.get(f"PARAM_{name}")
+
+    if value is None:
+        return default
+
+    return int(value, 0)
+
+
+def overrides() -> Dict[str, int]:
+    """Every parameter overridden from the environment, by name."""
+    return {k[len("PARAM_"):]: int(v, 0) for k, v in sorted(os.environ.items()) if k.startswith("PARAM_")}
@@ -0,0 +1,144 @@
+"""
+Pipeline models shared by the testbench Checkers.
+
+The latency of each module is the number of clock ticks from a value being
+prepped on its inputs until the result is sampled from its outputs. The
+latencies are derived from the pipeline structure of the HDL so they follow
+the module parameters, and can be confirmed against a compiled design with
+'batch.impulse'.
+"""
+
+from typing import Generic, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+# registers of the multiply_add module, from its inputs to 'result'
+MULTIPLY_ADD_LATENCY = 5
+
+# registers of the rescale module, from 'up_data' to 'dn_data'
+RESCALE_LATENCY = 4
+
+# register of the bias add within the engine module, between group_add and rescale
+BIAS_LATENCY = 1
+
+# register of the activation module, from 'up_data' to 'dn_data'
+ACTIVATION_LATENCY = 1
+
+# registers of the skid_buffer module, from 'up_data' to 'dn_data'
+SKID_LATENCY = 1
+
+# registers of each MAC within the slice module, multiply_add and the product register
+MAC_LATENCY = MULTIPLY_ADD_LATENCY + 1
+
+
+def group_add_latency(group_nb: int) -> int:
+    """Latency of the group_add module.
+
+    Each level of the adder tree registers its inputs, the sums and then the
+    sums once again, before halving the number of addends for the next level.
+    """
+    assert group_nb > 0, f"Group must have at least one number, given: {group_nb}"
+
+    if group_nb == 1:
+        return 0
+
+    if group_nb == 2:
+        return 3
+
+    return 3 + group_add_latency((group_nb + 1) // 2)
+
+
+def slice_latency(mac_nb: int) -> int:
+    """Latency of the slice module.
+
+    The image data of each MAC is delayed until the MAC before it has added its
+    product, and the 'result' output is registered once more. The OFFSET
+    parameter only chooses which beat the product of a MAC belongs to, so it
+    does not change the latency.
+    """
+    return MAC_LATENCY*mac_nb + 1
+
+
+def engine_latency(kernel_width: int, kernel_height: int, skid_nb: int = 0, activation: bool = False) -> int:
+    """Latency of the engine module, a slice feeding the group_add of a kernel column, the bias add and rescale.
+
+    An engine built with the activation stage adds its register after rescale.
+    An engine built with a skid buffer for backpressure adds its register to
+    the result path, the latency is then counted from a beat being accepted
+    until its result is first offered on the 'result' bus.
+    """
+    latency = slice_latency(kernel_width) + group_add_latency(kernel_height) + BIAS_LATENCY + RESCALE_LATENCY
+
+    if activation:
+        latency += ACTIVATION_LATENCY
+
+    if skid_nb > 0:
+        latency += SKID_LATENCY
+
+    return latency
+
+
+def shadow_hold(kernel_width: int) -> int:
+    """Clocks after a weight swap before the shadow weight bank of the engine module may be written.
+
+    The swap is delayed with the image data, so the last MAC of a slice only
+    copies the shadow bank once the first beat sent with the swap reaches it.
+    """
+    return MAC_LATENCY*(kernel_width - 1)
+
+
+def config_hold(kernel_width: int, kernel_height: int) -> int:
+    """Clocks after a weight swap before the shadow configuration of the engine module may be written.
+
+    The swap moves the shadow configuration into use as it reaches the bias add
+    with the sums of the first beat sent with it.
+    """
+    return slice_latency(kernel_width) + group_add_latency(kernel_height)
+
+
+class DelayLine(Generic[T]):
+    """Fixed depth delay line modeling the pipeline of a module.
+
+    A value pushed into the delay line is returned by the push made 'depth'
+    pushes later. Storage is allocated once and used as a ring buffer so the
+    cost of a push does not depend on the depth of the pipeline.
+
+    Arguments
+    depth: Number of pushes a value spends inside the delay line
+    fill: Value held by every stage after creation or reset
+    """
+    def __init__(self, depth: int, fill: T) -> None:
+        assert depth > 0, f"Delay line depth must be positive, given: {depth}"
+
+        self._depth = depth
+        self._fill = fill
+        self._data: List[T] = [fill]*depth
+        self._head = 0
+
+    def __len__(self) -> int:
+        return self._depth
+
+    def __iter__(self) -> Iterator[T]:
+        """Iterate the stages from the oldest to the newest value."""
+        for x in range(self._depth):
+            yield self._data[(self._head + x) % self._depth]
+
+    def __repr__(self) -> str:
+        return f"DelayLine({list(self)})"
+
+    def push(self, value: T) -> T:
+        """Push a value into the delay line and return the oldest value."""
+        oldest = self._data[self._head]
+        self._data[self._head] = value
+
+        self._head += 1
+        if self._head == self._depth:
+            self._head = 0
+
+        return oldest
+
+    def reset(self) -> None:
+        """Set every stage back to the fill value."""
+        for x in range(self._depth):
+            self._data[x] = self._fill
+        self._head = 0
@@ -0,0 +1,139 @@
+"""
+Cutting of raster frames into beats of the engine module and placing of the
+results back into the output raster.
+
+A frame is given as an iterable of rows which are consumed lazily, keeping
+only the KERNEL_HEIGHT rows of the current row window resident. Each row
+window is cut into beats of IMAGE_NB pixels per row for the engine 'image'
+bus and the results of each beat are placed back into the output raster.
+
+For an engine built with STRIDE and DILATION, only every STRIDE-th row window
+is sent, and the rows of a window are DILATION rows apart, so the rows of the
+frame that are not used by a kept kernel position are never sent.
+
+Nothing here depends on the simulator, so the functions and the 'Geometry' of
+the engine are shared by the frame driver of the testbenches and the cycle
+accurate engine model.
+"""
+
+from collections import deque
+from typing import Deque, Iterable, Iterator, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+# (row window, beat) position of a beat within the frame
+Tag = Tuple[int, int]
+
+
+class Geometry(NamedTuple):
+    """Parameters of the engine module that shape its buses and the kernel positions of its results.
+
+    Attributes
+    weight_width: Number width of kernel weight
+    image_width: Number width of image
+    image_nb: Number of pixels in image bus
+    kernel_width: The width of the convolutional kernel
+    kernel_height: The height of the convolutional kernel
+    stride: Kernel positions between the results of a row or column, must divide 'image_nb'
+    dilation: Pixels between the kernel rows and columns
+    """
+    weight_width: int = 8
+    image_width: int = 16
+    image_nb: int = 8
+    kernel_width: int = 3
+    kernel_height: int = 3
+    stride: int = 1
+    dilation: int = 1
+
+    @property
+    def result_nb(self) -> int:
+        """Number of pixels in result bus."""
+        return self.image_nb // self.stride
+
+    @property
+    def result_width(self) -> int:
+        """Number width of the sums of a kernel position, and of the 'cfg_bias' bus."""
+        return self.image_width + self.weight_width + 1
+
+    @property
+    def span_width(self) -> int:
+        """Pixels spanned by the kernel columns."""
+        return (self.kernel_width - 1)*self.dilation + 1
+
+    @property
+    def span_height(self) -> int:
+        """Rows spanned by the kernel rows."""
+        return (self.kernel_height - 1)*self.dilation + 1
+
+    def shape(self, height: int, width: int) -> Tuple[int, int]:
+        """Rows and columns of the output raster of a frame of 'height' rows of 'width' pixels."""
+        return (height - self.span_height) // self.stride + 1, (width - self.span_width) // self.stride + 1
+
+
+def beats(rows: Iterable[Sequence[int]], geometry: Geometry) -> Iterator[Tuple[Tag, np.ndarray]]:
+    """Generate the image bus beats of a frame.
+
+    Rows are padded on the right with zero pixels to fill the last beat of
+    every row window. Only every 'stride'-th row window is sent and the rows
+    of a window are 'dilation' rows apart.
+
+    Arguments
+    rows: Iterable of the frame rows
+    geometry: Kernel height and pixels per row of the image bus, stride and dilation of the engine
+
+    Yields the position of the beat and an array of (kernel_height, image_nb) pixels.
+    """
+    image_nb = geometry.image_nb
+    window: Deque[np.ndarray] = deque(maxlen=geometry.span_height)
+
+    for r, row in enumerate(rows):
+        row = np.asarray(row, dtype=np.int64)
+        window.append(np.pad(row, (0, -row.size % image_nb)))
+
+        top = r - geometry.span_height + 1
+        if len(window) < geometry.span_height or top % geometry.stride:
+            continue
+
+        pixels = np.stack(list(window)[::geometry.dilation])
+        for b in range(pixels.shape[1] // image_nb):
+            yield (top // geometry.stride, b), pixels[:, b*image_nb:(b+1)*image_nb]
+
+
+def pack(beat: np.ndarray, image_width: int) -> int:
+    """Pack a beat of (kernel_height, image_nb) pixels into the value of the image bus."""
+    mask = (1 << image_width) - 1
+    bus = 0
+
+    for x, pixel in enumerate(beat.flatten().tolist()):
+        bus = bus | ((pixel & mask) << (x*image_width))
+
+    return bus
+
+
+def unpack(bus: int, image_width: int, image_nb: int) -> np.ndarray:
+    """Unpack the value of the result bus into its two's complement pixels."""
+    mask = (1 << image_width) - 1
+
+    return np.array([(bus >> (x*image_width)) & mask for x in range(image_nb)], dtype=np.int64)
+
+
+def place(raster: np.ndarray, tag: Tag, result: np.ndarray, geometry: Geometry) -> None:
+    """Place the result pixels of a beat into the output raster.
+
+    Pixel 's' of a result is the kernel position ending at pixel 's' of the
+    beat, or with a stride the 's'-th position kept within the beat, the
+    positions that do not lay entirely within the frame are dropped.
+    """
+    window, beat = tag
+    stride = geometry.stride
+    span = geometry.span_width
+
+    # the first pixel of the kernel position of result pixel 0, a multiple of the stride
+    start = beat*result.size*stride + (span - 1) % stride - span + 1
+    column = start // stride
+
+    first = max(0, -column)
+    last = min(result.size, raster.shape[1] - column)
+
+    if first < last:
+        raster[window, column+first:column+last] = result[first:last]
@@ -0,0 +1,154 @@
+"""
+Parallel regression of the testbenches across a matrix of module parameters.
+
+Every point of the parameter matrix is run as its own pytest process, each
+building and simulating one design, with as many processes running at once
+as there are CPU cores. The results are merged into a single pass/fail table.
+
+The matrix of a testbench is a list of parameter sets, each of which covers
+every combination of its values, so parameters that only build together, such
+as the stride and dilation of the engine, are covered at points of their own.
+
+To run the default matrix.
+
+    python regress.py
+
+To run the engine testbench across a custom set of parameters, replacing its
+first parameter set.
+
+    python regress.py engine --param KERNEL_WIDTH=3,5 --param KERNEL_HEIGHT=3,5
+"""
+
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+DUT_DIR = Path(__file__).resolve().parent
+
+# testbench name mapped to the parameter sets to be covered, each the values of its parameters
+MATRIX: Dict[str, List[Dict[str, List[int]]]] = {
+    "multiply_add": [{"M1_WIDTH": [16], "M2_WIDTH": [8, 16]}],
+    "group_add": [{"GROUP_NB": [3, 4, 5], "NUM_WIDTH": [16, 25]}],
+    "rescale": [{"NUM_WIDTH": [25, 33], "IMG_WIDTH": [16]}],
+    "slice": [{"MAC_NB": [3], "OFFSET": [0, 1, 2], "WEIGHT_WIDTH": [8], "IMAGE_WIDTH": [16]}],
+    "engine": [{"WEIGHT_WIDTH": [8], "IMAGE_WIDTH": [16], "IMAGE_NB": [7],
+                "KERNEL_WIDTH": [3, 5, 7], "KERNEL_HEIGHT": [3, 5, 7], "DOUBLE_BUFFER": [0, 1],
+                "SKID_NB": [0, 16]},
+               # the stride must divide IMAGE_NB, which must hold the dilated kernel columns
+               {"WEIGHT_WIDTH": [8], "IMAGE_WIDTH": [16], "IMAGE_NB": [8],
+                "KERNEL_WIDTH": [3], "KERNEL_HEIGHT": [3], "STRIDE": [1, 2], "DILATION": [1, 2],
+                "ACTIVATION": [0, 1]}],
+    "engine_layer": [{"WEIGHT_WIDTH": [8], "IMAGE_WIDTH": [16], "IMAGE_NB": [7],
+                      "KERNEL_WIDTH": [3, 5], "KERNEL_HEIGHT": [3, 5], "DOUBLE_BUFFER": [0, 1],
+                      "ACTIVATION": [0, 1]}],
+    "skid_buffer": [{"NUM_WIDTH": [16], "DEPTH": [1, 5, 8]}],
+    "activation": [{"IMG_WIDTH": [8, 16]}],
+}
+
+
+def expand(matrix: Dict[str, List[Dict[str, List[int]]]]) -> List[Dict[str, Any]]:
+    """Expand the matrix into a list of jobs, one for every parameter point of every testbench."""
+    jobs = []
+
+    for testbench, parameter_sets in matrix.items():
+        for parameter in parameter_sets:
+            names = list(parameter)
+
+            for values in itertools.product(*(parameter[n] for n in names)):
+                jobs.append({"testbench": testbench, "parameter": dict(zip(names, values))})
+
+    return jobs
+
+
+def run(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Run the testbench of a job in its own pytest process and record the result."""
+    env = dict(os.environ)
+    env.update({f"PARAM_{k}": str(v) for k, v in job["parameter"].items()})
+
+    with tempfile.TemporaryDirectory() as workspace:
+        report = Path(workspace) / "report.xml"
+        start = time.perf_counter()
+
+        process = subprocess.run([sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider",
+                                  f"--junitxml={report}", f"{job['testbench']}.py"],
+                                 cwd=DUT_DIR, env=env, capture_output=True, text=True, check=False)
+
+        result = dict(job, seconds=round(time.perf_counter() - start, 3), tests=0, failures=0, errors=0)
+
+        if report.is_file():
+            suite = ET.parse(report).getroot()
+            suite = suite if suite.tag == "testsuite" else suite.find("testsuite")
+            for name in ("tests", "failures", "errors"):
+                result[name] = int(suite.get(name, 0))
+
+    result["passed"] = process.returncode == 0
+    if not result["passed"]:
+        result["output"] = process.stdout[-4000:] + process.stderr[-4000:]
+
+    return result
+
+
+def table(results: List[Dict[str, Any]]) -> str:
+    """Format the results as a pass/fail table."""
+    rows = [("testbench", "parameters", "tests", "failed", "seconds", "result")]
+
+    for r in results:
+        rows.append((r["testbench"],
+                     " ".join(f"{k}={v}" for k, v in r["parameter"].items()),
+                     str(r["tests"]),
+                     str(r["failures"] + r["errors"]),
+                     f"{r['seconds']:.1f}",
+                     "PASS" if r["passed"] else "FAIL"))
+
+    widths = [max(len(row[x]) for row in rows) for x in range(len(rows[0]))]
+
+    return "\n".join("  ".join(col.ljust(w) for col, w in zip(row, widths)).rstrip() for row in rows)
+
+
+def main() -> int:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("testbench", nargs="*", help="testbenches to run, all of the default matrix if not given")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=V1,V2",
+                        help="replace the values of a parameter within the first parameter set of the given "
+                             "testbenches, which is then the only set run")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="number of testbenches run in parallel")
+    parser.add_argument("--json", type=Path, help="also write the results to a JSON file")
+    args = parser.parse_args()
+
+    matrix = {tb: [dict(p) for p in MATRIX.get(tb, [{}])] for tb in (args.testbench or MATRIX)}
+
+    if args.param:
+        matrix = {tb: parameter_sets[:1] for tb, parameter_sets in matrix.items()}
+
+    for param in args.param:
+        name, values = param.split("=", 1)
+        for parameter_sets in matrix.values():
+            parameter_sets[0][name] = [int(v, 0) for v in values.split(",")]
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        results = list(pool.map(run, expand(matrix)))
+
+    print(table(results))
+
+    for r in results:
+        if not r["passed"]:
+            print(f"\n--- {r['testbench']} {r['parameter']} ---\n{r['output']}")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+    return 0 if all(r["passed"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
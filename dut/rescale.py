@@ -2,15 +2,23 @@
 Testbench for rescale module.
 """
 
+import math
 import random
-import shutil
-import tempfile
 from collections import deque
+from fractions import Fraction
 from enum import IntEnum
-from typing import Deque, Dict, Generator
+from typing import Deque, Dict, Generator, Tuple
 
+import build_cache
+import numpy as np
 import pytest
 import vpw
+from batch import drive
+from functional_coverage import Coverage, corner_random
+from fixed_point import Rescale, Rounding, twos
+from parameter import override
+from pipeline import RESCALE_LATENCY
+from scoreboard import SLACK, Scoreboard
 
 
 class Param(IntEnum):
@@ -20,120 +28,113 @@ class Param(IntEnum):
     NUM_WIDTH: Bus width of up_data number
     IMG_WIDTH: Bus width of dn_data number
     """
-    NUM_WIDTH = 33
-    IMG_WIDTH = 16
+    NUM_WIDTH = override("NUM_WIDTH", 33)
+    IMG_WIDTH = override("IMG_WIDTH", 16)
 
 
-def _twos(width: int, data: int) -> int:
-    """Convert signed numbers into two's complement.
+_model_rescale = Rescale(Param.NUM_WIDTH, Param.IMG_WIDTH)
 
-    If a number sent in as a negatively signed int it will be converted to a
-    two's complement negative number with a defined bit width. Otherwise the
-    number is masked to not extra bits are expressed in the returned number.
+IMG_MAX = (1 << (Param.IMG_WIDTH - 1)) - 1
+IMG_MIN = -(1 << (Param.IMG_WIDTH - 1))
+NUM_MAX = (1 << (Param.NUM_WIDTH - 1)) - 1
+NUM_MIN = -(1 << (Param.NUM_WIDTH - 1))
 
-    Arguments
-    width: Number of bits used to express the data value
-    data: The number to be converted to two's complement
-    """
-    mask = (1 << width) - 1
-
-    if data < 0:
-        data = data + 2**width
-
-    return data & mask
 
+def _coverage(data: int, shift: int, rounding: Rounding) -> Tuple[str, int, str, str]:
+    """Coverage bin hit by one number, its shift and rounding mode and if it is clamped to IMG_MAX or IMG_MIN."""
+    number = _model_rescale.shifted(data, shift, rounding)
 
-def _model_rescale(number: int, shift: int) -> int:
-    num_mask = (1 << Param.NUM_WIDTH) - 1
-    negative = 1 << (Param.NUM_WIDTH - 1)
-    img_max = int((1 << (Param.IMG_WIDTH - 1)) - 1)
-    img_min = int((img_max + 1) * -1)
+    if number > IMG_MAX:
+        return ("shift", shift, rounding.name, "maximum")
 
-    # converts to twos complement of defined width
-    number = _twos(Param.NUM_WIDTH, number)
+    if number < IMG_MIN:
+        return ("shift", shift, rounding.name, "minimum")
 
-    # convert number back into negative when down stream should be negative
-    if (number & negative) != 0 and Param.NUM_WIDTH >= (Param.IMG_WIDTH + shift):
-        number = int((num_mask - number + 1) * -1)
+    return ("shift", shift, rounding.name, "pass")
 
-    # raw value of shifted number
-    scaled = _twos(Param.IMG_WIDTH, (number >> shift))
 
-    if int(number >> shift) > img_max:
-        # shifted number greater than image max
-        scaled = _twos(Param.IMG_WIDTH, img_max)
-
-    if int(number >> shift) < img_min:
-        # shifted number less than image min
-        scaled = _twos(Param.IMG_WIDTH, img_min)
-
-    return scaled
+# every shift passes numbers through, while only the shifts that can reach the image bounds clamp
+COVERAGE_BINS = sorted({_coverage(twos(Param.NUM_WIDTH, n), s, r)
+                        for s in range(Param.NUM_WIDTH + 1)
+                        for r in Rounding
+                        for n in (NUM_MAX, NUM_MIN, 0, -1)})
 
 
 class Checker:
     """Model of Hardware Module"""
     def __init__(self) -> None:
         self._queue: Deque[Dict[str, int]] = deque()
+        self.scoreboard = Scoreboard("dn_data", max_latency=RESCALE_LATENCY + SLACK)
 
     def empty(self) -> bool:
-        """Check if data queue is empty and thus all data has been sent."""
-        return not self._queue
+        """Check if data queue is empty and every result has been received."""
+        return not (self._queue or self.scoreboard)
+
+    def send(self, data: int, shift: int, rounding: int = Rounding.TRUNCATE) -> None:
+        """Add 'data', 'shift' and 'rounding' to queue for sending into rescale module."""
+        self._queue.append({"up_data": data, "shift": shift, "rounding": rounding, "valid": 1,
+                            "dn_data": _model_rescale(data, shift, rounding)})
 
-    def send(self, data: int, shift: int) -> None:
-        """Add 'data' and 'shift' to queue for sending into rescale module."""
-        self._queue.append({"up_data": data, "shift": shift})
+    def send_array(self, data: np.ndarray, shift: np.ndarray, rounding: np.ndarray = Rounding.TRUNCATE) -> None:
+        """Add arrays of 'data', 'shift' and 'rounding' to queue, the model results are calculated in one batch."""
+        shift = np.broadcast_to(shift, np.shape(data))
+        rounding = np.broadcast_to(rounding, np.shape(data))
+        dn_data = _model_rescale.array(data, shift, rounding)
+
+        for d, s, m, r in zip(data.tolist(), shift.tolist(), rounding.tolist(), dn_data.tolist()):
+            self._queue.append({"up_data": d, "shift": s, "rounding": m, "valid": 1, "dn_data": r})
 
     def init(self, _) -> Generator:
         """Background initilization function."""
-        number_5p = {"up_data": 0, "shift": 0}
-        number_4p = {"up_data": 0, "shift": 0}
-        number_3p = {"up_data": 0, "shift": 0}
-        number_2p = {"up_data": 0, "shift": 0}
-        number_1p = {"up_data": 0, "shift": 0}
-        number = {"up_data": 0, "shift": 0}
+        number = {"up_data": 0, "shift": 0, "rounding": 0, "valid": 0, "dn_data": 0}
         vpw.prep("up_data", vpw.pack(Param.NUM_WIDTH, number["up_data"]))
+        vpw.prep("up_valid", [number["valid"]])
         vpw.prep("shift", [number["shift"]])
+        vpw.prep("rounding", [number["rounding"]])
 
         while True:
             io = yield
-            number_5p = number_4p
-            number_4p = number_3p
-            number_3p = number_2p
-            number_2p = number_1p
-            number_1p = number
-            number = {"up_data": 0, "shift": 0}
+            self.scoreboard.tick()
+
+            if io["dn_valid"]:
+                self.scoreboard.observe(io["dn_data"])
+
+            if number["valid"]:
+                self.scoreboard.expect(number["dn_data"])
+
+            number = {"up_data": 0, "shift": 0, "rounding": 0, "valid": 0, "dn_data": 0}
             if self._queue:
                 number = self._queue.popleft()
 
             vpw.prep("up_data", vpw.pack(Param.NUM_WIDTH, number["up_data"]))
+            vpw.prep("up_valid", [number["valid"]])
             vpw.prep("shift", [number["shift"]])
-
-            assert io["dn_data"] == _model_rescale(number_5p["up_data"], number_5p["shift"])
+            vpw.prep("rounding", [number["rounding"]])
 
 
 @pytest.fixture(name="_design", scope="module")
 def design():
     """Compile the design only once for all tests."""
-    workspace = tempfile.mkdtemp()
-
-    dut = vpw.create(module='rescale',
-                     clock='clk',
-                     include=['../hdl'],
-                     parameter={'NUM_WIDTH': Param.NUM_WIDTH,
-                                'IMG_WIDTH': Param.IMG_WIDTH},
-                     workspace=workspace)
+    dut = build_cache.create(module='rescale',
+                             clock='clk',
+                             include=['../hdl'],
+                             parameter={'NUM_WIDTH': Param.NUM_WIDTH,
+                                        'IMG_WIDTH': Param.IMG_WIDTH})
     yield dut
 
-    shutil.rmtree(workspace)
-
 
 @pytest.fixture(name="_context")
 def context(_design):
     """Setup and tear-down the design for each test."""
     vpw.init(_design, trace=False)
 
+    vpw.prep("rst", [1])
     vpw.prep("shift", [0])
+    vpw.prep("rounding", [0])
     vpw.prep("up_data", vpw.pack(Param.NUM_WIDTH, 0))
+    vpw.prep("up_valid", [0])
+    vpw.idle(2)
+    vpw.prep("rst", [0])
     vpw.idle(2)
 
     yield
@@ -142,20 +143,53 @@ def context(_design):
     vpw.finish()
 
 
+@pytest.mark.parametrize("rounding", list(Rounding))
+def test_model_array(rounding):
+    """Test that the array model matches the scalar model for every valid shift value."""
+    for shift in range(Param.NUM_WIDTH + 1):
+        data = [random.getrandbits(Param.NUM_WIDTH) for _ in range(1000)]
+        expected = [_model_rescale(d, shift, rounding) for d in data]
+
+        assert _model_rescale.array(np.array(data, dtype=np.int64), shift, rounding).tolist() == expected, \
+               f"shift: {shift}"
+
+
+@pytest.mark.parametrize("rounding", list(Rounding))
+def test_model_rounding(rounding):
+    """Test that the model rounds every shift of a number as the exact quotient rounded by the mode."""
+    for shift in range(1, Param.NUM_WIDTH - Param.IMG_WIDTH + 1):
+        for number in range(-4 << shift, 4 << shift, max(1, (1 << shift) >> 2)):
+            quotient = Fraction(number, 1 << shift)
+
+            if rounding == Rounding.HALF_UP:
+                expected = math.floor(quotient + Fraction(1, 2))
+            elif rounding == Rounding.HALF_EVEN:
+                expected = round(quotient)
+            else:
+                expected = math.floor(quotient)
+
+            assert _model_rescale.shifted(twos(Param.NUM_WIDTH, number), shift, rounding) == expected, \
+                   f"number: {number}, shift: {shift}"
+
+
 def test_pipeline_depth(_context):
     """Test that module pipeline depth is 4 clock cycles deep."""
     vpw.prep("up_data", vpw.pack(Param.NUM_WIDTH, 5))
+    vpw.prep("up_valid", [1])
     vpw.tick()
     vpw.prep("up_data", vpw.pack(Param.NUM_WIDTH, 0))
+    vpw.prep("up_valid", [0])
 
     io = vpw.idle(3)
     assert io["dn_data"] == 0, "Module is 3 clock cycles deep instead of 4."
 
     io = vpw.tick()
     assert io["dn_data"] == _model_rescale(5, 0), "Module should be 4 clocks cycles deep."
+    assert io["dn_valid"] == 1, "Valid is not delayed with the number."
 
     io = vpw.tick()
     assert io["dn_data"] == 0, "Module is 5 clock cycles deep instead of 4."
+    assert io["dn_valid"] == 0, "Valid is held for more then one clock."
 
 
 def test_image_maximum(_context):
@@ -182,24 +216,74 @@ def test_dynamic_shift(_context):
     for x in range(18):
         checker.send(266240, x)
 
-    # wait until all data has been sent into DUT
+    # wait until all data has been sent into DUT and every result received
     while not checker.empty():
         vpw.tick()
 
-    vpw.idle(10)  # wait for longer then the pipelined depth of module
-
 
 def test_shift_random_number(_context):
-    """Test many random numbers for every valid shift value."""
+    """Test random numbers biased toward the clamp bounds of every shift and rounding mode until every bin is hit."""
     checker = Checker()
     vpw.register(checker)
 
-    for shift in range(Param.NUM_WIDTH + 1):
-        for _ in range(5000):
-            checker.send(random.getrandbits(Param.IMG_WIDTH + shift), shift)
+    coverage = Coverage(COVERAGE_BINS, goal=4)
+
+    while not coverage.closed():
+        assert coverage.sample_nb < 40000, f"Coverage did not close, {coverage}, holes: {coverage.holes()}"
+
+        # constrain the number toward either side of the image bounds at this shift, and half way past them
+        shift = random.randint(0, Param.NUM_WIDTH)
+        rounding = random.choice(list(Rounding))
+        bounds = [IMG_MAX << shift, (IMG_MAX + 1) << shift, IMG_MIN << shift, (IMG_MIN << shift) - 1]
+        data = corner_random(Param.NUM_WIDTH, bounds + [b + ((1 << shift) >> 1) for b in bounds])
+
+        coverage.sample(_coverage(data, shift, rounding))
+        checker.send(data, shift, rounding)
+
+    # wait until all data has been sent into DUT and every result received
+    while not checker.empty():
+        vpw.tick()
+
+
+@pytest.mark.parametrize("rounding", list(Rounding))
+def test_rounding_ties(_context, rounding):
+    """Test numbers half way between two image values, and either side of half way, for every valid shift value."""
+    checker = Checker()
+    vpw.register(checker)
+
+    for shift in range(1, Param.NUM_WIDTH - Param.IMG_WIDTH + 1):
+        half = 1 << (shift - 1)
 
-    # wait until all data has been sent into DUT
+        for whole in (-3, -2, -1, 0, 1, 2, IMG_MAX - 1, IMG_MAX, IMG_MIN):
+            for fraction in (half - 1, half, half + 1):
+                checker.send(twos(Param.NUM_WIDTH, (whole << shift) + fraction), shift, rounding)
+
+    # wait until all data has been sent into DUT and every result received
     while not checker.empty():
         vpw.tick()
 
-    vpw.idle(10)  # wait for longer then the pipelined depth of module
+
+@pytest.mark.parametrize("rounding", list(Rounding))
+def test_shift_random_batch(_context, rounding):
+    """Test many random numbers for every valid shift value driven as a single batch."""
+    latency = RESCALE_LATENCY
+    number = 5000
+
+    shift = np.repeat(np.arange(Param.NUM_WIDTH + 1, dtype=np.int64), number)
+    up_data = np.random.randint(0, np.left_shift(1, Param.IMG_WIDTH + shift), dtype=np.int64)
+
+    up_valid = np.concatenate([np.ones(shift.size, dtype=np.int64), np.zeros(latency, dtype=np.int64)])
+    shift = np.concatenate([shift, np.zeros(latency, dtype=np.int64)])
+    up_data = np.concatenate([up_data, np.zeros(latency, dtype=np.int64)])
+
+    io = drive({"up_data": (Param.NUM_WIDTH, up_data),
+                "up_valid": (1, up_valid),
+                "shift": (8, shift),
+                "rounding": (2, np.full(shift.size, rounding, dtype=np.int64))},
+               {"dn_data": Param.IMG_WIDTH, "dn_valid": 1})
+
+    dn_data = _model_rescale.array(up_data, shift, rounding)
+
+    mismatch = np.flatnonzero(io["dn_data"][latency:] != dn_data[:-latency])
+    assert mismatch.size == 0, f"First mismatch at cycle {mismatch[:1]} of {mismatch.size}"
+    assert np.array_equal(io["dn_valid"][latency:], up_valid[:-latency]), "Valid is not delayed with the number."
@@ -0,0 +1,114 @@
+"""
+Transaction level scoreboard shared by the testbench Checkers.
+
+The model of a Checker enqueues the transaction it expects for every value
+the module accepts, and every valid output of the module is matched against
+the queue. Matching only relies on a window of latencies, from the clock the
+value was accepted on until the clock its result is observed, so a pipeline
+can be retimed without the Checkers following it clock for clock. The exact
+latency of each module is tested on its own against 'pipeline'.
+
+A transaction that is observed with the wrong value, too early, or is not
+observed before its window closes fails the test with its transaction ID and
+the clock cycle it was issued and observed on.
+"""
+
+from collections import deque
+from typing import Any, Deque, NamedTuple, Optional
+
+# clocks a result may be observed later than the latency derived from the module parameters
+SLACK = 16
+
+
+class Transaction(NamedTuple):
+    """Expected value of a transaction and the clock cycle it was issued on."""
+    id: int
+    cycle: int
+    value: Any
+
+
+def _format(value: Any) -> str:
+    """Format integers in hex, as bus values are mostly read against a waveform."""
+    return f"0x{value:x}" if isinstance(value, int) else repr(value)
+
+
+class Scoreboard:
+    """Matches observed outputs against expected transactions within a latency window.
+
+    The scoreboard counts clock cycles with 'tick', which a Checker calls once
+    at the start of every background call. Transactions expected and outputs
+    observed within a call are on the same clock cycle.
+
+    Arguments
+    name: Name of the output, used in failure messages
+    max_latency: Most clocks from a transaction being issued until it is observed, None for no bound
+    min_latency: Fewest clocks from a transaction being issued until it is observed
+    ordered: Outputs are observed in the order the transactions were issued, otherwise an output is
+             matched with the oldest outstanding transaction of the same value
+    """
+    def __init__(self,
+                 name: str,
+                 max_latency: Optional[int] = None,
+                 min_latency: int = 1,
+                 ordered: bool = True) -> None:
+        assert max_latency is None or min_latency <= max_latency, \
+               f"Window is empty, min latency: {min_latency}, max latency: {max_latency}"
+
+        self._name = name
+        self._window = (min_latency, max_latency)
+        self._ordered = ordered
+        self._queue: Deque[Transaction] = deque()
+        self._next_id = 0
+
+        self.cycle = 0
+        self.matched = 0
+
+    def __len__(self) -> int:
+        """Number of outstanding transactions."""
+        return len(self._queue)
+
+    def tick(self) -> None:
+        """Advance to the next clock cycle and check the oldest transaction is still within its window."""
+        self.cycle += 1
+
+        max_latency = self._window[1]
+        if self._queue and max_latency is not None:
+            oldest = self._queue[0]
+            assert self.cycle - oldest.cycle <= max_latency, \
+                   f"{self._name} transaction {oldest.id} issued on cycle {oldest.cycle} was not observed " \
+                   f"within {max_latency} clocks, expected: {_format(oldest.value)}"
+
+    def expect(self, value: Any) -> int:
+        """Enqueue a transaction issued on the current clock cycle and return its ID."""
+        transaction = Transaction(self._next_id, self.cycle, value)
+        self._queue.append(transaction)
+        self._next_id += 1
+
+        return transaction.id
+
+    def observe(self, value: Any) -> Transaction:
+        """Match a valid output observed on the current clock cycle and return its transaction."""
+        assert self._queue, f"{self._name} observed {_format(value)} on cycle {self.cycle} without a transaction"
+
+        index = 0
+        if not self._ordered:
+            index = next((x for x, t in enumerate(self._queue) if t.value == value), 0)
+
+        transaction = self._queue[index]
+        del self._queue[index]
+
+        assert transaction.value == value, \
+               f"{self._name} transaction {transaction.id} issued on cycle {transaction.cycle} " \
+               f"observed on cycle {self.cycle}: {_format(value)} != {_format(transaction.value)}"
+
+        min_latency = self._window[0]
+        assert self.cycle - transaction.cycle >= min_latency, \
+               f"{self._name} transaction {transaction.id} issued on cycle {transaction.cycle} " \
+               f"observed on cycle {self.cycle}, sooner than {min_latency} clocks"
+
+        self.matched += 1
+        return transaction
+
+    def clear(self) -> None:
+        """Drop every outstanding transaction, when the module is reset."""
+        self._queue.clear()
@@ -0,0 +1,159 @@
+"""
+Testbench for skid_buffer module.
+"""
+
+import random
+from collections import deque
+from enum import IntEnum
+from typing import Deque, Generator
+
+import build_cache
+import pytest
+import vpw
+from parameter import override
+from pipeline import SKID_LATENCY
+
+
+class Param(IntEnum):
+    """Module parameter configuration.
+
+    Attributes
+    NUM_WIDTH: Bus width of up_data and dn_data number
+    DEPTH: Number of values held by the buffer
+    """
+    NUM_WIDTH = override("NUM_WIDTH", 16)
+    DEPTH = override("DEPTH", 8)
+
+
+class Checker:
+    """Model of Hardware Module"""
+    def __init__(self, valid_probability: float = 1.0, ready_probability: float = 1.0) -> None:
+        self._valid_probability = valid_probability
+        self._ready_probability = ready_probability
+        self._queue: Deque[int] = deque()
+        self._buffer: Deque[int] = deque()
+        self._writing = False
+        self.read_nb = 0
+
+    def empty(self) -> bool:
+        """Check if every value has been written into and read out of the module."""
+        return not (self._queue or self._buffer or self._writing)
+
+    def send(self, data: int) -> None:
+        """Add 'data' to queue for writing into the module."""
+        self._queue.append(data)
+
+    def init(self, _) -> Generator:
+        """Background initilization function."""
+        up_data = 0
+        dn_ready = 0
+
+        vpw.prep("up_data", vpw.pack(Param.NUM_WIDTH, 0))
+        vpw.prep("up_valid", [0])
+        vpw.prep("dn_ready", [0])
+
+        while True:
+            io = yield
+
+            assert io["fill"] == len(self._buffer), f"fill: {io['fill']}, model: {len(self._buffer)}"
+            assert io["dn_valid"] == int(bool(self._buffer)), f"valid: {io['dn_valid']}, model: {len(self._buffer)}"
+
+            if self._buffer:
+                assert io["dn_data"] == self._buffer[0], f"{io['dn_data']:x} != {self._buffer[0]:x}"
+
+                if dn_ready:
+                    self._buffer.popleft()
+                    self.read_nb += 1
+
+            if self._writing:
+                self._buffer.append(up_data)
+
+            # values are only written while there is room for them
+            self._writing = bool(self._queue) and len(self._buffer) < Param.DEPTH \
+                and random.random() < self._valid_probability
+            up_data = self._queue.popleft() if self._writing else 0
+            dn_ready = int(random.random() < self._ready_probability)
+
+            vpw.prep("up_data", vpw.pack(Param.NUM_WIDTH, up_data))
+            vpw.prep("up_valid", [int(self._writing)])
+            vpw.prep("dn_ready", [dn_ready])
+
+
+@pytest.fixture(name="_design", scope="module")
+def design():
+    """Compile the design only once for all tests."""
+    dut = build_cache.create(module='skid_buffer',
+                             clock='clk',
+                             include=['../hdl'],
+                             parameter={'NUM_WIDTH': Param.NUM_WIDTH,
+                                        'DEPTH': Param.DEPTH})
+    yield dut
+
+
+@pytest.fixture(name="_context")
+def context(_design):
+    """Setup and tear-down the design for each test."""
+    vpw.init(_design, trace=False)
+
+    vpw.prep("rst", [1])
+    vpw.prep("up_data", vpw.pack(Param.NUM_WIDTH, 0))
+    vpw.prep("up_valid", [0])
+    vpw.prep("dn_ready", [0])
+    vpw.idle(2)
+    vpw.prep("rst", [0])
+    vpw.idle(2)
+
+    yield
+
+    vpw.idle(10)
+    vpw.finish()
+
+
+def test_pipeline_depth(_context):
+    """Test that a value written into the empty module is offered on the next clock."""
+    vpw.prep("up_data", vpw.pack(Param.NUM_WIDTH, 5))
+    vpw.prep("up_valid", [1])
+    io = vpw.tick()
+    assert io["dn_valid"] == 0, "Module offers a value before it is written."
+
+    vpw.prep("up_valid", [0])
+    for _ in range(SKID_LATENCY - 1):
+        vpw.tick()
+
+    io = vpw.tick()
+    assert io["dn_valid"] == 1 and io["dn_data"] == 5, f"Module should be {SKID_LATENCY} clock cycles deep."
+
+
+def test_fill_and_drain(_context):
+    """Test writing the module full while it is not read and then reading every value back in order."""
+    for x in range(Param.DEPTH):
+        vpw.prep("up_data", vpw.pack(Param.NUM_WIDTH, x + 1))
+        vpw.prep("up_valid", [1])
+        vpw.tick()
+
+    vpw.prep("up_valid", [0])
+    io = vpw.tick()
+    assert io["fill"] == Param.DEPTH, f"Module holds {io['fill']} values instead of {Param.DEPTH}."
+
+    vpw.prep("dn_ready", [1])
+    for x in range(Param.DEPTH):
+        io = vpw.tick()
+        assert io["dn_valid"] == 1 and io["dn_data"] == x + 1, f"Value {x} read out of order."
+
+    io = vpw.tick()
+    assert io["dn_valid"] == 0, "Module offers a value once it has been drained."
+
+
+@pytest.mark.parametrize("valid_probability, ready_probability", [(1.0, 1.0), (1.0, 0.5), (0.5, 0.9), (0.3, 0.3)])
+def test_stream_random_stall(_context, valid_probability, ready_probability):
+    """Test a random stream of values written and read with random gaps and down stream stalls."""
+    checker = Checker(valid_probability, ready_probability)
+    vpw.register(checker)
+
+    for _ in range(2000):
+        checker.send(random.getrandbits(Param.NUM_WIDTH))
+
+    while not checker.empty():
+        vpw.tick()
+
+    assert checker.read_nb == 2000, f"{checker.read_nb} values read out of 2000."
@@ -1,14 +1,20 @@
 """
-Testbench for slice module with offset parameter set to 0.
+Testbench for slice module.
+
+The offset defaults to 0, other offsets are covered by setting PARAM_OFFSET.
 """
 
-import shutil
-import tempfile
 from enum import IntEnum
-from typing import Final, Generator, List
+from typing import Generator, List, Optional
 
+import build_cache
 import pytest
 import vpw
+from batch import impulse
+from fixed_point import addition, multiply
+from parameter import override
+from pipeline import slice_latency
+from scoreboard import SLACK, Scoreboard
 
 
 class Param(IntEnum):
@@ -20,75 +26,14 @@ class Param(IntEnum):
     WEIGHT_WIDTH: Bus width of kernel weight numbers
     IMAGE_WIDTH: Bus width of image numbers
     """
-    MAC_NB = 3
-    OFFSET = 0
-    WEIGHT_WIDTH = 8
-    IMAGE_WIDTH = 16
-
-
-def _twos(width: int, data: int) -> int:
-    """Convert signed numbers into two's complement.
-
-    If a number sent in as a negatively signed int it will be converted to a
-    two's complement negative number with a defined bit width. Otherwise the
-    number is masked to not extra bits are expressed in the returned number.
-
-    Arguments
-    width: Number of bits used to express the data value
-    data: The number to be converted to two's complement
-    """
-    mask = (1 << width) - 1
-
-    if data < 0:
-        data = data + 2**width
-
-    return data & mask
-
-
-def _twos_extend(extend_width: int, data_width: int, data: int) -> int:
-    """Extend signed bit of a two's complement number.
-
-    Before performing an operation on a twos complement number its width must
-    be extended to be the same as the finial operator.
-
-    Arguments
-    extend_width: Number of bits used to express the extended data value
-    data_width: Number of bits used to express the data value
-    data: The number to be converted to two's complement
-    """
-    mask_data = (1 << data_width) - 1
-    mask_extend = (1 << extend_width) - 1
-    negative = 1 << (data_width - 1)
-
-    data = _twos(data_width, data)
-
-    if bool(data & negative):
-        data = (mask_extend ^ mask_data) | data
-
-    return data
-
+    MAC_NB = override("MAC_NB", 3)
+    OFFSET = override("OFFSET", 0)
+    WEIGHT_WIDTH = override("WEIGHT_WIDTH", 8)
+    IMAGE_WIDTH = override("IMAGE_WIDTH", 16)
 
-def _mac_multiply(m1: int, m2: int) -> int:
-    """Two's complement multiply."""
-    width = Param.IMAGE_WIDTH + Param.WEIGHT_WIDTH
-    mask = (1 << width) - 1
 
-    m1 = _twos_extend(width, Param.IMAGE_WIDTH, m1)
-    m2 = _twos_extend(width, Param.WEIGHT_WIDTH, m2)
-
-    return (m1 * m2) & mask
-
-
-def _mac_addition(addition: int, product: int) -> int:
-    """Two's complement addition."""
-    width_addition = Param.IMAGE_WIDTH + Param.WEIGHT_WIDTH + 1
-    width_product = Param.IMAGE_WIDTH + Param.WEIGHT_WIDTH
-    mask_addition = (1 << width_addition) - 1
-
-    addition = _twos(width_addition, addition)
-    product = _twos_extend(width_addition, width_product, product)
-
-    return (addition + product) & mask_addition
+RESULT_WIDTH = Param.IMAGE_WIDTH+Param.WEIGHT_WIDTH+1
+PRODUCT_WIDTH = Param.IMAGE_WIDTH+Param.WEIGHT_WIDTH
 
 
 class Checker:
@@ -96,8 +41,9 @@ class Checker:
     def __init__(self) -> None:
         self._reset: bool = False
         self._weight: List[int] = [0]*Param.MAC_NB
-        self._result: int = 0
+        self._result: Optional[int] = None
         self._partial: int = 0
+        self.scoreboard = Scoreboard("result", max_latency=slice_latency(Param.MAC_NB) + SLACK)
 
     def _slice(self, image: List[int]) -> None:
         """Modeling the slice modules logic."""
@@ -106,9 +52,11 @@ class Checker:
 
         for x in range(Param.MAC_NB):
             if (Param.OFFSET == (Param.MAC_NB-1)) or ((Param.MAC_NB-1-Param.OFFSET) <= x):
-                result = _mac_addition(result, _mac_multiply(image[x], self._weight[x]))
+                result = addition(RESULT_WIDTH, PRODUCT_WIDTH, result,
+                                  multiply(Param.IMAGE_WIDTH, Param.WEIGHT_WIDTH, image[x], self._weight[x]))
             else:
-                partial = _mac_addition(partial, _mac_multiply(image[x], self._weight[x]))
+                partial = addition(RESULT_WIDTH, PRODUCT_WIDTH, partial,
+                                   multiply(Param.IMAGE_WIDTH, Param.WEIGHT_WIDTH, image[x], self._weight[x]))
 
         self._result = result
         self._partial = partial
@@ -151,29 +99,24 @@ class Checker:
 
     def init(self, _) -> Generator:
         """Background initilization function."""
-        PIPELINE: Final = 18
-
-        result_1m = 0
-        result = 0
-        result_p = [0]*PIPELINE
-        self._result = 0
+        self._result = None
 
         while True:
             io = yield
-            assert io["result"] == result, f"{result_1m}, {result}, {result_p}"
+            self.scoreboard.tick()
 
-            result_1m = result
-            result = result_p[0]
-            result_p = result_p[1::]+[self._result]
-            self._result = 0
+            if io["result_valid"]:
+                self.scoreboard.observe(io["result"])
+
+            if self._result is not None:
+                self.scoreboard.expect(self._result)
+            self._result = None
 
             vpw.prep("image", vpw.pack(Param.IMAGE_WIDTH*Param.MAC_NB, 0))
             vpw.prep("image_valid", [0])
 
             if self._reset:
-                result_1m = 0
-                result = 0
-                result_p = [0]*PIPELINE
+                self.scoreboard.clear()
                 self._weight = [0]*Param.MAC_NB
                 self._partial = 0
 
@@ -181,20 +124,15 @@ class Checker:
 @pytest.fixture(name="_design", scope="module")
 def design():
     """Compile the design only once for all tests."""
-    workspace = tempfile.mkdtemp()
-
-    dut = vpw.create(module='slice',
-                     clock='clk',
-                     include=['../hdl'],
-                     parameter={'MAC_NB': Param.MAC_NB,
-                                'OFFSET': Param.OFFSET,
-                                'WEIGHT_WIDTH': Param.WEIGHT_WIDTH,
-                                'IMAGE_WIDTH': Param.IMAGE_WIDTH},
-                     workspace=workspace)
+    dut = build_cache.create(module='slice',
+                             clock='clk',
+                             include=['../hdl'],
+                             parameter={'MAC_NB': Param.MAC_NB,
+                                        'OFFSET': Param.OFFSET,
+                                        'WEIGHT_WIDTH': Param.WEIGHT_WIDTH,
+                                        'IMAGE_WIDTH': Param.IMAGE_WIDTH})
     yield dut
 
-    shutil.rmtree(workspace)
-
 
 @pytest.fixture(name="_context")
 def context(_design):
@@ -216,6 +154,19 @@ def context(_design):
     vpw.finish()
 
 
+def test_pipeline_depth(_context):
+    """Test that the module pipeline depth matches the depth derived from the module parameters."""
+    checker = Checker()
+    checker.send_weight([1]*Param.MAC_NB)
+    vpw.idle(4)
+
+    pixels = sum(1 << (x*Param.IMAGE_WIDTH) for x in range(Param.MAC_NB))
+    depth = impulse({"image": (Param.IMAGE_WIDTH*Param.MAC_NB, pixels), "image_valid": (1, 1)},
+                    ("result", RESULT_WIDTH))
+
+    assert depth == slice_latency(Param.MAC_NB), f"Module is {depth} clock cycles deep."
+
+
 def test_stream_contiguous_2_beats(_context):
     """Test sending 2 contiguous beats of the image stream."""
     checker = Checker()
@@ -235,7 +186,8 @@ def test_stream_contiguous_2_beats(_context):
     checker.prep_image(image)
     vpw.tick()
 
-    vpw.idle(100)  # wait for longer then the pipelined depth of module
+    while checker.scoreboard:  # wait until every result has been received
+        vpw.tick()
 
 
 def test_stream_intermittent_2_beats(_context):
@@ -256,4 +208,5 @@ def test_stream_intermittent_2_beats(_context):
     checker.prep_image(image)
     vpw.tick()
 
-    vpw.idle(100)  # wait for longer then the pipelined depth of module
+    while checker.scoreboard:  # wait until every result has been received
+        vpw.tick()
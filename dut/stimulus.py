@@ -0,0 +1,201 @@
+"""
+Record the stimulus of a test to a compact binary trace and replay it.
+
+While a test runs, every value prepped into the design is recorded with the
+clock cycle it is applied on. When the test fails the stimulus is saved as a
+zlib compressed trace, along with the random seed, the arguments the design
+was built with and the cycle the test failed on. Replaying a trace drives the
+recorded values into a trace-enabled build of the same design without any
+Checker, and only for a window of cycles around the failure, so a waveform of
+the failure is written in seconds.
+
+Port values are held until they are prepped again, so the replay first preps
+the last value of every port from before the window. State that lives longer
+than the window, such as the weights of the engine, needs a window that starts
+before it was written, up to the whole test with '--before' as large as the
+failing cycle. Only the last clocks of a long test are kept, set by the
+STIMULUS_DEPTH environment variable of the test run.
+
+To replay the default window of a saved trace.
+
+    python stimulus.py stimulus/engine.py-test_stream_random.stim
+
+To replay a longer window before the failure.
+
+    python stimulus.py stimulus/engine.py-test_stream_random.stim --before 2000
+"""
+
+import argparse
+import json
+import re
+import struct
+import sys
+import zlib
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import build_cache
+import vpw
+from tap import Tap
+
+MAGIC = b"STIM"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sBI")
+_RECORD = struct.Struct("<IHB")
+
+
+class Recorder(Tap):
+    """Record every value prepped into the design and the clock cycle it is applied on.
+
+    The 'vpw' prep and tick functions are wrapped while recording, see 'tap.Tap'.
+    Only the last 'depth' clocks are kept, the values prepped before them are
+    folded into the value each port holds on the first clock kept.
+
+    Arguments
+    depth: Number of most recent clocks kept, None to keep every clock
+    """
+    def __init__(self, depth: Optional[int] = None) -> None:
+        super().__init__()
+        self.cycle = 0
+        self.first = 0
+        self.events: Deque[Tuple[int, str, Tuple[int, ...]]] = deque()
+        self._depth = depth
+        self._held: Dict[str, Tuple[int, ...]] = {}
+
+    def _fold(self) -> None:
+        """Fold the events older than the kept clocks into the held port values."""
+        self.first = self.cycle - self._depth
+
+        while self.events and self.events[0][0] < self.first:
+            _, name, value = self.events.popleft()
+            self._held[name] = value
+
+    def prep(self, name: str, value: Sequence[int]) -> None:
+        """Record a value prepped into a port of the design."""
+        self.events.append((self.cycle, name, tuple(value)))
+        super().prep(name, value)
+
+    def tick(self) -> Any:
+        """Count the clock, folding the events older than the kept clocks."""
+        self.cycle += 1
+
+        # folded once twice the depth is recorded, so the cost of folding is spread over every clock
+        if self._depth is not None and self.cycle - self.first >= 2 * self._depth:
+            self._fold()
+
+        return super().tick()
+
+    def save(self, path: Path, meta: Dict[str, Any]) -> Path:
+        """Save the recorded stimulus with its metadata as a binary trace."""
+        events = [(self.first, name, value) for name, value in self._held.items()] + list(self.events)
+        ports = sorted({name for _, name, _ in events})
+        index = {name: x for x, name in enumerate(ports)}
+
+        body = bytearray()
+        for cycle, name, value in events:
+            body += _RECORD.pack(cycle, index[name], len(value))
+            body += struct.pack(f"<{len(value)}I", *value)
+
+        header = json.dumps(dict(meta, ports=ports, first=self.first, cycle_nb=self.cycle)).encode()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(_HEADER.pack(MAGIC, VERSION, len(header)) + header + zlib.compress(bytes(body), 9))
+
+        return path
+
+
+def filename(nodeid: str, parameter: Optional[Mapping[str, int]] = None) -> str:
+    """File name of the trace of a test, from its pytest node ID and the module parameters it overrides.
+
+    Runs of a test at other parameter points, such as the jobs of 'regress.py'
+    running in parallel, are saved to files of their own.
+    """
+    name = nodeid + "".join(f"-{k}_{v}" for k, v in sorted((parameter or {}).items()))
+    return re.sub(r"[^\w.]+", "-", name).strip("-") + ".stim"
+
+
+def load(path: Path) -> Tuple[Dict[str, Any], List[Tuple[int, str, Tuple[int, ...]]]]:
+    """Load a binary trace and return its metadata and the recorded events."""
+    data = path.read_bytes()
+
+    magic, version, length = _HEADER.unpack_from(data)
+    assert magic == MAGIC and version == VERSION, f"{path} is not a version {VERSION} stimulus trace"
+
+    meta = json.loads(data[_HEADER.size:_HEADER.size + length])
+    body = zlib.decompress(data[_HEADER.size + length:])
+
+    events = []
+    offset = 0
+    while offset < len(body):
+        cycle, port, word_nb = _RECORD.unpack_from(body, offset)
+        offset += _RECORD.size
+        value = struct.unpack_from(f"<{word_nb}I", body, offset)
+        offset += 4 * word_nb
+        events.append((cycle, meta["ports"][port], value))
+
+    return meta, events
+
+
+def replay(path: Path, before: int = 200, after: int = 20) -> Tuple[int, int]:
+    """Drive the recorded stimulus around the failing cycle into a trace-enabled build of the design.
+
+    Arguments
+    path: Binary trace saved by a failing test
+    before: Number of cycles replayed before the failing cycle
+    after: Number of cycles replayed after the failing cycle
+
+    Returns the first and last cycle of the replayed window.
+    """
+    meta, events = load(path)
+
+    start = max(meta["first"], meta["failed"] - before)
+    stop = min(meta["cycle_nb"], meta["failed"] + after + 1)
+
+    dut = build_cache.create(**meta["build"])
+    vpw.init(dut, trace=True)
+
+    # ports hold the last value prepped before the window starts
+    held: Dict[str, Tuple[int, ...]] = {}
+    window: Dict[int, List[Tuple[str, Tuple[int, ...]]]] = {}
+    for cycle, name, value in events:
+        if cycle < start:
+            held[name] = value
+        elif cycle < stop:
+            window.setdefault(cycle, []).append((name, value))
+
+    for name, value in held.items():
+        vpw.prep(name, list(value))
+
+    for cycle in range(start, stop):
+        for name, value in window.get(cycle, []):
+            vpw.prep(name, list(value))
+
+        vpw.tick()
+
+    vpw.finish()
+
+    return start, stop - 1
+
+
+def main() -> int:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", type=Path, help="binary stimulus trace saved by a failing test")
+    parser.add_argument("--before", type=int, default=200, help="cycles replayed before the failing cycle")
+    parser.add_argument("--after", type=int, default=20, help="cycles replayed after the failing cycle")
+    args = parser.parse_args()
+
+    meta, _ = load(args.trace)
+    start, stop = replay(args.trace, args.before, args.after)
+
+    print(f"{meta['test']} seed {meta['seed']} failed on cycle {meta['failed']}, "
+          f"replayed cycles {start} to {stop} of {meta['cycle_nb']} into "
+          f"{build_cache.CACHE_DIR / build_cache.key(**meta['build'])}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
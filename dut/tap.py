@@ -0,0 +1,43 @@
+"""
+Tap on the values prepped into and sampled from the ports of a design.
+
+While started, the 'vpw' prep and tick functions are replaced by the 'prep'
+and 'tick' methods of the tap, which covers the preps of the tests, of the
+background Checkers and of 'batch.drive'. A recorder extends the methods and
+calls them on the base class to pass the values on to the design.
+"""
+
+from typing import Any, Callable, Optional, Sequence
+
+import vpw
+
+
+class Tap:
+    """Wrap the 'vpw' prep and tick functions from 'start' until 'stop'."""
+    def __init__(self) -> None:
+        self._prep: Optional[Callable] = None
+        self._tick: Optional[Callable] = None
+
+    def start(self) -> None:
+        """Start recording the ports of the design."""
+        self._prep = vpw.prep
+        self._tick = vpw.tick
+
+        vpw.prep = self.prep
+        vpw.tick = self.tick
+
+    def stop(self) -> None:
+        """Stop recording and restore the 'vpw' functions."""
+        if self._prep is not None:
+            vpw.prep = self._prep
+            vpw.tick = self._tick
+            self._prep = None
+            self._tick = None
+
+    def prep(self, name: str, value: Sequence[int]) -> None:
+        """Prep a value into a port of the design."""
+        self._prep(name, value)
+
+    def tick(self) -> Any:
+        """Advance the design by a clock, returns the sampled port values."""
+        return self._tick()
@@ -0,0 +1,131 @@
+"""
+Windowed waveform of the ports of a design, recorded by the testbench.
+
+Tracing the whole design with 'vpw.init(design, trace=True)' dumps every
+signal of every clock of a run, while a failure is mostly debugged from the
+ports over the last few hundred clocks before it. The 'Waveform' records the
+values prepped into and sampled from the ports on each clock, either into a
+ring buffer of the last 'depth' clocks or only for a window of clocks, and
+writes them as a VCD file. The internal signals of a failure are traced by
+replaying its stimulus into a trace-enabled build with 'stimulus.py'.
+
+When the 'vcd2fst' tool of GTKWave is found on the PATH the waveform can be
+written as a compressed FST file instead.
+"""
+
+import shutil
+import subprocess
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+from tap import Tap
+
+# printable characters used for the VCD identifier codes
+_CODE_FIRST = 33
+_CODE_NB = 94
+
+
+def _code(index: int) -> str:
+    """VCD identifier code of a signal."""
+    code = ""
+    while True:
+        code += chr(_CODE_FIRST + index % _CODE_NB)
+        index //= _CODE_NB
+        if not index:
+            return code
+
+
+def _value(value: Any) -> int:
+    """Port value as an int, packed values are a list of 32 bit words with the least significant first."""
+    if isinstance(value, (list, tuple)):
+        return sum(int(w) << (32 * x) for x, w in enumerate(value))
+
+    return int(value)
+
+
+class Waveform(Tap):
+    """Record the port values of every clock into a ring buffer or for a window of clocks.
+
+    The 'vpw' prep and tick functions are wrapped while recording, see
+    'tap.Tap', and clocks are counted from the start of the recording so the
+    waveform and 'stimulus.Recorder' number the same clocks.
+
+    Arguments
+    depth: Number of most recent clocks kept, None to keep every clock within the window
+    window: First and last clock recorded, None to record every clock
+    """
+    def __init__(self, depth: Optional[int] = None, window: Optional[Tuple[int, int]] = None) -> None:
+        super().__init__()
+        self.cycle = 0
+        self._window = window
+        self._samples: Deque[Tuple[int, Dict[str, Any]]] = deque(maxlen=depth)
+        self._held: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        """Number of clocks held by the waveform."""
+        return len(self._samples)
+
+    def prep(self, name: str, value: Sequence[int]) -> None:
+        """Hold a value prepped into a port of the design."""
+        self._held[name] = value
+        super().prep(name, value)
+
+    def tick(self) -> Any:
+        """Sample the port values of the clock, when it is within the window."""
+        io = super().tick()
+
+        if self._window is None or self._window[0] <= self.cycle <= self._window[1]:
+            self._samples.append((self.cycle, dict(self._held, **io)))
+
+        self.cycle += 1
+        return io
+
+    def span(self) -> Tuple[int, int]:
+        """First and last clock held by the waveform."""
+        return self._samples[0][0], self._samples[-1][0]
+
+    def write(self, path: Path, module: str = "dut", fst: bool = False) -> Path:
+        """Write the recorded clocks as a VCD file, or an FST file when 'fst' is set and vcd2fst is found.
+
+        Each clock is two time units long and the port values of a clock are
+        those sampled on its rising edge at the start of the clock.
+
+        Returns the path of the written file.
+        """
+        names = sorted({n for _, values in self._samples for n in values})
+        # the port widths are not known to the testbench, so each is as wide as its widest recorded value
+        widths = {n: max(max(_value(v[n]).bit_length() for _, v in self._samples if n in v), 1) for n in names}
+        codes = {n: _code(x + 1) for x, n in enumerate(names)}
+
+        lines: List[str] = ["$timescale 1ns $end", f"$scope module {module} $end", f"$var wire 1 {_code(0)} clk $end"]
+        lines += [f"$var wire {widths[n]} {codes[n]} {n} $end" for n in names]
+        lines += ["$upscope $end", "$enddefinitions $end"]
+
+        previous: Dict[str, int] = {}
+        for cycle, values in self._samples:
+            lines.append(f"#{2 * cycle}")
+            lines.append(f"1{_code(0)}")
+
+            for name in names:
+                if name not in values:
+                    continue
+
+                value = _value(values[name])
+                if previous.get(name) != value:
+                    previous[name] = value
+                    lines.append(f"{value}{codes[name]}" if widths[name] == 1 else f"b{value:b} {codes[name]}")
+
+            lines.append(f"#{2 * cycle + 1}")
+            lines.append(f"0{_code(0)}")
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        vcd = path.with_suffix(".vcd")
+        vcd.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        if fst and shutil.which("vcd2fst"):
+            subprocess.run(["vcd2fst", str(vcd), str(vcd.with_suffix(".fst"))], check=True, capture_output=True)
+            vcd.unlink()
+            return vcd.with_suffix(".fst")
+
+        return vcd
@@ -0,0 +1,128 @@
+`ifndef _activation_
+`define _activation_
+
+/**
+ * Module:
+ *  activation
+ *
+ * Description:
+ *  Applies the activation function of a layer to the rescaled 'image'
+ *  numbers. The 'mode' 0 passes the numbers through, 1 is a ReLU that sets
+ *  negative numbers to zero, 2 is a ReLU6 style clamp that also sets the
+ *  numbers above 'bound' to the bound and 3 is a leaky ReLU that shifts
+ *  negative numbers right by 'leak' bits, rounding toward minus infinity. The
+ *  'up_valid' flag is delayed with its number to 'dn_valid'.
+ *
+ *  Every mode leaves zero at zero, so the numbers between valid beats are
+ *  left unchanged.
+ *
+ * Testbench:
+ *  activation.py
+ */
+
+
+`default_nettype none
+
+module activation
+  #(parameter   IMG_WIDTH   = 16)
+   (input   wire                    clk,
+    input   wire                    rst,
+    input   wire    [1:0]           mode,
+    input   wire    [IMG_WIDTH-2:0] bound,
+    input   wire    [3:0]           leak,
+
+    input   wire    [IMG_WIDTH-1:0] up_data,
+    input   wire                    up_valid,
+
+    output  logic   [IMG_WIDTH-1:0] dn_data,
+    output  logic                   dn_valid
+);
+
+    localparam MODE_NONE    = 2'd0;
+    localparam MODE_RELU    = 2'd1;
+    localparam MODE_CLAMP   = 2'd2;
+    localparam MODE_LEAKY   = 2'd3;
+
+
+    logic   negative;
+    logic   above;
+
+
+    assign negative = up_data[IMG_WIDTH-1];
+    assign above    = ~negative & (up_data[IMG_WIDTH-2:0] > bound);
+
+
+    always_ff @(posedge clk)
+        case (mode)
+            MODE_RELU   : dn_data <= negative ? '0 : up_data;
+            MODE_CLAMP  : dn_data <= negative ? '0 : above ? {1'b0, bound} : up_data;
+            MODE_LEAKY  : dn_data <= negative ? IMG_WIDTH'($signed(up_data) >>> leak) : up_data;
+            default     : dn_data <= up_data;
+        endcase
+
+
+    always_ff @(posedge clk)
+        if (rst)    dn_valid <= 1'b0;
+        else        dn_valid <= up_valid;
+
+
+
+`ifdef FORMAL
+
+    reg past_exists;
+    initial begin
+        restrict property (past_exists == 1'b0);
+    end
+
+    // extend wait time unit the past can be accessed
+    always_ff @(posedge clk)
+        past_exists <= 1'b1;
+
+
+    always_ff @(posedge clk)
+        if (past_exists) begin
+
+            // non negative numbers are passed through by every mode but the clamp
+            if ( ~$past(up_data[IMG_WIDTH-1]) && ($past(mode) != MODE_CLAMP)) begin
+                assert(dn_data == $past(up_data));
+            end
+
+            if ($past(mode) == MODE_NONE) begin
+                assert(dn_data == $past(up_data));
+            end
+
+            if (($past(mode) == MODE_RELU) || ($past(mode) == MODE_CLAMP)) begin
+                assert( ~dn_data[IMG_WIDTH-1]);
+            end
+
+            if ($past(mode) == MODE_CLAMP) begin
+                assert(dn_data[IMG_WIDTH-2:0] <= $past(bound));
+            end
+
+            // a negative leaky number keeps its sign and is never less than it was
+            if (($past(mode) == MODE_LEAKY) && $past(up_data[IMG_WIDTH-1])) begin
+                assert(dn_data[IMG_WIDTH-1]);
+                assert($signed(dn_data) >= $signed($past(up_data)));
+            end
+
+            // zero is left at zero by every mode
+            if ($past(up_data) == '0) begin
+                assert(dn_data == '0);
+            end
+        end
+
+
+    // valid is delayed with its number
+    always_ff @(posedge clk)
+        if (past_exists && ~$past(rst)) begin
+            assert(dn_valid == $past(up_valid));
+        end
+
+`endif
+endmodule
+
+`ifndef YOSYS
+`default_nettype wire
+`endif
+
+`endif //  `ifndef _activation_
@@ -4,55 +4,213 @@
 `include "slice.sv"
 `include "group_add.sv"
 `include "rescale.sv"
+`include "activation.sv"
+`include "skid_buffer.sv"
 
 `default_nettype none
 
 module engine
   #(parameter   WEIGHT_WIDTH    = 8,
     parameter   IMAGE_WIDTH     = 16,
-    parameter   IMAGE_NB        = 8,
+    parameter   IMAGE_NB        = 8, // must not be less then (KERNEL_WIDTH-1)*DILATION+1
     parameter   KERNEL_WIDTH    = 3,
     parameter   KERNEL_HEIGHT   = 3,
-    localparam  WORD_WIDTH      = IMAGE_WIDTH*IMAGE_NB)
+    parameter   DOUBLE_BUFFER   = 0, // 1 loads weights into a shadow bank swapped in by 'weight_swap'
+    parameter   SKID_NB         = 0, // results held while 'result_ready' is low, 0 for no backpressure
+    parameter   ACTIVATION      = 0, // 1 applies the 'cfg_activation' function to the rescaled results
+    parameter   STRIDE          = 1, // kernel positions between the results of a row, must divide IMAGE_NB
+    parameter   DILATION        = 1, // pixels between the kernel columns
+    localparam  WORD_WIDTH      = IMAGE_WIDTH*IMAGE_NB,
+    localparam  OUTPUT_WIDTH    = IMAGE_WIDTH*(IMAGE_NB/STRIDE),
+    localparam  BIAS_WIDTH      = IMAGE_WIDTH+WEIGHT_WIDTH+1)
    (input   wire    clk,
     input   wire    rst,
 
     input   wire    [7:0]   cfg_shift,
+    input   wire    [1:0]   cfg_rounding, // 0 truncate, 1 round half up, 2 round half to even
+    input   wire    [BIAS_WIDTH-1:0]    cfg_bias, // added to the sums before they are rescaled
+    input   wire    [1:0]   cfg_activation, // 0 none, 1 ReLU, 2 clamp to 'cfg_bound', 3 leaky by 'cfg_leak'
+    input   wire    [IMAGE_WIDTH-2:0]   cfg_bound,
+    input   wire    [3:0]   cfg_leak,
     input   wire            cfg_valid,
 
     input   wire    [WEIGHT_WIDTH-1:0]  weight,
     input   wire                        weight_valid,
+    input   wire                        weight_swap,
 
     input   wire    [WORD_WIDTH*KERNEL_HEIGHT-1:0]  image,
     input   wire                                    image_valid,
+    output  logic                                   image_ready,
 
-    output  logic   [WORD_WIDTH-1:0] result
+    output  logic   [OUTPUT_WIDTH-1:0]  result,
+    output  logic                       result_valid,
+    input   wire                        result_ready
 );
 
+    // clocks through the adder tree of group_add, each level registers its inputs, sums and sums again
+    function automatic integer group_latency(input integer group_nb);
+        integer nb;
+        begin
+            group_latency = 0;
+            for (nb = group_nb; nb > 1; nb = (nb+1)/2) group_latency = group_latency + 3;
+        end
+    endfunction
+
     localparam KERNEL_NB    = KERNEL_WIDTH*KERNEL_HEIGHT;
     localparam SLICE_WIDTH  = IMAGE_WIDTH+WEIGHT_WIDTH+1;
+    localparam CONFIG_HOLD  = 6*KERNEL_WIDTH+1+group_latency(KERNEL_HEIGHT);
+    localparam MODE_WIDTH   = 2+IMAGE_WIDTH-1+4;
+    localparam RESULT_NB    = IMAGE_NB/STRIDE;
+    localparam SPAN         = (KERNEL_WIDTH-1)*DILATION+1;
+    localparam FIRST        = (SPAN-1)%STRIDE;
+
+    // With DOUBLE_BUFFER the 'weight' stream is written into the shadow bank while the kernel in the
+    // active bank is still in use. 'weight_swap' moves the shadow bank into the active bank for the
+    // image beat sent on the same clock and every beat after it. The slices copy the shadow bank as
+    // the swap reaches each MAC, so it must not be written for 6*(KERNEL_WIDTH-1) clocks after a swap.
+
+    // The bias is added to the sums of a beat on the clock after group_add, and the shift and rounding
+    // mode are registered along with them, so each beat is rescaled with the configuration it was biased
+    // with. With DOUBLE_BUFFER 'cfg_valid' writes a shadow configuration that 'weight_swap' moves into use
+    // along with the shadow weight bank, for the beat sent with the swap and every beat after it. The swap
+    // reaches the bias add with the sums of that beat, so the shadow configuration must not be written for
+    // CONFIG_HOLD clocks after a swap.
+
+    // With ACTIVATION the rescaled results pass through an activation stage before they are sent on the
+    // 'result' bus. Its function is loaded with the rest of the configuration and delayed along with the
+    // beat through the bias add and rescale, adding a clock to the pipeline latency.
+
+    // With STRIDE only the kernel positions starting on every STRIDE-th pixel of a row are computed, and
+    // the result bus carries IMAGE_NB/STRIDE pixels. STRIDE divides IMAGE_NB so the positions kept are at
+    // the same pixels of every beat, and the slices of the other positions are not built. With DILATION
+    // the MACs of a slice take every DILATION-th pixel. The rows of a strided or dilated convolution are
+    // chosen by the rows sent in each beat.
+
+    // With SKID_NB the results are held in a skid buffer while 'result_ready' is low. The pipeline can
+    // not be stalled, so 'image_ready' is only high while the skid buffer has room for every beat in
+    // flight. A SKID_NB of at least the pipeline latency plus 2 is needed for a beat on every clock.
 
     genvar h;
     genvar s;
+    genvar x;
     genvar i;
 
-    logic   [7:0]   shift;
+    logic   [7:0]               shift;
+    logic   [1:0]               rounding;
+    logic   [BIAS_WIDTH-1:0]    bias;
+    logic   [MODE_WIDTH-1:0]    mode;
+
+    logic   [7:0]               bias_shift;
+    logic   [1:0]               bias_rounding;
+    logic   [BIAS_WIDTH-1:0]    bias_value;
+    logic   [MODE_WIDTH-1:0]    bias_mode;
+
+    logic   [7:0]               rescale_shift;
+    logic   [1:0]               rescale_rounding;
 
     logic   [KERNEL_NB*2-1:0]   token_wrap;
     logic   [KERNEL_NB-1:0]     token;
 
-    logic   [SLICE_WIDTH*KERNEL_HEIGHT-1:0] slice_reorder   [IMAGE_NB];
-    logic   [SLICE_WIDTH*IMAGE_NB-1:0]      slice_result    [KERNEL_HEIGHT];
-    logic   [IMAGE_NB-1:0]                  slice_done      [KERNEL_HEIGHT];
+    logic   [SLICE_WIDTH*KERNEL_HEIGHT-1:0] slice_reorder   [RESULT_NB];
+    logic   [SLICE_WIDTH*RESULT_NB-1:0]     slice_result    [KERNEL_HEIGHT];
+    logic   [RESULT_NB-1:0]                 slice_done      [KERNEL_HEIGHT];
 
+    logic                       image_accept;
+    logic   [OUTPUT_WIDTH-1:0]  rescale_data;
+    logic   [RESULT_NB-1:0]     rescale_done;
+    logic                       rescale_valid;
+    logic   [OUTPUT_WIDTH-1:0]  pipe_data;
+    logic                       pipe_valid;
 
-    always_ff @(posedge clk) begin
-        if (rst) begin
-            shift <= 0;
+
+    assign image_accept = image_valid & image_ready;
+
+
+    generate
+        if (DOUBLE_BUFFER) begin : CONFIG_
+
+            logic   [7:0]               shift_s;
+            logic   [1:0]               rounding_s;
+            logic   [BIAS_WIDTH-1:0]    bias_s;
+            logic   [MODE_WIDTH-1:0]    mode_s;
+
+            logic   [CONFIG_HOLD:0]     swap_shift;
+            logic   [CONFIG_HOLD-1:0]   swap_delay;
+
+
+            always_ff @(posedge clk) begin
+                if (rst) begin
+                    shift_s     <= 0;
+                    rounding_s  <= 0;
+                    bias_s      <= 0;
+                    mode_s      <= 0;
+                end
+                else if (cfg_valid) begin
+                    shift_s     <= cfg_shift;
+                    rounding_s  <= cfg_rounding;
+                    bias_s      <= cfg_bias;
+                    mode_s      <= {cfg_activation, cfg_bound, cfg_leak};
+                end
+            end
+
+
+            assign swap_shift = {swap_delay, weight_swap};
+
+            always_ff @(posedge clk) begin
+                if (rst)    swap_delay <= '0;
+                else        swap_delay <= swap_shift[CONFIG_HOLD-1:0];
+            end
+
+
+            always_ff @(posedge clk) begin
+                if (rst) begin
+                    shift       <= 0;
+                    rounding    <= 0;
+                    bias        <= 0;
+                    mode        <= 0;
+                end
+                else if (swap_shift[CONFIG_HOLD]) begin
+                    shift       <= shift_s;
+                    rounding    <= rounding_s;
+                    bias        <= bias_s;
+                    mode        <= mode_s;
+                end
+            end
+
+            // the beat sent with the swap is biased with the shadow configuration as it is moved into use
+            assign bias_shift       = swap_shift[CONFIG_HOLD] ? shift_s     : shift;
+            assign bias_rounding    = swap_shift[CONFIG_HOLD] ? rounding_s  : rounding;
+            assign bias_value       = swap_shift[CONFIG_HOLD] ? bias_s      : bias;
+            assign bias_mode        = swap_shift[CONFIG_HOLD] ? mode_s      : mode;
         end
-        else if (cfg_valid) begin
-            shift <= cfg_shift;
+        else begin : CONFIG_
+
+            always_ff @(posedge clk) begin
+                if (rst) begin
+                    shift       <= 0;
+                    rounding    <= 0;
+                    bias        <= 0;
+                    mode        <= 0;
+                end
+                else if (cfg_valid) begin
+                    shift       <= cfg_shift;
+                    rounding    <= cfg_rounding;
+                    bias        <= cfg_bias;
+                    mode        <= {cfg_activation, cfg_bound, cfg_leak};
+                end
+            end
+
+            assign bias_shift       = shift;
+            assign bias_rounding    = rounding;
+            assign bias_value       = bias;
+            assign bias_mode        = mode;
         end
+    endgenerate
+
+
+    always_ff @(posedge clk) begin
+        rescale_shift       <= bias_shift;
+        rescale_rounding    <= bias_rounding;
     end
 
 
@@ -75,32 +233,44 @@ module engine
         for (h=0; h<KERNEL_HEIGHT; h=h+1) begin : HEIGHT_
 
 
-            for (s=0; s<IMAGE_NB; s=s+1) begin: SLICE_
+            for (s=0; s<RESULT_NB; s=s+1) begin: SLICE_
 
-                localparam BOUNDARY = IMAGE_NB-KERNEL_WIDTH;
-                localparam OFFSET   = (s <= BOUNDARY) ? 0 : s-BOUNDARY;
+                // slice 's' computes the kernel position ending at pixel 'PIXEL' of the image bus, the
+                // pixels before it that belong to the previous beat are its partial result
+                localparam PIXEL    = FIRST+s*STRIDE;
+                localparam OFFSET   = (PIXEL/DILATION < KERNEL_WIDTH-1) ? PIXEL/DILATION : KERNEL_WIDTH-1;
 
-                logic   [WORD_WIDTH*2-1:0]  image_wrap;
+                logic   [WORD_WIDTH*2-1:0]              image_wrap;
+                logic   [IMAGE_WIDTH*KERNEL_WIDTH-1:0]  image_tap;
 
                 always_comb begin
                     image_wrap = {image[h*WORD_WIDTH +: WORD_WIDTH], image[h*WORD_WIDTH +: WORD_WIDTH]};
                 end
 
+                for (x=0; x<KERNEL_WIDTH; x=x+1) begin: TAP_
+                    always_comb begin
+                        image_tap[x*IMAGE_WIDTH +: IMAGE_WIDTH] =
+                            image_wrap[(PIXEL+IMAGE_NB-(KERNEL_WIDTH-1-x)*DILATION)*IMAGE_WIDTH +: IMAGE_WIDTH];
+                    end
+                end
+
 
                 slice #(
                     .MAC_NB         (KERNEL_WIDTH),
                     .OFFSET         (OFFSET),
                     .WEIGHT_WIDTH   (WEIGHT_WIDTH),
-                    .IMAGE_WIDTH    (IMAGE_WIDTH))
+                    .IMAGE_WIDTH    (IMAGE_WIDTH),
+                    .DOUBLE_BUFFER  (DOUBLE_BUFFER))
                 slice_ (
                     .clk    (clk),
                     .rst    (rst),
 
                     .weight         (weight),
                     .weight_valid   ({KERNEL_WIDTH{weight_valid}} & token[h*KERNEL_WIDTH +: KERNEL_WIDTH]),
+                    .weight_swap    (weight_swap),
 
-                    .image          (image_wrap[(s+1)*IMAGE_WIDTH+WORD_WIDTH-1 -: WORD_WIDTH]),
-                    .image_valid    (image_valid),
+                    .image          (image_tap),
+                    .image_valid    (image_accept),
 
                     .result         (slice_result[h][s*SLICE_WIDTH +: SLICE_WIDTH]),
                     .result_valid   (slice_done[h][s])
@@ -115,29 +285,148 @@ module engine
 
 
     generate
-        for (i=0; i<IMAGE_NB; i=i+1) begin: ADDERS_
+        for (i=0; i<RESULT_NB; i=i+1) begin: ADDERS_
 
             logic [SLICE_WIDTH-1:0] group_data;
+            logic                   group_valid;
 
+            logic [SLICE_WIDTH-1:0] bias_data;
+            logic                   bias_valid;
+
+            // the slices of every row are done on the same clock
             group_add #(
                 .GROUP_NB   (KERNEL_HEIGHT),
                 .NUM_WIDTH  (SLICE_WIDTH))
             group_add_ (
                 .clk    (clk),
+                .rst    (rst),
 
                 .up_data    (slice_reorder[i]),
-                .dn_data    (group_data)
+                .up_valid   (slice_done[0][i]),
+
+                .dn_data    (group_data),
+                .dn_valid   (group_valid)
             );
 
+            // only the sums of valid beats are biased, the sums between beats are left at zero
+            always_ff @(posedge clk) begin
+                bias_data <= group_data + (group_valid ? bias_value : '0);
+            end
+
+
+            always_ff @(posedge clk) begin
+                if (rst)    bias_valid <= 1'b0;
+                else        bias_valid <= group_valid;
+            end
+
+
             rescale #(
                 .NUM_WIDTH  (SLICE_WIDTH),
                 .IMG_WIDTH  (IMAGE_WIDTH))
             rescale_ (
+                .clk        (clk),
+                .rst        (rst),
+                .shift      (rescale_shift),
+                .rounding   (rescale_rounding),
+
+                .up_data    (bias_data),
+                .up_valid   (bias_valid),
+
+                .dn_data    (rescale_data[i*IMAGE_WIDTH +: IMAGE_WIDTH]),
+                .dn_valid   (rescale_done[i])
+            );
+        end
+    endgenerate
+
+
+    // every pixel of a beat is done on the same clock
+    assign rescale_valid = rescale_done[0];
+
+
+    generate
+        if (ACTIVATION) begin : ACTIVATION_
+
+            // the activation function of a beat is delayed through the bias add and the 4 clocks of rescale
+            logic   [MODE_WIDTH*5-1:0]  mode_delay;
+            logic   [MODE_WIDTH-1:0]    activation_mode;
+            logic   [RESULT_NB-1:0]     activation_done;
+
+
+            always_ff @(posedge clk) begin
+                mode_delay <= {mode_delay[0 +: MODE_WIDTH*4], bias_mode};
+            end
+
+            assign activation_mode = mode_delay[MODE_WIDTH*4 +: MODE_WIDTH];
+
+
+            for (i=0; i<RESULT_NB; i=i+1) begin: PIXEL_
+
+                activation #(
+                    .IMG_WIDTH  (IMAGE_WIDTH))
+                activation_ (
+                    .clk    (clk),
+                    .rst    (rst),
+                    .mode   (activation_mode[MODE_WIDTH-1 -: 2]),
+                    .bound  (activation_mode[4 +: IMAGE_WIDTH-1]),
+                    .leak   (activation_mode[3:0]),
+
+                    .up_data    (rescale_data[i*IMAGE_WIDTH +: IMAGE_WIDTH]),
+                    .up_valid   (rescale_done[i]),
+
+                    .dn_data    (pipe_data[i*IMAGE_WIDTH +: IMAGE_WIDTH]),
+                    .dn_valid   (activation_done[i])
+                );
+            end
+
+            assign pipe_valid = activation_done[0];
+        end
+        else begin : ACTIVATION_
+
+            assign pipe_data    = rescale_data;
+            assign pipe_valid   = rescale_valid;
+        end
+    endgenerate
+
+
+    generate
+        if (SKID_NB == 0) begin : SKID_
+
+            assign image_ready  = 1'b1;
+            assign result       = pipe_data;
+            assign result_valid = pipe_valid;
+
+        end
+        else begin : SKID_
+
+            localparam FILL_WIDTH = $clog2(SKID_NB+1);
+
+            logic   [FILL_WIDTH-1:0]    fill;
+            logic   [FILL_WIDTH-1:0]    in_flight;
+
+
+            always_ff @(posedge clk) begin
+                if (rst)    in_flight <= '0;
+                else        in_flight <= in_flight + FILL_WIDTH'(image_accept) - FILL_WIDTH'(pipe_valid);
+            end
+
+            assign image_ready = ((FILL_WIDTH+1)'(in_flight) + (FILL_WIDTH+1)'(fill)) < (FILL_WIDTH+1)'(SKID_NB);
+
+
+            skid_buffer #(
+                .NUM_WIDTH  (OUTPUT_WIDTH),
+                .DEPTH      (SKID_NB))
+            skid_buffer_ (
                 .clk    (clk),
-                .shift  (shift),
+                .rst    (rst),
+
+                .up_data    (pipe_data),
+                .up_valid   (pipe_valid),
+
+                .dn_data    (result),
+                .dn_valid   (result_valid),
+                .dn_ready   (result_ready),
 
-                .up_data    (group_data),
-                .dn_data    (result[i*IMAGE_WIDTH +: IMAGE_WIDTH])
+                .fill       (fill)
             );
         end
     endgenerate
@@ -27,15 +27,24 @@ module engine_tb;
     logic   rst;
 
     logic   [7:0]   cfg_shift;
+    logic   [1:0]   cfg_rounding;
+    logic   [RESULT_WIDTH-1:0]  cfg_bias;
+    logic   [1:0]   cfg_activation;
+    logic   [IMAGE_WIDTH-2:0]   cfg_bound;
+    logic   [3:0]   cfg_leak;
     logic           cfg_valid;
 
     logic   [WEIGHT_WIDTH-1:0]  weight;
     logic                       weight_valid;
+    logic                       weight_swap;
 
     logic   [WORD_WIDTH*KERNEL_HEIGHT-1:0]  image;
     logic                                   image_valid;
+    logic                                   image_ready;
 
-    logic   [WORD_WIDTH-1:0] result;
+    logic   [WORD_WIDTH-1:0]    result;
+    logic                       result_valid;
+    logic                       result_ready;
 
     engine #(
         .WEIGHT_WIDTH   (WEIGHT_WIDTH),
@@ -47,16 +56,25 @@ module engine_tb;
         .clk    (clk),
         .rst    (rst),
 
-        .cfg_shift  (cfg_shift),
-        .cfg_valid  (cfg_valid),
+        .cfg_shift      (cfg_shift),
+        .cfg_rounding   (cfg_rounding),
+        .cfg_bias       (cfg_bias),
+        .cfg_activation (cfg_activation),
+        .cfg_bound      (cfg_bound),
+        .cfg_leak       (cfg_leak),
+        .cfg_valid      (cfg_valid),
 
         .weight         (weight),
         .weight_valid   (weight_valid),
+        .weight_swap    (weight_swap),
 
         .image          (image),
         .image_valid    (image_valid),
+        .image_ready    (image_ready),
 
-        .result (result)
+        .result         (result),
+        .result_valid   (result_valid),
+        .result_ready   (result_ready)
     );
 
     always @(posedge clk) begin
@@ -86,14 +104,22 @@ module engine_tb;
         // init values
         rst = 0;
 
-        cfg_shift   = WEIGHT_WIDTH'(0);
-        cfg_valid   = 1'b0;
+        cfg_shift       = WEIGHT_WIDTH'(0);
+        cfg_rounding    = 2'd0;
+        cfg_bias        = 'd0;
+        cfg_activation  = 2'd0;
+        cfg_bound       = 'd0;
+        cfg_leak        = 4'd0;
+        cfg_valid       = 1'b0;
 
         weight          = WEIGHT_WIDTH'(0);
         weight_valid    = 1'b0;
+        weight_swap     = 1'b0;
 
         image           = IMAGE_WIDTH'(0);
         image_valid     = 1'b0;
+
+        result_ready    = 1'b1;
         //end init
 
         $display("RESET");
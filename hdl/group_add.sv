@@ -8,9 +8,13 @@ module group_add
   #(parameter GROUP_NB  = 4,
     parameter NUM_WIDTH = 16)
    (input   wire    clk,
+    input   wire    rst,
 
     input   wire    [NUM_WIDTH*GROUP_NB-1:0]    up_data,
-    output  logic   [NUM_WIDTH-1:0]             dn_data
+    input   wire                                up_valid,
+
+    output  logic   [NUM_WIDTH-1:0]             dn_data,
+    output  logic                               dn_valid
 );
 
     function signed [NUM_WIDTH-1:0] addition;
@@ -26,7 +30,8 @@ module group_add
     generate
         if (GROUP_NB == 1) begin : GROUP_1_
 
-            assign dn_data = up_data;
+            assign dn_data  = up_data;
+            assign dn_valid = up_valid;
 
         end
         else if (GROUP_NB == 2) begin : GROUP_2_
@@ -34,6 +39,9 @@ module group_add
             (* use_dsp48 = "no" *) logic [NUM_WIDTH-1:0]            dn_data_1p;
             (* use_dsp48 = "no" *) logic [NUM_WIDTH*GROUP_NB-1:0]   up_data_r;
 
+            logic   dn_valid_1p;
+            logic   up_valid_r;
+
             always_ff @(posedge clk) begin
                 up_data_r <= up_data;
             end
@@ -44,6 +52,11 @@ module group_add
 
                 dn_data     <= dn_data_1p;
             end
+
+            always_ff @(posedge clk) begin
+                if (rst)    {dn_valid, dn_valid_1p, up_valid_r} <= '0;
+                else        {dn_valid, dn_valid_1p, up_valid_r} <= {dn_valid_1p, up_valid_r, up_valid};
+            end
         end
         else if ((GROUP_NB % 2) == 1) begin : GROUP_ODD_
 
@@ -53,10 +66,19 @@ module group_add
             (* use_dsp48 = "no" *) logic [NUM_WIDTH*ADDER_NB-1:0]   dn_data_2p;
             (* use_dsp48 = "no" *) logic [NUM_WIDTH*GROUP_NB-1:0]   up_data_r;
 
+            logic   dn_valid_3p;
+            logic   dn_valid_2p;
+            logic   up_valid_r;
+
             always_ff @(posedge clk) begin
                 up_data_r <= up_data;
             end
 
+            always_ff @(posedge clk) begin
+                if (rst)    {dn_valid_2p, dn_valid_3p, up_valid_r} <= '0;
+                else        {dn_valid_2p, dn_valid_3p, up_valid_r} <= {dn_valid_3p, up_valid_r, up_valid};
+            end
+
             genvar x;
             for (x=0; x<ADDER_NB-1; x=x+1) begin : ADDITION_
 
@@ -77,9 +99,13 @@ module group_add
                 .NUM_WIDTH  (NUM_WIDTH))
             group_add_ (
                 .clk        (clk),
+                .rst        (rst),
 
                 .up_data    (dn_data_2p),
-                .dn_data    (dn_data)
+                .up_valid   (dn_valid_2p),
+
+                .dn_data    (dn_data),
+                .dn_valid   (dn_valid)
             );
         end
         else if ((GROUP_NB % 2) == 0) begin : GROUP_EVEN_
@@ -90,10 +116,19 @@ module group_add
             (* use_dsp48 = "no" *) logic [NUM_WIDTH*ADDER_NB-1:0]   dn_data_2p;
             (* use_dsp48 = "no" *) logic [NUM_WIDTH*GROUP_NB-1:0]   up_data_r;
 
+            logic   dn_valid_3p;
+            logic   dn_valid_2p;
+            logic   up_valid_r;
+
             always_ff @(posedge clk) begin
                 up_data_r <= up_data;
             end
 
+            always_ff @(posedge clk) begin
+                if (rst)    {dn_valid_2p, dn_valid_3p, up_valid_r} <= '0;
+                else        {dn_valid_2p, dn_valid_3p, up_valid_r} <= {dn_valid_3p, up_valid_r, up_valid};
+            end
+
             genvar x;
             for (x=0; x<ADDER_NB; x=x+1) begin : ADDITION_
 
@@ -112,9 +147,13 @@ module group_add
                 .NUM_WIDTH  (NUM_WIDTH))
             group_add_ (
                 .clk        (clk),
+                .rst        (rst),
 
                 .up_data    (dn_data_2p),
-                .dn_data    (dn_data)
+                .up_valid   (dn_valid_2p),
+
+                .dn_data    (dn_data),
+                .dn_valid   (dn_valid)
             );
         end
     endgenerate
@@ -38,17 +38,24 @@ module group_add_tb;
         end
     endfunction
 
+    logic                               rst;
     logic   [NUM_WIDTH*GROUP_NB-1:0]    up_data;
+    logic                               up_valid;
     logic   [NUM_WIDTH-1:0]             dn_data;
+    logic                               dn_valid;
 
     group_add #(
         .GROUP_NB   (GROUP_NB),
         .NUM_WIDTH  (NUM_WIDTH))
     uut (
         .clk        (clk),
+        .rst        (rst),
 
         .up_data    (up_data),
-        .dn_data    (dn_data)
+        .up_valid   (up_valid),
+
+        .dn_data    (dn_data),
+        .dn_valid   (dn_valid)
     );
 
     always @(posedge clk) begin
@@ -72,10 +79,14 @@ module group_add_tb;
 
     initial begin
         // init values
+        rst = 1'b1;
         up_data = 'b0;
+        up_valid = 1'b0;
 
         repeat(5) @(negedge clk);
 
+        rst         <= 1'b0;
+        up_valid    <= 1'b1;
         up_data     <= {num_r2f( 4), num_r2f( 3), num_r2f( 2), num_r2f( 1)};
         @(negedge clk);
 
@@ -92,6 +103,7 @@ module group_add_tb;
         @(negedge clk);
 
         up_data <= 'b0;
+        up_valid <= 1'b0;
         @(negedge clk);
 
 
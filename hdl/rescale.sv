@@ -9,7 +9,13 @@
  *  Rescales the MAC/ADD 'number' to the 'image' data width. Sets the dn_data
  *  value to the maximum 'image' value if the the 'number' value is to large.
  *  Sets the dn_data value to the min 'image' value if the 'number' value is to
- *  large a negative value.
+ *  large a negative value. The 'up_valid' flag is delayed with its number
+ *  to 'dn_valid'.
+ *
+ *  The bits shifted out are rounded by the 'rounding' mode, 0 truncates
+ *  (rounds toward minus infinity), 1 rounds half up (toward plus infinity)
+ *  and 2 rounds half to even. A number rounded past the maximum 'image'
+ *  value is set to the max value.
  *
  * Testbench:
  *  rescale_tb.v
@@ -28,10 +34,15 @@ module rescale
   #(parameter   NUM_WIDTH   = 33,
     parameter   IMG_WIDTH   = 16)
    (input  wire                     clk,
+    input  wire                     rst,
     input  wire     [7:0]           shift,
+    input  wire     [1:0]           rounding,
 
     input  wire     [NUM_WIDTH-1:0] up_data,
-    output logic    [IMG_WIDTH-1:0] dn_data
+    input  wire                     up_valid,
+
+    output logic    [IMG_WIDTH-1:0] dn_data,
+    output logic                    dn_valid
 );
 
 
@@ -46,6 +57,10 @@ module rescale
     localparam NUM_AWIDTH = NUM_WIDTH > 0 ? $clog2(NUM_WIDTH) : 1;
     localparam IMG_WIDTH_LESS_ONE = IMG_WIDTH - 1;
 
+    localparam ROUND_TRUNCATE   = 2'd0;
+    localparam ROUND_HALF_UP    = 2'd1;
+    localparam ROUND_HALF_EVEN  = 2'd2;
+
 
     // test to determine if number is greater the the max allowed
     function grater_than_max (
@@ -83,6 +98,37 @@ module rescale
     endfunction
 
 
+    // test to determine if the number shifted right is rounded up by one
+    function round_up (
+            input [NUM_WIDTH-1:0]   number,     // number to be shifted
+            input [7:0]             shift_right,
+            input [1:0]             mode
+        );
+        logic   [7:0]   ii;
+        logic           half;   // most significant bit shifted out
+        logic           sticky; // any other bit shifted out
+        logic           odd;    // least significant bit of the shifted number
+
+        begin
+            half    = 1'b0;
+            sticky  = 1'b0;
+            odd     = 1'b0;
+
+            for (ii = 0; ii < NUM_WIDTH[7:0]; ii=ii+1) begin
+                if ((shift_right != 0) && (ii == (shift_right - 8'd1))) half = number[ii];
+                if ((shift_right != 0) && (ii < (shift_right - 8'd1)))  sticky = sticky | number[ii];
+                if (ii == shift_right) odd = number[ii];
+            end
+
+            case (mode)
+                ROUND_HALF_UP   : round_up = half;
+                ROUND_HALF_EVEN : round_up = half & (sticky | odd);
+                default         : round_up = 1'b0;
+            endcase
+        end
+    endfunction
+
+
     /**
      * Internal signals
      */
@@ -91,12 +137,16 @@ module rescale
     logic   [NUM_AWIDTH-1:0]    overflow_1p;
 
     logic   [NUM_WIDTH-1:0]     rescale_data_1p;
+    logic                       round_1p;
     logic   [IMG_WIDTH-1:0]     rescale_data_2p;
+    logic                       round_max_2p;
     logic   [IMG_WIDTH-1:0]     rescale_data_3p;
 
     logic                       bound_max_2p;
     logic                       bound_min_2p;
 
+    logic   [2:0]               valid_p;
+
 
     /**
      * Implementation
@@ -125,20 +175,31 @@ module rescale
     always_ff @(posedge clk) begin
         // shift up_data to scale from num to img
         rescale_data_1p <= up_data >> shift;
-        rescale_data_2p <= rescale_data_1p[0 +: IMG_WIDTH];
+        round_1p        <= round_up(up_data, shift, rounding);
+
+        rescale_data_2p <= rescale_data_1p[0 +: IMG_WIDTH] + IMG_WIDTH'(round_1p);
+
+        // rounding up the max value wraps around to the min value, a number
+        // rounded up from below the min value is the min value
+        round_max_2p    <= round_1p & (rescale_data_1p[0 +: IMG_WIDTH] == IMG_MAX);
     end
 
 
     always_ff @(posedge clk)
-        if      (bound_min_2p)  rescale_data_3p <= IMG_MIN;
-        else if (bound_max_2p)  rescale_data_3p <= IMG_MAX;
-        else                    rescale_data_3p <= rescale_data_2p;
+        if      (bound_min_2p)                  rescale_data_3p <= IMG_MIN;
+        else if (bound_max_2p | round_max_2p)   rescale_data_3p <= IMG_MAX;
+        else                                    rescale_data_3p <= rescale_data_2p;
 
 
     always_ff @(posedge clk)
         dn_data <= rescale_data_3p;
 
 
+    always_ff @(posedge clk)
+        if (rst)    {dn_valid, valid_p} <= '0;
+        else        {dn_valid, valid_p} <= {valid_p, up_valid};
+
+
 
 `ifdef FORMAL
 
@@ -197,6 +258,11 @@ module rescale
             if (shift_with_sign($past(up_data, 4), $past(shift, 4)) > $signed(IMG_MAX)) begin
                 assert(dn_data == IMG_MAX);
             end
+
+            // rounding up must not wrap the max value around to the min value
+            if (shift_with_sign($past(up_data, 4), $past(shift, 4)) == $signed(IMG_MAX)) begin
+                assert(dn_data == IMG_MAX);
+            end
         end
 
 
@@ -207,14 +273,31 @@ module rescale
             && (shift_with_sign($past(up_data, 4), $past(shift, 4)) < $signed(IMG_MAX))
             ) begin
 
-            assert(dn_data == $past(up_data[shift +: IMG_WIDTH], 4));
+            assert(dn_data == $past(up_data[shift +: IMG_WIDTH] +
+                                    IMG_WIDTH'(round_up(up_data, shift, rounding)), 4));
+        end
+
+
+    // truncation never rounds up
+    always_ff @(posedge clk)
+        if (past_exists && ($past(rounding, 4) == ROUND_TRUNCATE)) begin
+            assert( !$past(round_up(up_data, shift, rounding), 4));
+        end
+
+
+    // half even only rounds up the numbers that half up also rounds up
+    always_ff @(posedge clk)
+        if (past_exists && ($past(rounding, 4) == ROUND_HALF_EVEN)) begin
+            assert( !$past(round_up(up_data, shift, rounding), 4)
+                    || $past(round_up(up_data, shift, ROUND_HALF_UP), 4));
         end
 
 
-    // positive & negative up stream numbers will retain sign
+    // positive & negative up stream numbers will retain sign, unless a
+    // negative number is rounded up to zero
     always_ff @(posedge clk)
         if (past_exists) begin
-            assert(dn_data[IMG_WIDTH-1] == $past(up_data[NUM_WIDTH-1], 4));
+            assert((dn_data[IMG_WIDTH-1] == $past(up_data[NUM_WIDTH-1], 4)) || (dn_data == '0));
         end
 
 
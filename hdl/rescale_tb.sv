@@ -107,9 +107,14 @@ module rescale_tb;
      */
 
     reg  [7:0]              shift = 8; // (NUM_POINT-IMG_POINT)
+    reg  [1:0]              rounding = 2'd0; // truncate
+
+    reg                     rst;
 
     reg  [NUM_WIDTH-1:0]    up_data;
+    reg                     up_valid;
     wire [IMG_WIDTH-1:0]    dn_data;
+    wire                    dn_valid;
 
 
     /**
@@ -121,11 +126,16 @@ module rescale_tb;
         .IMG_WIDTH  (IMG_WIDTH))
     uut (
         .clk        (clk),
+        .rst        (rst),
 
         .shift      (shift),
+        .rounding   (rounding),
 
         .up_data    (up_data),
-        .dn_data    (dn_data)
+        .up_valid   (up_valid),
+
+        .dn_data    (dn_data),
+        .dn_valid   (dn_valid)
     );
 
 
@@ -171,11 +181,14 @@ module rescale_tb;
     initial begin
         // init values
         clk = 0;
+        rst = 1;
 
         up_data = 'b0;
+        up_valid = 1;
         //end init
 
         repeat(6) @(posedge clk);
+        rst <= 0;
 
 `ifdef TB_VERBOSE
     $display("test less than");
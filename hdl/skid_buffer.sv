@@ -0,0 +1,168 @@
+`ifndef _skid_buffer_
+`define _skid_buffer_
+
+/**
+ * Module:
+ *  skid_buffer
+ *
+ * Description:
+ *  Holds the results of a pipeline that can not be stalled while the down
+ *  stream is not ready. Every 'up_valid' value is written, so the up stream
+ *  must keep count of the values in flight and never send more than there is
+ *  'fill' left for. The values are read in order with a valid/ready
+ *  handshake, and the first value is read on the clock after it is written.
+ *
+ * Testbench:
+ *  skid_buffer.py
+ */
+
+
+`default_nettype none
+
+module skid_buffer
+  #(parameter   NUM_WIDTH   = 16,
+    parameter   DEPTH       = 8,
+    localparam  ADDR_WIDTH  = (DEPTH > 1) ? $clog2(DEPTH) : 1,
+    localparam  FILL_WIDTH  = $clog2(DEPTH+1))
+   (input   wire    clk,
+    input   wire    rst,
+
+    input   wire    [NUM_WIDTH-1:0]     up_data,
+    input   wire                        up_valid,
+
+    output  logic   [NUM_WIDTH-1:0]     dn_data,
+    output  logic                       dn_valid,
+    input   wire                        dn_ready,
+
+    output  logic   [FILL_WIDTH-1:0]    fill
+);
+
+    logic   [NUM_WIDTH-1:0]     buffer  [DEPTH];
+    logic   [ADDR_WIDTH-1:0]    wr_addr;
+    logic   [ADDR_WIDTH-1:0]    rd_addr;
+    logic                       dn_accept;
+
+
+    function [ADDR_WIDTH-1:0] next (input [ADDR_WIDTH-1:0] addr);
+        next = (addr == ADDR_WIDTH'(DEPTH-1)) ? '0 : addr + 1'b1;
+    endfunction
+
+
+    assign dn_accept    = dn_valid & dn_ready;
+    assign dn_valid     = (fill != '0);
+    assign dn_data      = buffer[rd_addr];
+
+
+    always_ff @(posedge clk) begin
+        if (up_valid) begin
+            buffer[wr_addr] <= up_data;
+        end
+    end
+
+
+    always_ff @(posedge clk) begin
+        if (rst) begin
+            wr_addr <= '0;
+            rd_addr <= '0;
+            fill    <= '0;
+        end
+        else begin
+            if (up_valid)   wr_addr <= next(wr_addr);
+            if (dn_accept)  rd_addr <= next(rd_addr);
+
+            fill <= fill + FILL_WIDTH'(up_valid) - FILL_WIDTH'(dn_accept);
+        end
+    end
+
+
+`ifdef FORMAL
+
+    reg past_exists;
+    initial begin
+        restrict property (past_exists == 1'b0);
+    end
+
+    // extend wait time unit the past can be accessed
+    always_ff @(posedge clk)
+        past_exists <= 1'b1;
+
+
+    // the buffer starts from a reset
+    always_comb begin
+        if ( ~past_exists) begin
+            assume(rst);
+        end
+    end
+
+    // the up stream never writes more values then there is room for
+    always_comb begin
+        assume((fill < FILL_WIDTH'(DEPTH)) || ~up_valid || dn_accept);
+    end
+
+
+    (* anyseq *) logic          f_pick;
+    logic                       f_tracking;
+    logic   [NUM_WIDTH-1:0]     f_data;
+    logic   [FILL_WIDTH-1:0]    f_ahead;
+    logic   [ADDR_WIDTH-1:0]    f_addr;
+
+    // an arbitrary value written is tracked, with the number of values ahead of it, until it is read
+    always_ff @(posedge clk)
+        if (rst) begin
+            f_tracking  <= 1'b0;
+        end
+        else if ( ~f_tracking && up_valid && f_pick) begin
+            f_tracking  <= 1'b1;
+            f_data      <= up_data;
+            f_ahead     <= fill - FILL_WIDTH'(dn_accept);
+        end
+        else if (f_tracking && dn_accept) begin
+            if (f_ahead == '0)  f_tracking  <= 1'b0;
+            else                f_ahead     <= f_ahead - 1'b1;
+        end
+
+    assign f_addr = ADDR_WIDTH'((32'(rd_addr) + 32'(f_ahead)) % DEPTH);
+
+
+    always_comb begin
+        if (past_exists) begin
+            assert(fill <= FILL_WIDTH'(DEPTH));
+            assert(32'(rd_addr) < DEPTH);
+            assert(32'(wr_addr) < DEPTH);
+
+            // the fill is the number of values between the read and the write address
+            assert(wr_addr == ADDR_WIDTH'((32'(rd_addr) + 32'(fill)) % DEPTH));
+        end
+    end
+
+    // values are read in the order they are written, and are held unchanged until they are read
+    always_comb begin
+        if (past_exists && f_tracking) begin
+            assert(f_ahead < fill);
+            assert(buffer[f_addr] == f_data);
+
+            if (f_ahead == '0) begin
+                assert(dn_valid);
+                assert(dn_data == f_data);
+            end
+        end
+    end
+
+
+    // the fill counts the values written and read
+    always_ff @(posedge clk)
+        if (past_exists && ~$past(rst)) begin
+            assert(fill == $past(fill) + FILL_WIDTH'($past(up_valid)) - FILL_WIDTH'($past(dn_accept)));
+        end
+        else if (past_exists) begin
+            assert(fill == '0);
+        end
+
+`endif
+endmodule
+
+`ifndef YOSYS
+`default_nettype wire
+`endif
+
+`endif //  `ifndef _skid_buffer_
@@ -10,12 +10,14 @@ module slice
     parameter   OFFSET          = 0, // (0, 1, or 2) must be less then MAC_NB
     parameter   WEIGHT_WIDTH    = 16,
     parameter   IMAGE_WIDTH     = 16,
+    parameter   DOUBLE_BUFFER   = 0, // 1 loads weights into a shadow bank swapped in by 'weight_swap'
     localparam  RESULT_WIDTH    = IMAGE_WIDTH+WEIGHT_WIDTH+1)
    (input   wire    clk,
     input   wire    rst,
 
     input   wire    [WEIGHT_WIDTH-1:0]          weight,
     input   wire    [MAC_NB-1:0]                weight_valid,
+    input   wire                                weight_swap,
 
     input   wire    [IMAGE_WIDTH*MAC_NB-1:0]    image,
     input   wire                                image_valid,
@@ -27,8 +29,8 @@ module slice
     localparam PIPELINE = 6; // pipeline depth of MAC and register for product
 
 
-    logic   [RESULT_WIDTH-1:0]  product_r   [MAC_NB+1];
-    logic   [PIPELINE*3:0]      slice_valid;
+    logic   [RESULT_WIDTH-1:0]   product_r   [MAC_NB+1];
+    logic   [PIPELINE*MAC_NB:0]  slice_valid;
 
 
     always_comb begin
@@ -54,9 +56,43 @@ module slice
             logic   [PIPELINE*(x+1)-VALID_OFFSET:0] pipeline_valid;
 
 
-            always_ff @(posedge clk) begin
-                if (weight_valid[x]) begin
-                    weight_r <= weight;
+            if (DOUBLE_BUFFER) begin : BANK_
+                // the swap is delayed with the image, so the weights change for the first beat sent
+                // with it and every beat after it, while earlier beats still in the pipeline keep the
+                // weights they started with
+
+                logic   [WEIGHT_WIDTH-1:0]  weight_s;
+                logic   [DELAY_NB:0]        swap_shift;
+                logic   [DELAY_NB-1:0]      swap_delay;
+
+
+                always_ff @(posedge clk) begin
+                    if (weight_valid[x]) begin
+                        weight_s <= weight;
+                    end
+                end
+
+
+                assign swap_shift = {swap_delay, weight_swap};
+
+                always_ff @(posedge clk) begin
+                    if (rst)    swap_delay <= '0;
+                    else        swap_delay <= swap_shift[DELAY_NB-1:0];
+                end
+
+
+                always_ff @(posedge clk) begin
+                    if (swap_shift[DELAY_NB-1]) begin
+                        weight_r <= weight_s;
+                    end
+                end
+            end
+            else begin : BANK_
+
+                always_ff @(posedge clk) begin
+                    if (weight_valid[x]) begin
+                        weight_r <= weight;
+                    end
                 end
             end
 
@@ -101,12 +137,12 @@ module slice
     endgenerate
 
 
-    assign result_valid = slice_valid[PIPELINE*3];
+    assign result_valid = slice_valid[PIPELINE*MAC_NB];
 
 
     always_ff @(posedge clk) begin
         if (rst)    slice_valid <= 'b0;
-        else        slice_valid <= {slice_valid[PIPELINE*3-1:0], image_valid};
+        else        slice_valid <= {slice_valid[PIPELINE*MAC_NB-1:0], image_valid};
     end
 
 
@@ -114,7 +150,7 @@ module slice
         if (OFFSET == (MAC_NB-1)) begin
             // one clock tick worth of data is needed for calculation
 
-            assign result = slice_valid[PIPELINE*3] ? product_r[MAC_NB] : (RESULT_WIDTH)'(0);
+            assign result = slice_valid[PIPELINE*MAC_NB] ? product_r[MAC_NB] : (RESULT_WIDTH)'(0);
 
         end
         else begin
@@ -123,7 +159,7 @@ module slice
             always_ff @(posedge clk) begin
                 result <= (RESULT_WIDTH)'(0);
 
-                if (slice_valid[PIPELINE*3-1]) begin
+                if (slice_valid[PIPELINE*MAC_NB-1]) begin
                     result <= product_r[MAC_NB];
                 end
             end
@@ -23,6 +23,7 @@ module slice_tb;
 
     logic   [WEIGHT_WIDTH-1:0]              weight;
     logic   [MAC_NB-1:0]                    weight_valid;
+    logic                                   weight_swap;
 
     logic   [IMAGE_WIDTH*MAC_NB-1:0]        image;
     logic                                   image_valid;
@@ -41,6 +42,7 @@ module slice_tb;
 
         .weight         (weight),
         .weight_valid   (weight_valid),
+        .weight_swap    (weight_swap),
 
         .image          (image),
         .image_valid    (image_valid),
@@ -98,6 +100,7 @@ module slice_tb;
 
         weight         <= WEIGHT_WIDTH'(0);
         weight_valid   <= 'b0;
+        weight_swap    <= 1'b0;
 
         image         <= IMAGE_WIDTH'(0);
         image_valid   <= 1'b0;